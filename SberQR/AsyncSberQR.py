@@ -1,36 +1,91 @@
 import asyncio
 import base64
 import ssl
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from logging import getLogger
 from random import choices
 from string import hexdigits
-from typing import Optional, Type, Union, List, Dict
+from typing import TYPE_CHECKING, Any, Callable, Optional, Type, Union, List, Dict, Iterable, AsyncIterator
 
 import aiohttp
 import certifi
-import ujson as json
-from redis.asyncio import Redis
 
-from .api import make_request, Methods
-from .payload import generate_payload
-from .scope import Scope
+from .api import make_request, get_timeout, Methods, API_URL
+from .batch import BatchResult, Specs, run_batch
+from .codec import JSONCodec, get_codec
+from .exceptions import NetworkError, SberQrAPIError, CircuitOpenError, RateLimitExceeded
+from .models import (RegistryOperation, Position, CreationRequest, StatusRequest, RevokeRequest,
+                     CancelRequest, CancelResult, StatusResult)
+from .registry import RegistryReader
+from .resilience import CircuitBreaker, AdaptiveLimiter
+from .journal import Journal
+from .idempotency import AsyncIdempotencyCache, request_fingerprint
+from .metrics import CallbackInstrumentation, Instrumentation, combine
+from .qr import QRFormat, QRImage, QRRenderer
+from .ratelimit import AsyncRedisRateLimiter, RateLimiter
+from .redis_tokens import AsyncRedisTokenStore
+from .retry import RetryPolicy, is_retryable_error, is_throttled
+from .scope import Scope, API_SCOPES
+from .status_cache import StatusCache
+from .tokens import TokenCache
+from .transport import AsyncTransport, send_request, timeout_bounds
 from .types import RegistryType, CancelType
 
+if TYPE_CHECKING:
+    from redis.asyncio import Redis
+
 logger = getLogger(__name__)
 
 
+def create_ssl_context(crt_file_path: Optional[str], key_file_path: Optional[str], pkcs12_password: Optional[str],
+                       russian_crt: Optional[str]) -> ssl.SSLContext:
+    """
+    SSL контекст с клиентским сертификатом и сертификатом Минцифры.
+    Без путей к сертификатам (например, для SberQRSimulator) создается контекст по умолчанию
+    """
+    ssl_context = ssl.create_default_context(cafile=certifi.where())
+    if crt_file_path is not None:
+        ssl_context.load_cert_chain(certfile=crt_file_path,
+                                    keyfile=key_file_path,
+                                    password=pkcs12_password)
+    if russian_crt is not None:
+        ssl_context.load_verify_locations(cafile=russian_crt)
+    return ssl_context
+
+
 class AsyncSberQR:
 
     def __init__(self, member_id: str, id_qr: str, tid: str,
                  client_id: str, client_secret: str,
-                 crt_file_path: str, key_file_path: str,
-                 pkcs12_password: str,
-                 russian_crt: str,
-                 redis: Union[str, Redis] = None,
+                 crt_file_path: Optional[str], key_file_path: Optional[str],
+                 pkcs12_password: Optional[str],
+                 russian_crt: Optional[str],
+                 redis: Union[str, 'Redis'] = None,
                  loop: Optional[Union[asyncio.BaseEventLoop, asyncio.AbstractEventLoop]] = None,
                  connections_limit: int = None,
-                 timeout: Optional[Union[int, float, aiohttp.ClientTimeout]] = None):
+                 timeout: Optional[Union[int, float, aiohttp.ClientTimeout]] = None,
+                 token_refresh_margin: float = 60,
+                 method_timeouts: Optional[Dict[str, Union[int, float, aiohttp.ClientTimeout]]] = None,
+                 deadline: Optional[float] = None,
+                 retry: Optional[RetryPolicy] = None,
+                 breaker_failure_threshold: Optional[int] = 5,
+                 breaker_recovery_timeout: float = 30.0,
+                 concurrency_limiter: Optional[AdaptiveLimiter] = None,
+                 ssl_context: Optional[ssl.SSLContext] = None,
+                 token_cache: Optional[TokenCache] = None,
+                 json_codec: Union[str, JSONCodec, None] = None,
+                 redis_lock_timeout: float = 10,
+                 instrumentation: Optional[Instrumentation] = None,
+                 on_request_start: Optional[Callable[[str, int], Any]] = None,
+                 on_request_end: Optional[Callable[[str, int, float, Optional[BaseException]], Any]] = None,
+                 base_url: Optional[str] = None,
+                 qr_renderer: Optional[QRRenderer] = None,
+                 idempotency: Optional[AsyncIdempotencyCache] = None,
+                 rate_limiter: Union[RateLimiter, AsyncRedisRateLimiter, None] = None,
+                 journal: Optional[Journal] = None,
+                 status_cache: Optional[StatusCache] = None,
+                 transport: Union[str, AsyncTransport, None] = None):
         """
 
         :param member_id:
@@ -45,7 +100,31 @@ class AsyncSberQR:
         :param redis:
         :param loop:
         :param connections_limit:
-        :param timeout:
+        :param timeout: total timeout of one request in seconds (as in SberQR) or aiohttp.ClientTimeout,
+            default 30 s (connect 10 s)
+        :param token_refresh_margin: seconds before expiry when a cached token is refreshed
+        :param method_timeouts: timeouts for specific methods, e.g. {Methods.registry: 120}
+        :param deadline: overall time budget of one API call including retries, seconds
+        :param retry: retry policy, RetryPolicy(attempts=1) disables retries
+        :param breaker_failure_threshold: consecutive failures that open the circuit of a method, None disables
+        :param breaker_recovery_timeout: seconds before an open circuit lets a probe request through
+        :param concurrency_limiter: AIMD limit of concurrent requests, e.g. AdaptiveLimiter(initial_limit=20)
+        :param ssl_context: ready SSL context, certificate files are not loaded if it is passed
+        :param token_cache: token cache shared with other clients of the same client_id
+        :param json_codec: 'orjson', 'ujson', 'json' or JSONCodec, by default the fastest installed one
+        :param redis_lock_timeout: seconds one worker may hold the Redis lock while it refreshes a token
+        :param instrumentation: metrics/tracing, e.g. Metrics(), PrometheusInstrumentation() or several via combine()
+        :param on_request_start: hook(method, attempt) called before every request attempt
+        :param on_request_end: hook(method, attempt, duration, error) called after every request attempt
+        :param base_url: API address instead of https://mc.api.sberbank.ru/prod, e.g. SberQRSimulator.base_url
+        :param qr_renderer: QR image renderer with LRU cache used by qr(), may be shared between clients
+        :param idempotency: AsyncIdempotencyCache that deduplicates creation() by order_number
+        :param rate_limiter: per-method request rate limits, shared by all clients of the same client_id
+        :param journal: append-only journal of creation/revoke/cancel calls for crash recovery
+        :param status_cache: coalesces concurrent status() calls of one order, StatusCache(ttl=0.5, terminal_ttl=300)
+            also reuses responses
+        :param transport: 'httpx' - HTTP/2 via httpx (opened and closed by the client) or a shared AsyncTransport,
+            by default aiohttp
         """
 
         self._main_loop = loop
@@ -59,27 +138,53 @@ class AsyncSberQR:
         self._redis = None
 
         self._currency = "643"
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-
-        ssl_context.load_cert_chain(certfile=crt_file_path,
-                                    keyfile=key_file_path,
-                                    password=pkcs12_password)
-        ssl_context.load_verify_locations(cafile=russian_crt)
+        if ssl_context is None:
+            ssl_context = create_ssl_context(crt_file_path, key_file_path, pkcs12_password, russian_crt)
 
         self._session: Optional[aiohttp.ClientSession] = None
         self._connector_class: Type[aiohttp.TCPConnector] = aiohttp.TCPConnector
         self._connector_init = dict(limit=connections_limit, ssl=ssl_context)
-        if isinstance(redis, Redis):
-            self._redis = redis
-        elif isinstance(redis, str):
+        # размер пула соединений для метрик (None - без ограничения)
+        self._pool_size = connections_limit
+        if isinstance(redis, str):
+            from redis.asyncio import Redis
             self._redis = Redis(host=redis, decode_responses=True)
+        elif redis is not None:
+            self._redis = redis
+        self._redis_tokens = AsyncRedisTokenStore(self._redis, client_id, redis_lock_timeout) if self._redis else None
+
+        self._tokens = token_cache if token_cache is not None else TokenCache(refresh_margin=token_refresh_margin)
+        self._token_refresher: Optional[asyncio.Task] = None
 
         self.timeout = timeout
+        self.method_timeouts = dict(method_timeouts or {})
+        self.deadline = deadline
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.codec = get_codec(json_codec)
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.qr_renderer = qr_renderer if qr_renderer is not None else QRRenderer()
+        self.idempotency = idempotency
+        hooks = CallbackInstrumentation(on_request_start, on_request_end) if on_request_start or on_request_end else None
+        self.instrumentation = combine(instrumentation, hooks)
+        self._in_flight = 0
+        self._breaker_failure_threshold = breaker_failure_threshold
+        self._breaker_recovery_timeout = breaker_recovery_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.concurrency_limiter = concurrency_limiter
+        self.rate_limiter = rate_limiter
+        self.journal = journal
+        self.status_cache = status_cache if status_cache is not None else StatusCache()
+        self._own_transport = isinstance(transport, str)
+        if transport == 'httpx':
+            from .transport import HTTPXTransport
+            transport = HTTPXTransport(ssl_context, max_connections=connections_limit or 10)
+        elif self._own_transport:
+            raise ValueError(f'Unknown transport {transport!r}, expected \'httpx\' or AsyncTransport')
+        self.transport: Optional[AsyncTransport] = transport
 
     async def get_new_session(self) -> aiohttp.ClientSession:
         return aiohttp.ClientSession(
-            connector=self._connector_class(**self._connector_init),
-            json_serialize=json.dumps
+            connector=self._connector_class(**self._connector_init)
         )
 
     @property
@@ -100,12 +205,121 @@ class AsyncSberQR:
         """
         Close all client sessions
         """
+        await self.stop_token_refresher()
         if self._session:
             await self._session.close()
+        if self._own_transport:
+            await self.transport.close()
 
     async def request(self, method, headers, data):
         headers = {**headers, **{'Accept': 'application/json', 'x-ibm-client-id': self._client_id}}
-        return await make_request(await self.get_session(), method, headers, data)
+        timeout = self.method_timeouts.get(method, self.timeout)
+        deadline = time.monotonic() + self.deadline if self.deadline else None
+        attempt = 0
+        while True:
+            try:
+                return await self._send(method, headers, data, timeout, deadline, attempt)
+            except (NetworkError, SberQrAPIError) as e:
+                if not self.retry.should_retry(method, e, attempt):
+                    raise
+                delay = self.retry.delay(attempt)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                self.instrumentation.retry(method, attempt, delay, e)
+                attempt += 1
+                logger.warning('Retrying %s in %.2f s (attempt %d): %r', method, delay, attempt + 1, e)
+                await asyncio.sleep(delay)
+
+    async def _send(self, method, headers, data, timeout, deadline, attempt=0):
+        """
+        Одна попытка запроса через лимит запросов, circuit breaker и ограничитель параллельности
+        """
+        if self.rate_limiter is not None:
+            await self._acquire_rate_limit(method, deadline)
+        limiter = self.concurrency_limiter
+        if limiter is not None:
+            await limiter.acquire()
+        breaker = self.get_breaker(method)
+        failed = None
+        throttled = False
+        try:
+            if breaker is not None:
+                # проверяется после ожидания в очереди ограничителя, чтобы не отправлять запросы в открытый breaker
+                breaker.before_call()
+            result = await self._instrumented_request(method, headers, data, timeout, deadline, attempt)
+            failed = False
+            return result
+        except CircuitOpenError:
+            breaker = None
+            raise
+        except (NetworkError, SberQrAPIError) as e:
+            failed = is_retryable_error(e)
+            throttled = is_throttled(e)
+            raise
+        finally:
+            if limiter is not None:
+                await limiter.release(None if failed is None else not failed)
+            if breaker is not None:
+                if failed is None:
+                    breaker.on_abort()
+                elif failed and not throttled:
+                    # 429 уменьшает лимит параллельности, но не открывает breaker
+                    breaker.on_failure()
+                else:
+                    breaker.on_success()
+
+    async def _acquire_rate_limit(self, method, deadline):
+        if self.rate_limiter.limit(method) is None:
+            return
+        max_wait = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+        try:
+            wait = await self.rate_limiter.acquire(method, max_wait)
+        except RateLimitExceeded:
+            self.instrumentation.rate_limit(method, 0.0, True)
+            raise
+        self.instrumentation.rate_limit(method, wait, False)
+
+    async def _instrumented_request(self, method, headers, data, timeout, deadline, attempt):
+        instrumentation = self.instrumentation
+        self._in_flight += 1
+        instrumentation.pool_usage(self._in_flight, self._pool_size)
+        state = instrumentation.request_start(method, attempt)
+        started = time.perf_counter()
+        error = None
+        try:
+            if self.transport is not None:
+                return await send_request(self.transport, method, headers, data, self.codec, timeout, deadline,
+                                          self.base_url)
+            return await make_request(await self.get_session(), method, headers, data, timeout=timeout,
+                                      deadline=deadline, codec=self.codec, base_url=self.base_url)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._in_flight -= 1
+            instrumentation.request_end(method, attempt, time.perf_counter() - started, error, state)
+            instrumentation.pool_usage(self._in_flight, self._pool_size)
+
+    def get_breaker(self, method: str) -> Optional[CircuitBreaker]:
+        """
+        Circuit breaker метода API (None, если breaker отключен)
+        """
+        if self._breaker_failure_threshold is None:
+            return None
+        breaker = self._breakers.get(method)
+        if breaker is None:
+            breaker = self._breakers.setdefault(method, CircuitBreaker(method, self._breaker_failure_threshold,
+                                                                       self._breaker_recovery_timeout))
+        return breaker
+
+    def health(self) -> Dict[str, Dict]:
+        """
+        Состояние circuit breaker'ов по методам API для health check
+        """
+        health = {method: breaker.snapshot() for method, breaker in self._breakers.items()}
+        if self.concurrency_limiter is not None:
+            health['concurrency'] = self.concurrency_limiter.snapshot()
+        return health
 
     async def get_token_from_redis(self, scope):
         """
@@ -115,74 +329,289 @@ class AsyncSberQR:
         """
         return await self._redis.get(f'{self._client_id}token_{scope.value}')
 
+    async def _fetch_token(self, scope: Scope):
+        """
+        Достает токен из Redis (если он настроен), иначе запрашивает новый
+        :return: (token, expires_in)
+        """
+        if self._redis_tokens is None:
+            return await self._request_token(scope)
+
+        store, margin = self._redis_tokens, self._tokens.refresh_margin
+        token, ttl = await store.get(scope)
+        if token is not None and store.fresh(scope, ttl, margin):
+            return token, ttl
+        lock = await store.acquire_lock(scope)
+        if lock is None:
+            # токен обновляет другой процесс: до истечения используется текущий, иначе ждем новый
+            if token is not None and ttl > 0:
+                return token, ttl
+            cached = await store.wait(scope)
+            if cached is not None:
+                return cached
+            logger.warning('Token %s was not refreshed by the lock holder in %s s, requesting it',
+                           scope.value, store.lock_timeout)
+        try:
+            if lock is not None:
+                # токен мог быть обновлен, пока блокировку держал другой процесс
+                token, ttl = await store.get(scope)
+                if token is not None and store.fresh(scope, ttl, margin):
+                    return token, ttl
+            token, expires_in = await self._request_token(scope)
+            await store.set(scope, token, expires_in - 10)
+            return token, expires_in
+        finally:
+            if lock is not None:
+                await store.release_lock(scope, lock)
+
+    async def _request_token(self, scope: Scope):
+        """
+        Запрашивает новый токен
+        :return: (token, expires_in)
+        """
+        auth = base64.b64encode(f'{self._client_id}:{self._client_secret}'.encode('utf-8')).decode('utf-8')
+        headers = {'Authorization': f'Basic {auth}',
+                   'Content-Type': 'application/x-www-form-urlencoded',
+                   'rquid': ''.join(choices(hexdigits, k=32))}
+        data = {'grant_type': 'client_credentials', 'scope': scope.value}
+        token_data = await self.request(Methods.oauth, headers, data)
+        return token_data['access_token'], int(token_data['expires_in'])
+
+    async def _load_tokens(self, scopes: Iterable[Scope]):
+        """
+        Загружает в память токены scopes, сохраненные в Redis другими процессами, одним запросом
+        """
+        if self._redis_tokens is None:
+            return
+        missing = [scope for scope in scopes if self._tokens.get(scope) is None]
+        if not missing:
+            return
+        for scope, (token, ttl) in (await self._redis_tokens.get_many(missing)).items():
+            if token is not None and self._redis_tokens.fresh(scope, ttl, self._tokens.refresh_margin):
+                self._tokens.set(scope, token, ttl)
+
     async def token(self, scope: Scope):
-        redis_token = await self.get_token_from_redis(scope) if self._redis else None
-        if redis_token:
-            return redis_token
-        else:
-            auth = base64.b64encode(f'{self._client_id}:{self._client_secret}'.encode('utf-8')).decode('utf-8')
-            headers = {'Authorization': f'Basic {auth}',
-                       'Content-Type': 'application/x-www-form-urlencoded',
-                       'rquid': ''.join(choices(hexdigits, k=32))}
-            data = {'grant_type': 'client_credentials', 'scope': scope.value}
-            token_data = await self.request(Methods.oauth, headers, data)
-            if self._redis:
-                await self._redis.set(f'{self._client_id}token_{scope.value}', token_data['access_token'],
-                                      int(token_data['expires_in']) - 10)
-            return token_data['access_token']
-
-    async def creation(self, description: str, order_sum: int, order_number: str, positions: Union[List, Dict]):
-        """
-        Создание заказа
         """
+        Возвращает токен для области scope.
+        Токен хранится в памяти процесса до истечения expires_in, Redis используется как второй уровень кэша.
+        Одновременные запросы токена одной области выполняют один запрос tokens/v2/oauth.
+        """
+        token = self._tokens.get(scope)
+        self.instrumentation.token_lookup(scope, token is not None)
+        if token is not None:
+            return token
+        return await self._tokens.fetch(scope, lambda: self._fetch_token(scope))
+
+    async def warmup(self, scopes: Iterable[Scope] = API_SCOPES, connections: int = 1, refresh: bool = True):
+        """
+        Прогрев клиента: параллельно получает токены областей scopes и открывает соединения с API,
+        чтобы первые запросы после запуска не тратили время на OAuth и TLS handshake.
+
+        :param scopes: области, токены которых нужно получить
+        :param connections: количество дополнительно открываемых соединений
+        :param refresh: запустить фоновое обновление токенов scopes
+        """
+        scopes = tuple(scopes)
+        await self._load_tokens(scopes)
+        await asyncio.gather(*(self.token(scope) for scope in scopes),
+                             *(self._open_connection() for _ in range(connections)))
+        if refresh and scopes:
+            self.start_token_refresher(scopes)
+
+    async def _open_connection(self):
+        if self.transport is not None:
+            try:
+                await self.transport.open_connection(self.base_url or API_URL, timeout_bounds(self.timeout))
+            except NetworkError as e:
+                logger.warning('Unable to open connection to %s: %r', self.base_url or API_URL, e)
+            return
+        session = await self.get_session()
+        try:
+            async with session.head(self.base_url or API_URL, timeout=get_timeout(self.timeout)) as response:
+                await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning('Unable to open connection to %s: %r', self.base_url or API_URL, e)
+
+    def start_token_refresher(self, scopes: Iterable[Scope] = API_SCOPES, retry_delay: float = 5):
+        """
+        Запускает фоновую задачу, которая обновляет токены scopes до истечения их срока действия.
+        Задача останавливается в close()
+
+        :param scopes: области, токены которых нужно поддерживать актуальными
+        :param retry_delay: пауза перед повторной попыткой после ошибки обновления
+        """
+        scopes = tuple(scopes)
+        if not scopes:
+            raise ValueError('scopes must not be empty')
+        if self._token_refresher is None or self._token_refresher.done():
+            self._token_refresher = asyncio.ensure_future(self._refresh_tokens(scopes, retry_delay))
+
+    async def stop_token_refresher(self):
+        if self._token_refresher is not None and not self._token_refresher.done():
+            self._token_refresher.cancel()
+            try:
+                await self._token_refresher
+            except asyncio.CancelledError:
+                pass
+        self._token_refresher = None
+
+    async def _refresh_tokens(self, scopes, retry_delay):
+        while True:
+            delay = min(self._tokens.refresh_in(scope) for scope in scopes)
+            await asyncio.sleep(delay)
+            try:
+                await self._load_tokens(scopes)
+                await asyncio.gather(*(self.token(scope) for scope in scopes))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Token refresh failed, retrying in %s s', retry_delay)
+                await asyncio.sleep(retry_delay)
+
+    async def creation(self, description: str, order_sum: int, order_number: str,
+                       positions: Union[List[Union[Position, Dict]], Position, Dict], rq_uid: Optional[str] = None):
+        """
+        Создание заказа.
+        С idempotency повторный вызов с тем же order_number возвращает сохраненный ответ, а повтор после
+        ошибки или таймаута отправляется с RqUID первой попытки. Повтор с тем же order_number, но другими
+        описанием, суммой или позициями вызывает IdempotencyConflict
+
+        :param rq_uid: RqUID запроса (по умолчанию случайный)
+        """
+        if isinstance(positions, (dict, Position)):
+            positions = [positions]
+        if self.idempotency is None:
+            return await self._creation(rq_uid or ''.join(choices(hexdigits, k=32)), description, order_sum,
+                                        order_number, positions)
+        fingerprint = request_fingerprint(
+            [description, order_sum,
+             [position.to_payload() if isinstance(position, Position) else position for position in positions]])
+        return await self.idempotency.execute(
+            f'{self._id_qr}:{order_number}',
+            lambda uid: self._creation(uid, description, order_sum, order_number, positions), rq_uid, fingerprint)
+
+    async def _creation(self, rq_uid: str, description: str, order_sum: int, order_number: str,
+                        positions: List[Union[Position, Dict]]):
         dt = f'{datetime.utcnow().isoformat(timespec="seconds")}Z'
-        rq_uid = ''.join(choices(hexdigits, k=32))
         headers = {'Authorization': f'Bearer {await self.token(Scope.create)}', 'RqUID': rq_uid}
+        payload = CreationRequest(
+            rq_uid=rq_uid, rq_tm=dt, member_id=self._member_id, order_number=order_number, order_create_date=dt,
+            order_params_type=positions, id_qr=self._id_qr, order_sum=order_sum, currency=self._currency,
+            description=description, sbp_member_id=self._sbp_member_id if self._tid == self._id_qr else None
+        ).to_payload()
+        params = {'order_number': order_number, 'order_sum': order_sum, 'description': description}
+        return await self._journaled(Methods.creation, rq_uid, params, headers, payload)
+
+    async def qr(self, order: Union[str, Dict], fmt: Union[str, QRFormat] = QRFormat.PNG, box_size: int = 10,
+                 border: int = 4) -> QRImage:
+        """
+        QR-код ссылки на оплату в пуле потоков (или в executor QRRenderer), не блокируя цикл событий.
+        Повторный рендеринг той же ссылки с теми же параметрами берется из кэша
 
-        rq_tm, order_create_date = dt, dt
-        member_id, id_qr, currency = self._member_id, self._id_qr, self._currency
+        :param order: ответ creation или order_form_url
+        :param fmt: 'png' (bytes), 'svg' (bytes) или 'text' (str для вывода в терминал)
+        """
+        return await self.qr_renderer.render_async(order, fmt, box_size, border)
 
-        sbp_member_id = self._sbp_member_id if self._tid == self._id_qr else None
+    async def status(self, order_id: str, partner_order_number: str):
+        """
+        Статус заказа. Одновременные запросы статуса одного заказа выполняются одним запросом,
+        с status_cache ответ берется из кэша
+        """
+        return await self.status_cache.fetch(order_id, partner_order_number,
+                                              lambda: self._status(order_id, partner_order_number))
 
-        if isinstance(positions, dict):
-            order_params_type = [positions]
-        else:
-            order_params_type = positions
-        del positions
-        payload = generate_payload(exclude=['dt', 'headers'], **locals())
-        return await self.request(Methods.creation, headers, payload)
+    async def status_result(self, order_id: str, partner_order_number: str) -> StatusResult:
+        """
+        status() с ответом, разобранным в StatusResult
 
-    async def status(self, order_id: str, partner_order_number: str):
+        :raises ValueError: если в ответе нет order_id или order_state (например, заказ не найден)
+        """
+        return StatusResult.from_response(await self.status(order_id, partner_order_number))
+
+    async def _status(self, order_id: str, partner_order_number: str):
         rq_uid = ''.join(choices(hexdigits, k=32))
         headers = {'Authorization': f'Bearer {await self.token(Scope.status)}', 'RqUID': rq_uid}
-        tid = self._tid
-        rq_tm = f'{datetime.utcnow().isoformat(timespec="seconds")}Z'
-        payload = generate_payload(exclude=['headers'], **locals())
+        payload = StatusRequest(rq_uid=rq_uid, rq_tm=f'{datetime.utcnow().isoformat(timespec="seconds")}Z',
+                                order_id=order_id, tid=self._tid,
+                                partner_order_number=partner_order_number).to_payload()
         return await self.request(Methods.status, headers, payload)
 
-    async def revoke(self, order_id: str):
+    async def revoke(self, order_id: str, partner_order_number: str = None):
+        """
+        Отмена неоплаченного заказа
+
+        :param partner_order_number: номер заказа в системе партнера, записывается в journal
+            для проверки запроса status() после сбоя
+        """
         rq_uid = ''.join(choices(hexdigits, k=32))
         headers = {'Authorization': f'Bearer {await self.token(Scope.revoke)}', 'RqUID': rq_uid}
-
-        rq_tm = f'{datetime.utcnow().isoformat(timespec="seconds")}Z'
-        payload = generate_payload(exclude=['headers'], **locals())
-        return await self.request(Methods.revocation, headers, payload)
+        payload = RevokeRequest(rq_uid=rq_uid, rq_tm=f'{datetime.utcnow().isoformat(timespec="seconds")}Z',
+                                order_id=order_id).to_payload()
+        try:
+            return await self._journaled(Methods.revocation, rq_uid,
+                                         {'order_id': order_id, 'partner_order_number': partner_order_number},
+                                         headers, payload)
+        finally:
+            self.status_cache.invalidate(order_id)
 
     async def cancel(
             self, order_id: str, operation_id: str, cancel_operation_sum: int, auth_code: str,
-            operation_type: CancelType = CancelType.REVERSE, sbp_payer_id: str = None
+            operation_type: CancelType = CancelType.REVERSE, sbp_payer_id: str = None,
+            partner_order_number: str = None
     ):
         """
         Отмена/возврат
+
+        :param partner_order_number: номер заказа в системе партнера, записывается в journal
+            для проверки запроса status() после сбоя
         """
         rq_uid = ''.join(choices(hexdigits, k=32))
         headers = {'Authorization': f'Bearer {await self.token(Scope.cancel)}', 'RqUID': rq_uid}
+        payload = CancelRequest(
+            rq_uid=rq_uid, rq_tm=f'{datetime.utcnow().isoformat(timespec="seconds")}Z', order_id=order_id,
+            operation_type=operation_type.value, operation_id=operation_id, auth_code=auth_code, id_qr=self._id_qr,
+            tid=self._tid, cancel_operation_sum=cancel_operation_sum, operation_currency=self._currency,
+            sbp_payer_id=sbp_payer_id
+        ).to_payload()
+        params = {'order_id': order_id, 'operation_id': operation_id, 'cancel_operation_sum': cancel_operation_sum,
+                  'auth_code': auth_code, 'operation_type': operation_type.value, 'sbp_payer_id': sbp_payer_id,
+                  'partner_order_number': partner_order_number}
+        try:
+            return await self._journaled(Methods.cancel, rq_uid, params, headers, payload)
+        finally:
+            self.status_cache.invalidate(order_id)
+
+    async def cancel_result(
+            self, order_id: str, operation_id: str, cancel_operation_sum: int, auth_code: str,
+            operation_type: CancelType = CancelType.REVERSE, sbp_payer_id: str = None,
+            partner_order_number: str = None
+    ) -> CancelResult:
+        """
+        cancel() с ответом, разобранным в CancelResult
 
-        rq_tm = f'{datetime.utcnow().isoformat(timespec="seconds")}Z'
-        id_qr, tid, operation_currency = self._id_qr, self._tid, self._currency
-        operation_type = operation_type.value
-        payload = generate_payload(exclude=['headers'], **locals())
-        return await self.request(Methods.cancel, headers, payload)
+        :raises ValueError: если в ответе нет order_id
+        """
+        return CancelResult.from_response(await self.cancel(order_id, operation_id, cancel_operation_sum, auth_code,
+                                                          operation_type, sbp_payer_id, partner_order_number))
+
+    async def _journaled(self, method, rq_uid, params, headers, payload):
+        """
+        Запрос, изменяющий заказ: с journal до отправки записывается begin, после ответа - end.
+        После таймаута и сетевой ошибки неизвестно, выполнен ли запрос, поэтому запись остается без end
+        """
+        if self.journal is None:
+            return await self.request(method, headers, payload)
+        await self.journal.begin_async(rq_uid, method, params)
+        try:
+            result = await self.request(method, headers, payload)
+        except NetworkError:
+            raise
+        except Exception as e:
+            await self.journal.end_async(rq_uid, error=e)
+            raise
+        await self.journal.end_async(rq_uid, result)
+        return result
 
     async def registry(self, start_period: datetime, end_period: datetime,
                        registry_type: RegistryType = RegistryType.REGISTRY):
@@ -198,4 +627,46 @@ class AsyncSberQR:
                    "endPeriod": f'{end_period.isoformat(timespec="seconds")}Z',
                    "registryType": registry_type.value}
 
-        return await self.request(Methods.registry, headers, payload)
\ No newline at end of file
+        return await self.request(Methods.registry, headers, payload)
+
+    def registry_operations(self, start_period: datetime, end_period: datetime,
+                            window: timedelta = timedelta(hours=1),
+                            concurrency: int = 4) -> AsyncIterator[RegistryOperation]:
+        """
+        Потоковый запрос реестра операций: период разбивается на окна длиной window,
+        окна запрашиваются параллельно, операции возвращаются по одной.
+        Для продолжения прерванной выгрузки используйте RegistryReader
+        """
+        return RegistryReader(self, window, concurrency).operations(start_period, end_period)
+
+    def create_many(self, orders: Specs, concurrency: int = 10,
+                    rate: Optional[float] = None) -> AsyncIterator[BatchResult]:
+        """
+        Пакетное создание заказов. Результаты возвращаются по мере готовности,
+        ошибка создания одного заказа возвращается в BatchResult.error и не прерывает пакет.
+
+        :param orders: параметры creation: словари {'description', 'order_sum', 'order_number', 'positions'}
+            или кортежи в том же порядке
+        :param concurrency: максимальное количество одновременных запросов
+        :param rate: максимальное количество запросов в секунду
+        """
+        return run_batch(self.creation, orders, concurrency, rate, prepare=lambda: self.token(Scope.create))
+
+    def revoke_many(self, order_ids: Specs, concurrency: int = 10,
+                    rate: Optional[float] = None) -> AsyncIterator[BatchResult]:
+        """
+        Пакетная отмена неоплаченных заказов
+
+        :param order_ids: идентификаторы заказов
+        """
+        return run_batch(self.revoke, order_ids, concurrency, rate, prepare=lambda: self.token(Scope.revoke))
+
+    def cancel_many(self, operations: Specs, concurrency: int = 10,
+                    rate: Optional[float] = None) -> AsyncIterator[BatchResult]:
+        """
+        Пакетная отмена/возврат оплаченных заказов
+
+        :param operations: параметры cancel: словари {'order_id', 'operation_id', 'cancel_operation_sum',
+            'auth_code', ...} или кортежи в том же порядке
+        """
+        return run_batch(self.cancel, operations, concurrency, rate, prepare=lambda: self.token(Scope.cancel))
@@ -1,34 +1,110 @@
 import asyncio
 import base64
+import ssl
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import time
 from datetime import datetime
 from logging import getLogger
 from random import choices
 from string import hexdigits
-from typing import Optional, Union, List, Dict
+from typing import TYPE_CHECKING, Any, Callable, Optional, Union, List, Dict, Iterable, Iterator, Tuple
 
 import requests
-from redis.client import Redis
 from requests.adapters import HTTPAdapter
 from urllib3.util.ssl_ import create_urllib3_context
 
-from .api_sync import make_request, Methods
-from .payload import generate_payload
-from .scope import Scope
+from .api import Methods, API_URL
+from .api_sync import make_request, get_timeout
+from .batch import BatchResult, run_batch_sync
+from .codec import JSONCodec, get_codec
+from .exceptions import NetworkError, SberQrAPIError, RateLimitExceeded
+from .resilience import CircuitBreaker
+from .journal import Journal
+from .idempotency import IdempotencyCache, request_fingerprint
+from .metrics import CallbackInstrumentation, Instrumentation, combine
+from .qr import QRFormat, QRImage, QRRenderer
+from .ratelimit import RateLimiter, RedisRateLimiter
+from .redis_tokens import RedisTokenStore
+from .retry import RetryPolicy, is_retryable_error, is_throttled
+from .models import (Position, CreationRequest, StatusRequest, RevokeRequest, CancelRequest, CancelResult,
+                     StatusResult)
+from .scope import Scope, API_SCOPES
+from .status_cache import StatusCache
+from .tokens import TokenCache
+from .transport import SyncTransport, send_request_sync, timeout_bounds
 from .types import RegistryType, CancelType
 
+if TYPE_CHECKING:
+    from redis.client import Redis
+
 logger = getLogger(__name__)
 
 
+def create_ssl_context(crt_file_path: Optional[str], key_file_path: Optional[str], pkcs12_password: Optional[str],
+                       russian_crt: Optional[str]) -> ssl.SSLContext:
+    """
+    SSL контекст с клиентским сертификатом и сертификатом Минцифры.
+    Без путей к сертификатам (например, для SberQRSimulator) создается контекст по умолчанию
+    """
+    context = create_urllib3_context()
+    if crt_file_path is not None:
+        context.load_cert_chain(certfile=crt_file_path, keyfile=key_file_path, password=pkcs12_password)
+    if russian_crt is not None:
+        context.load_verify_locations(cafile=russian_crt)
+    else:
+        context.load_default_certs()
+    return context
+
+
+class SSLAdapter(HTTPAdapter):
+
+    def __init__(self, ssl_context: ssl.SSLContext, **kwargs):
+        self._ssl_context = ssl_context
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self._ssl_context
+        return super().init_poolmanager(*args, **kwargs)
+
+
 class SberQR:
+    """
+    Синхронный клиент. Один экземпляр можно использовать из нескольких потоков:
+    сессия, кэш токенов и circuit breaker'ы потокобезопасны, размер пула соединений задается pool_maxsize.
+    """
 
     def __init__(self, member_id: str, id_qr: str, tid: str,
                  client_id: str, client_secret: str,
-                 crt_file_path: str, key_file_path: str,
-                 pkcs12_password: str,
-                 russian_crt: str,
-                 redis: Union[str, Redis] = None,
+                 crt_file_path: Optional[str], key_file_path: Optional[str],
+                 pkcs12_password: Optional[str],
+                 russian_crt: Optional[str],
+                 redis: Union[str, 'Redis'] = None,
                  loop: Optional[Union[asyncio.BaseEventLoop, asyncio.AbstractEventLoop]] = None,
-                 timeout: Optional[Union[int, float, requests.Timeout]] = None):
+                 timeout: Optional[Union[int, float, Tuple[float, float]]] = None,
+                 token_refresh_margin: float = 60,
+                 method_timeouts: Optional[Dict[str, Union[int, float, Tuple[float, float]]]] = None,
+                 deadline: Optional[float] = None,
+                 retry: Optional[RetryPolicy] = None,
+                 breaker_failure_threshold: Optional[int] = 5,
+                 breaker_recovery_timeout: float = 30.0,
+                 ssl_context: Optional[ssl.SSLContext] = None,
+                 token_cache: Optional[TokenCache] = None,
+                 json_codec: Union[str, JSONCodec, None] = None,
+                 redis_lock_timeout: float = 10,
+                 instrumentation: Optional[Instrumentation] = None,
+                 on_request_start: Optional[Callable[[str, int], Any]] = None,
+                 on_request_end: Optional[Callable[[str, int, float, Optional[BaseException]], Any]] = None,
+                 base_url: Optional[str] = None,
+                 qr_renderer: Optional[QRRenderer] = None,
+                 pool_maxsize: int = 10,
+                 pool_block: bool = False,
+                 keep_alive: bool = True,
+                 idempotency: Optional[IdempotencyCache] = None,
+                 rate_limiter: Union[RateLimiter, RedisRateLimiter, None] = None,
+                 journal: Optional[Journal] = None,
+                 status_cache: Optional[StatusCache] = None,
+                 transport: Union[str, SyncTransport, None] = None):
         """
 
         :param member_id:
@@ -42,7 +118,33 @@ class SberQR:
         :param pkcs12_password:
         :param redis:
         :param loop:
-        :param timeout:
+        :param timeout: total timeout of one request in seconds (as in AsyncSberQR) or (connect, read) pair
+            limiting connect and each socket read, default (10, 30)
+        :param token_refresh_margin: seconds before expiry when a cached token is refreshed
+        :param method_timeouts: timeouts for specific methods, e.g. {Methods.registry: 120}
+        :param deadline: overall time budget of one API call including retries, seconds
+        :param retry: retry policy, RetryPolicy(attempts=1) disables retries
+        :param breaker_failure_threshold: consecutive failures that open the circuit of a method, None disables
+        :param breaker_recovery_timeout: seconds before an open circuit lets a probe request through
+        :param ssl_context: ready SSL context, certificate files are not loaded if it is passed
+        :param token_cache: token cache shared with other clients of the same client_id
+        :param json_codec: 'orjson', 'ujson', 'json' or JSONCodec, by default the fastest installed one
+        :param redis_lock_timeout: seconds one worker may hold the Redis lock while it refreshes a token
+        :param instrumentation: metrics/tracing, e.g. Metrics(), PrometheusInstrumentation() or several via combine()
+        :param on_request_start: hook(method, attempt) called before every request attempt
+        :param on_request_end: hook(method, attempt, duration, error) called after every request attempt
+        :param base_url: API address instead of https://mc.api.sberbank.ru/prod, e.g. SberQRSimulator.base_url
+        :param qr_renderer: QR image renderer with LRU cache used by qr(), may be shared between clients
+        :param pool_maxsize: connections kept open to the API host, set it to the number of worker threads
+        :param pool_block: wait for a free connection instead of opening (and discarding) an extra one
+        :param keep_alive: reuse connections between requests
+        :param idempotency: IdempotencyCache that deduplicates creation() by order_number
+        :param rate_limiter: per-method request rate limits, shared by all clients of the same client_id
+        :param journal: append-only journal of creation/revoke/cancel calls for crash recovery
+        :param status_cache: coalesces concurrent status() calls of one order, StatusCache(ttl=0.5, terminal_ttl=300)
+            also reuses responses
+        :param transport: 'httpx' - HTTP/2 via httpx (opened and closed by the client) or a shared SyncTransport,
+            by default requests
         """
 
         self._main_loop = loop
@@ -57,26 +159,58 @@ class SberQR:
         self._currency = "643"
         self._redis = None
 
-        class SSLAdapter(HTTPAdapter):
-            def init_poolmanager(self, *args, **kwargs):
-                context = create_urllib3_context()
-                context.load_cert_chain(certfile=crt_file_path, keyfile=key_file_path, password=pkcs12_password)
-                context.load_verify_locations(cafile=russian_crt)
-                kwargs['ssl_context'] = context
-                return super().init_poolmanager(*args, **kwargs)
+        if ssl_context is None:
+            ssl_context = create_ssl_context(crt_file_path, key_file_path, pkcs12_password, russian_crt)
 
         self._session: Optional[requests.Session] = None
-        self._https_class = SSLAdapter()
-        if isinstance(redis, Redis):
-            self._redis = redis
-        elif isinstance(redis, str):
+        self._session_lock = threading.Lock()
+        self._https_class = SSLAdapter(ssl_context, pool_connections=1, pool_maxsize=pool_maxsize,
+                                       pool_block=pool_block)
+        self._keep_alive = keep_alive
+        # размер пула соединений для метрик
+        self._pool_size = pool_maxsize
+        if isinstance(redis, str):
+            from redis.client import Redis
             self._redis = Redis(redis, decode_responses=True)
+        elif redis is not None:
+            self._redis = redis
+        self._redis_tokens = RedisTokenStore(self._redis, client_id, redis_lock_timeout) if self._redis else None
+
+        self._tokens = token_cache if token_cache is not None else TokenCache(refresh_margin=token_refresh_margin)
+        self._token_refresher: Optional[threading.Thread] = None
+        self._token_refresher_stop = threading.Event()
 
         self.timeout = timeout
+        self.method_timeouts = dict(method_timeouts or {})
+        self.deadline = deadline
+        self.retry = retry if retry is not None else RetryPolicy()
+        self.codec = get_codec(json_codec)
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.qr_renderer = qr_renderer if qr_renderer is not None else QRRenderer()
+        self.idempotency = idempotency
+        self.rate_limiter = rate_limiter
+        self.journal = journal
+        self.status_cache = status_cache if status_cache is not None else StatusCache()
+        self._own_transport = isinstance(transport, str)
+        if transport == 'httpx':
+            from .transport import HTTPXSyncTransport
+            transport = HTTPXSyncTransport(ssl_context, max_connections=pool_maxsize)
+        elif self._own_transport:
+            raise ValueError(f'Unknown transport {transport!r}, expected \'httpx\' or SyncTransport')
+        self.transport: Optional[SyncTransport] = transport
+        hooks = CallbackInstrumentation(on_request_start, on_request_end) if on_request_start or on_request_end else None
+        self.instrumentation = combine(instrumentation, hooks)
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._breaker_failure_threshold = breaker_failure_threshold
+        self._breaker_recovery_timeout = breaker_recovery_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
 
     def get_new_session(self) -> requests.Session:
         session = requests.Session()
         session.mount("https://", self._https_class)
+        if not self._keep_alive:
+            session.headers['Connection'] = 'close'
         return session
 
     @property
@@ -85,7 +219,9 @@ class SberQR:
 
     def get_session(self) -> Optional[requests.Session]:
         if self._session is None:
-            self._session = self.get_new_session()
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self.get_new_session()
 
         return self._session
 
@@ -93,12 +229,108 @@ class SberQR:
         """
         Close all client sessions
         """
+        self.stop_token_refresher()
         if self._session:
             self._session.close()
+        if self._own_transport:
+            self.transport.close()
 
     def request(self, method, headers, data):
         headers = {**headers, **{'Accept': 'application/json', 'x-ibm-client-id': self._client_id}}
-        return make_request(self.get_session(), method, headers, data)
+        timeout = self.method_timeouts.get(method, self.timeout)
+        deadline = time.monotonic() + self.deadline if self.deadline else None
+        attempt = 0
+        while True:
+            try:
+                return self._send(method, headers, data, timeout, deadline, attempt)
+            except (NetworkError, SberQrAPIError) as e:
+                if not self.retry.should_retry(method, e, attempt):
+                    raise
+                delay = self.retry.delay(attempt)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                self.instrumentation.retry(method, attempt, delay, e)
+                attempt += 1
+                logger.warning('Retrying %s in %.2f s (attempt %d): %r', method, delay, attempt + 1, e)
+                time.sleep(delay)
+
+    def _send(self, method, headers, data, timeout, deadline, attempt=0):
+        """
+        Одна попытка запроса через лимит запросов и circuit breaker
+        """
+        if self.rate_limiter is not None:
+            self._acquire_rate_limit(method, deadline)
+        breaker = self.get_breaker(method)
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = self._instrumented_request(method, headers, data, timeout, deadline, attempt)
+        except (NetworkError, SberQrAPIError) as e:
+            if breaker is not None:
+                breaker.on_failure() if is_retryable_error(e) and not is_throttled(e) else breaker.on_success()
+            raise
+        except BaseException:
+            if breaker is not None:
+                breaker.on_abort()
+            raise
+        if breaker is not None:
+            breaker.on_success()
+        return result
+
+    def _acquire_rate_limit(self, method, deadline):
+        if self.rate_limiter.limit(method) is None:
+            return
+        max_wait = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+        try:
+            wait = self.rate_limiter.acquire_sync(method, max_wait)
+        except RateLimitExceeded:
+            self.instrumentation.rate_limit(method, 0.0, True)
+            raise
+        self.instrumentation.rate_limit(method, wait, False)
+
+    def _instrumented_request(self, method, headers, data, timeout, deadline, attempt):
+        instrumentation = self.instrumentation
+        with self._in_flight_lock:
+            self._in_flight += 1
+            in_flight = self._in_flight
+        instrumentation.pool_usage(in_flight, self._pool_size)
+        state = instrumentation.request_start(method, attempt)
+        started = time.perf_counter()
+        error = None
+        try:
+            if self.transport is not None:
+                return send_request_sync(self.transport, method, headers, data, self.codec, timeout, deadline,
+                                         self.base_url)
+            return make_request(self.get_session(), method, headers, data, timeout=timeout, deadline=deadline,
+                                codec=self.codec, base_url=self.base_url)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            with self._in_flight_lock:
+                self._in_flight -= 1
+                in_flight = self._in_flight
+            instrumentation.request_end(method, attempt, time.perf_counter() - started, error, state)
+            instrumentation.pool_usage(in_flight, self._pool_size)
+
+    def get_breaker(self, method: str) -> Optional[CircuitBreaker]:
+        """
+        Circuit breaker метода API (None, если breaker отключен)
+        """
+        if self._breaker_failure_threshold is None:
+            return None
+        breaker = self._breakers.get(method)
+        if breaker is None:
+            breaker = self._breakers.setdefault(method, CircuitBreaker(method, self._breaker_failure_threshold,
+                                                                       self._breaker_recovery_timeout))
+        return breaker
+
+    def health(self) -> Dict[str, Dict]:
+        """
+        Состояние circuit breaker'ов по методам API для health check
+        """
+        health = {method: breaker.snapshot() for method, breaker in self._breakers.items()}
+        return health
 
     def get_token_from_redis(self, scope):
         """
@@ -108,74 +340,287 @@ class SberQR:
         """
         return self._redis.get(f'{self._client_id}token_{scope.value}')
 
+    def _fetch_token(self, scope: Scope):
+        """
+        Достает токен из Redis (если он настроен), иначе запрашивает новый
+        :return: (token, expires_in)
+        """
+        if self._redis_tokens is None:
+            return self._request_token(scope)
+
+        store, margin = self._redis_tokens, self._tokens.refresh_margin
+        token, ttl = store.get(scope)
+        if token is not None and store.fresh(scope, ttl, margin):
+            return token, ttl
+        lock = store.acquire_lock(scope)
+        if lock is None:
+            # токен обновляет другой процесс: до истечения используется текущий, иначе ждем новый
+            if token is not None and ttl > 0:
+                return token, ttl
+            cached = store.wait(scope)
+            if cached is not None:
+                return cached
+            logger.warning('Token %s was not refreshed by the lock holder in %s s, requesting it',
+                           scope.value, store.lock_timeout)
+        try:
+            if lock is not None:
+                # токен мог быть обновлен, пока блокировку держал другой процесс
+                token, ttl = store.get(scope)
+                if token is not None and store.fresh(scope, ttl, margin):
+                    return token, ttl
+            token, expires_in = self._request_token(scope)
+            store.set(scope, token, expires_in - 10)
+            return token, expires_in
+        finally:
+            if lock is not None:
+                store.release_lock(scope, lock)
+
+    def _request_token(self, scope: Scope):
+        """
+        Запрашивает новый токен
+        :return: (token, expires_in)
+        """
+        auth = base64.b64encode(f'{self._client_id}:{self._client_secret}'.encode('utf-8')).decode('utf-8')
+        headers = {'Authorization': f'Basic {auth}',
+                   'Content-Type': 'application/x-www-form-urlencoded',
+                   'rquid': ''.join(choices(hexdigits, k=32))}
+        data = {'grant_type': 'client_credentials', 'scope': scope.value}
+        token_data = self.request(Methods.oauth, headers, data)
+        return token_data['access_token'], int(token_data['expires_in'])
+
+    def _load_tokens(self, scopes: Iterable[Scope]):
+        """
+        Загружает в память токены scopes, сохраненные в Redis другими процессами, одним запросом
+        """
+        if self._redis_tokens is None:
+            return
+        missing = [scope for scope in scopes if self._tokens.get(scope) is None]
+        if not missing:
+            return
+        for scope, (token, ttl) in self._redis_tokens.get_many(missing).items():
+            if token is not None and self._redis_tokens.fresh(scope, ttl, self._tokens.refresh_margin):
+                self._tokens.set(scope, token, ttl)
+
     def token(self, scope: Scope):
-        redis_token = self.get_token_from_redis(scope) if self._redis else None
-        if redis_token is not None:
-            return redis_token
-        else:
-            auth = base64.b64encode(f'{self._client_id}:{self._client_secret}'.encode('utf-8')).decode('utf-8')
-            headers = {'Authorization': f'Basic {auth}',
-                       'Content-Type': 'application/x-www-form-urlencoded',
-                       'rquid': ''.join(choices(hexdigits, k=32))}
-            data = {'grant_type': 'client_credentials', 'scope': scope.value}
-            token_data = self.request(Methods.oauth, headers, data)
-            if self._redis:
-                self._redis.set(f'{self._client_id}token_{scope.value}', token_data['access_token'],
-                                int(token_data['expires_in']) - 10)
-            return token_data['access_token']
-
-    def creation(self, description: str, order_sum: int, order_number: str, positions: Union[List, Dict]):
-        """
-        Создание заказа
         """
+        Возвращает токен для области scope.
+        Токен хранится в памяти процесса до истечения expires_in, Redis используется как второй уровень кэша.
+        """
+        token = self._tokens.get(scope)
+        self.instrumentation.token_lookup(scope, token is not None)
+        if token is not None:
+            return token
+        return self._tokens.fetch_sync(scope, lambda: self._fetch_token(scope))
+
+    def warmup(self, scopes: Iterable[Scope] = API_SCOPES, connections: int = 1, refresh: bool = True):
+        """
+        Прогрев клиента: параллельно получает токены областей scopes и открывает соединения с API,
+        чтобы первые запросы после запуска не тратили время на OAuth и TLS handshake.
+
+        :param scopes: области, токены которых нужно получить
+        :param connections: количество дополнительно открываемых соединений
+        :param refresh: запустить фоновое обновление токенов scopes
+        """
+        scopes = tuple(scopes)
+        self._load_tokens(scopes)
+        with ThreadPoolExecutor(max_workers=max(len(scopes) + connections, 1)) as executor:
+            futures = [executor.submit(self.token, scope) for scope in scopes]
+            futures += [executor.submit(self._open_connection) for _ in range(connections)]
+            for future in futures:
+                future.result()
+        if refresh and scopes:
+            self.start_token_refresher(scopes)
+
+    def _open_connection(self):
+        if self.transport is not None:
+            try:
+                self.transport.open_connection(self.base_url or API_URL, timeout_bounds(self.timeout))
+            except NetworkError as e:
+                logger.warning('Unable to open connection to %s: %r', self.base_url or API_URL, e)
+            return
+        try:
+            self.get_session().head(self.base_url or API_URL, timeout=get_timeout(self.timeout)).close()
+        except requests.RequestException as e:
+            logger.warning('Unable to open connection to %s: %r', self.base_url or API_URL, e)
+
+    def start_token_refresher(self, scopes: Iterable[Scope] = API_SCOPES, retry_delay: float = 5):
+        """
+        Запускает фоновый поток, который обновляет токены scopes до истечения их срока действия.
+        Поток останавливается в close()
+
+        :param scopes: области, токены которых нужно поддерживать актуальными
+        :param retry_delay: пауза перед повторной попыткой после ошибки обновления
+        """
+        scopes = tuple(scopes)
+        if not scopes:
+            raise ValueError('scopes must not be empty')
+        if self._token_refresher is None or not self._token_refresher.is_alive():
+            self._token_refresher_stop.clear()
+            self._token_refresher = threading.Thread(target=self._refresh_tokens, args=(scopes, retry_delay),
+                                                     name='SberQR-token-refresher', daemon=True)
+            self._token_refresher.start()
+
+    def stop_token_refresher(self):
+        self._token_refresher_stop.set()
+        if self._token_refresher is not None and self._token_refresher is not threading.current_thread():
+            self._token_refresher.join()
+        self._token_refresher = None
+
+    def _refresh_tokens(self, scopes, retry_delay):
+        stop = self._token_refresher_stop
+        while not stop.wait(min(self._tokens.refresh_in(scope) for scope in scopes)):
+            try:
+                self._load_tokens(scopes)
+                for scope in scopes:
+                    self.token(scope)
+            except Exception:
+                logger.exception('Token refresh failed, retrying in %s s', retry_delay)
+                stop.wait(retry_delay)
+
+    def creation(self, description: str, order_sum: int, order_number: str,
+                 positions: Union[List[Union[Position, Dict]], Position, Dict], rq_uid: Optional[str] = None):
+        """
+        Создание заказа.
+        С idempotency повторный вызов с тем же order_number возвращает сохраненный ответ, а повтор после
+        ошибки или таймаута отправляется с RqUID первой попытки. Повтор с тем же order_number, но другими
+        описанием, суммой или позициями вызывает IdempotencyConflict
+
+        :param rq_uid: RqUID запроса (по умолчанию случайный)
+        """
+        if isinstance(positions, (dict, Position)):
+            positions = [positions]
+        if self.idempotency is None:
+            return self._creation(rq_uid or ''.join(choices(hexdigits, k=32)), description, order_sum,
+                                  order_number, positions)
+        fingerprint = request_fingerprint(
+            [description, order_sum,
+             [position.to_payload() if isinstance(position, Position) else position for position in positions]])
+        return self.idempotency.execute(
+            f'{self._id_qr}:{order_number}',
+            lambda uid: self._creation(uid, description, order_sum, order_number, positions), rq_uid, fingerprint)
+
+    def _creation(self, rq_uid: str, description: str, order_sum: int, order_number: str,
+                  positions: List[Union[Position, Dict]]):
         dt = f'{datetime.utcnow().isoformat(timespec="seconds")}Z'
-        rq_uid = ''.join(choices(hexdigits, k=32))
         headers = {'Authorization': f'Bearer {self.token(Scope.create)}', 'RqUID': rq_uid}
+        payload = CreationRequest(
+            rq_uid=rq_uid, rq_tm=dt, member_id=self._member_id, order_number=order_number, order_create_date=dt,
+            order_params_type=positions, id_qr=self._id_qr, order_sum=order_sum, currency=self._currency,
+            description=description, sbp_member_id=self._sbp_member_id if self._tid == self._id_qr else None
+        ).to_payload()
+        params = {'order_number': order_number, 'order_sum': order_sum, 'description': description}
+        return self._journaled(Methods.creation, rq_uid, params, headers, payload)
+
+    def qr(self, order: Union[str, Dict], fmt: Union[str, QRFormat] = QRFormat.PNG, box_size: int = 10,
+           border: int = 4) -> QRImage:
+        """
+        QR-код ссылки на оплату с кэшированием.
+        Повторный рендеринг той же ссылки с теми же параметрами берется из кэша
 
-        rq_tm, order_create_date = dt, dt
-        member_id, id_qr, currency = self._member_id, self._id_qr, self._currency
+        :param order: ответ creation или order_form_url
+        :param fmt: 'png' (bytes), 'svg' (bytes) или 'text' (str для вывода в терминал)
+        """
+        return self.qr_renderer.render(order, fmt, box_size, border)
 
-        sbp_member_id = self._sbp_member_id if self._tid == self._id_qr else None
+    def status(self, order_id: str, partner_order_number: str):
+        """
+        Статус заказа. Одновременные запросы статуса одного заказа выполняются одним запросом,
+        с status_cache ответ берется из кэша
+        """
+        return self.status_cache.fetch_sync(order_id, partner_order_number,
+                                            lambda: self._status(order_id, partner_order_number))
 
-        if isinstance(positions, dict):
-            order_params_type = [positions]
-        else:
-            order_params_type = positions
-        del positions
-        payload = generate_payload(exclude=['dt', 'headers'], **locals())
-        return self.request(Methods.creation, headers, payload)
+    def status_result(self, order_id: str, partner_order_number: str) -> StatusResult:
+        """
+        status() с ответом, разобранным в StatusResult
 
-    def status(self, order_id: str, partner_order_number: str):
+        :raises ValueError: если в ответе нет order_id или order_state (например, заказ не найден)
+        """
+        return StatusResult.from_response(self.status(order_id, partner_order_number))
+
+    def _status(self, order_id: str, partner_order_number: str):
         rq_uid = ''.join(choices(hexdigits, k=32))
         headers = {'Authorization': f'Bearer {self.token(Scope.status)}', 'RqUID': rq_uid}
-        tid = self._tid
-        rq_tm = f'{datetime.utcnow().isoformat(timespec="seconds")}Z'
-        payload = generate_payload(exclude=['headers'], **locals())
+        payload = StatusRequest(rq_uid=rq_uid, rq_tm=f'{datetime.utcnow().isoformat(timespec="seconds")}Z',
+                                order_id=order_id, tid=self._tid,
+                                partner_order_number=partner_order_number).to_payload()
         return self.request(Methods.status, headers, payload)
 
-    def revoke(self, order_id: str):
+    def revoke(self, order_id: str, partner_order_number: str = None):
+        """
+        Отмена неоплаченного заказа
+
+        :param partner_order_number: номер заказа в системе партнера, записывается в journal
+            для проверки запроса status() после сбоя
+        """
         rq_uid = ''.join(choices(hexdigits, k=32))
         headers = {'Authorization': f'Bearer {self.token(Scope.revoke)}', 'RqUID': rq_uid}
-
-        rq_tm = f'{datetime.utcnow().isoformat(timespec="seconds")}Z'
-        payload = generate_payload(exclude=['headers'], **locals())
-        return self.request(Methods.revocation, headers, payload)
+        payload = RevokeRequest(rq_uid=rq_uid, rq_tm=f'{datetime.utcnow().isoformat(timespec="seconds")}Z',
+                                order_id=order_id).to_payload()
+        try:
+            return self._journaled(Methods.revocation, rq_uid,
+                                   {'order_id': order_id, 'partner_order_number': partner_order_number},
+                                   headers, payload)
+        finally:
+            self.status_cache.invalidate(order_id)
 
     def cancel(
             self, order_id: str, operation_id: str, cancel_operation_sum: int, auth_code: str,
-            operation_type: CancelType = CancelType.REVERSE, sbp_payer_id: str = None
+            operation_type: CancelType = CancelType.REVERSE, sbp_payer_id: str = None,
+            partner_order_number: str = None
     ):
         """
         Отмена/возврат
+
+        :param partner_order_number: номер заказа в системе партнера, записывается в journal
+            для проверки запроса status() после сбоя
         """
         rq_uid = ''.join(choices(hexdigits, k=32))
         headers = {'Authorization': f'Bearer {self.token(Scope.cancel)}', 'RqUID': rq_uid}
+        payload = CancelRequest(
+            rq_uid=rq_uid, rq_tm=f'{datetime.utcnow().isoformat(timespec="seconds")}Z', order_id=order_id,
+            operation_type=operation_type.value, operation_id=operation_id, auth_code=auth_code, id_qr=self._id_qr,
+            tid=self._tid, cancel_operation_sum=cancel_operation_sum, operation_currency=self._currency,
+            sbp_payer_id=sbp_payer_id
+        ).to_payload()
+        params = {'order_id': order_id, 'operation_id': operation_id, 'cancel_operation_sum': cancel_operation_sum,
+                  'auth_code': auth_code, 'operation_type': operation_type.value, 'sbp_payer_id': sbp_payer_id,
+                  'partner_order_number': partner_order_number}
+        try:
+            return self._journaled(Methods.cancel, rq_uid, params, headers, payload)
+        finally:
+            self.status_cache.invalidate(order_id)
+
+    def cancel_result(
+            self, order_id: str, operation_id: str, cancel_operation_sum: int, auth_code: str,
+            operation_type: CancelType = CancelType.REVERSE, sbp_payer_id: str = None,
+            partner_order_number: str = None
+    ) -> CancelResult:
+        """
+        cancel() с ответом, разобранным в CancelResult
 
-        rq_tm = f'{datetime.utcnow().isoformat(timespec="seconds")}Z'
-        id_qr, tid, operation_currency = self._id_qr, self._tid, self._currency
-        operation_type = operation_type.value
-        payload = generate_payload(exclude=['headers'], **locals())
-        return self.request(Methods.cancel, headers, payload)
+        :raises ValueError: если в ответе нет order_id
+        """
+        return CancelResult.from_response(self.cancel(order_id, operation_id, cancel_operation_sum, auth_code,
+                                                      operation_type, sbp_payer_id, partner_order_number))
+
+    def _journaled(self, method, rq_uid, params, headers, payload):
+        """
+        Запрос, изменяющий заказ: с journal до отправки записывается begin, после ответа - end.
+        После таймаута и сетевой ошибки неизвестно, выполнен ли запрос, поэтому запись остается без end
+        """
+        if self.journal is None:
+            return self.request(method, headers, payload)
+        self.journal.begin(rq_uid, method, params)
+        try:
+            result = self.request(method, headers, payload)
+        except NetworkError:
+            raise
+        except Exception as e:
+            self.journal.end(rq_uid, error=e)
+            raise
+        self.journal.end(rq_uid, result)
+        return result
 
     def registry(self, start_period: datetime, end_period: datetime,
                  registry_type: RegistryType = RegistryType.REGISTRY):
@@ -192,3 +637,40 @@ class SberQR:
                    "registryType": registry_type.value}
 
         return self.request(Methods.registry, headers, payload)
+
+    def create_many(self, orders: Iterable, max_workers: int = 10) -> Iterator[BatchResult]:
+        """
+        Пакетное создание заказов в пуле потоков. Результаты возвращаются по мере готовности,
+        ошибка создания одного заказа возвращается в BatchResult.error и не прерывает пакет.
+
+        :param orders: параметры creation: словари {'description', 'order_sum', 'order_number', 'positions'}
+            или кортежи в том же порядке
+        :param max_workers: количество потоков (не больше pool_maxsize, иначе соединения будут открываться заново)
+        """
+        return run_batch_sync(self.creation, orders, max_workers, prepare=lambda: self.token(Scope.create))
+
+    def status_many(self, orders: Iterable, max_workers: int = 10) -> Iterator[BatchResult]:
+        """
+        Пакетный запрос статусов в пуле потоков
+
+        :param orders: пары (order_id, partner_order_number) или словари с такими ключами
+        :param max_workers: количество потоков
+        """
+        return run_batch_sync(self.status, orders, max_workers, prepare=lambda: self.token(Scope.status))
+
+    def revoke_many(self, order_ids: Iterable, max_workers: int = 10) -> Iterator[BatchResult]:
+        """
+        Пакетная отмена неоплаченных заказов в пуле потоков
+
+        :param order_ids: идентификаторы заказов
+        """
+        return run_batch_sync(self.revoke, order_ids, max_workers, prepare=lambda: self.token(Scope.revoke))
+
+    def cancel_many(self, operations: Iterable, max_workers: int = 10) -> Iterator[BatchResult]:
+        """
+        Пакетная отмена/возврат оплаченных заказов в пуле потоков
+
+        :param operations: параметры cancel: словари {'order_id', 'operation_id', 'cancel_operation_sum',
+            'auth_code', ...} или кортежи в том же порядке
+        """
+        return run_batch_sync(self.cancel, operations, max_workers, prepare=lambda: self.token(Scope.cancel))
@@ -1,14 +1,71 @@
 import sys
+from importlib import import_module
+from types import ModuleType
+from typing import TYPE_CHECKING
 
 if sys.version_info < (3, 7):
     raise RuntimeError('Your Python version {0} is not supported, please install '
                        'Python 3.7+'.format('.'.join(map(str, sys.version_info[:3]))))
 
-from .AsyncSberQR import AsyncSberQR
-from .SberQr import SberQR
 from .api import make_request, Methods
 from .exceptions import (NetworkError, SberQrAPIError)
 
+if TYPE_CHECKING:
+    from .AsyncSberQR import AsyncSberQR
+    from .SberQr import SberQR
+    from .poller import StatusPoller, PollResult
+    from .pool import AsyncSberQRPool
+    from .pool_sync import SberQRPool
+
 __author__ = 'bl4ckm45k'
 __version__ = '2.0.2'
 __email__ = 'nonpowa@gmail.com'
+
+# Клиенты загружаются при первом обращении: AsyncSberQR импортирует aiohttp, SberQR - requests и urllib3,
+# поэтому сервис, использующий один клиент, не тратит время на импорт второго стека
+_LAZY = {
+    'AsyncSberQR': '.AsyncSberQR',
+    'SberQR': '.SberQr',
+    'StatusPoller': '.poller',
+    'PollResult': '.poller',
+    'AsyncSberQRPool': '.pool',
+    'SberQRPool': '.pool_sync',
+}
+
+# стек, который нужно установить для модуля
+_EXTRAS = {'.AsyncSberQR': 'async', '.pool': 'async', '.SberQr': 'sync', '.pool_sync': 'sync'}
+
+__all__ = ['make_request', 'Methods', 'NetworkError', 'SberQrAPIError', *_LAZY]
+
+
+def __getattr__(name: str):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    try:
+        value = getattr(import_module(module, __name__), name)
+    except ModuleNotFoundError as e:
+        if module not in _EXTRAS or e.name is None or e.name.startswith(__name__):
+            raise
+        raise ImportError(f'{name} requires {e.name}: pip install SberQR[{_EXTRAS[module]}]') from e
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+class _Package(ModuleType):
+
+    def __getattribute__(self, name: str):
+        value = super().__getattribute__(name)
+        # импорт подмодуля (import SberQR.AsyncSberQR, импорт pool) записывает модуль в атрибут пакета
+        # с именем класса, атрибутом пакета должен остаться класс
+        if isinstance(value, ModuleType) and name in _LAZY and value.__name__ == __name__ + _LAZY[name]:
+            value = getattr(value, name)
+            super().__setattr__(name, value)
+        return value
+
+
+sys.modules[__name__].__class__ = _Package
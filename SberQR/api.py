@@ -1,10 +1,38 @@
 import logging
+import time
 from http import HTTPStatus
+from typing import TYPE_CHECKING, Dict, NamedTuple, Optional, Union
+from urllib.parse import urlencode
 
-from SberQR.exceptions import SberQrAPIError, NetworkError
+from SberQR.codec import JSONCodec, get_codec
+from SberQR.exceptions import SberQrAPIError, NetworkError, RequestTimeoutError
+
+if TYPE_CHECKING:
+    import aiohttp
 
 logger = logging.getLogger('api')
 
+API_URL = 'https://mc.api.sberbank.ru/prod'
+
+# Methods и check_result используются и синхронным клиентом, поэтому aiohttp импортируется при первом запросе
+DEFAULT_TOTAL_TIMEOUT = 30
+DEFAULT_CONNECT_TIMEOUT = 10
+_default_timeout: Optional['aiohttp.ClientTimeout'] = None
+
+
+def __getattr__(name: str):
+    if name == 'DEFAULT_TIMEOUT':
+        return _get_default_timeout()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def _get_default_timeout() -> 'aiohttp.ClientTimeout':
+    global _default_timeout
+    if _default_timeout is None:
+        import aiohttp
+        _default_timeout = aiohttp.ClientTimeout(total=DEFAULT_TOTAL_TIMEOUT, connect=DEFAULT_CONNECT_TIMEOUT)
+    return _default_timeout
+
 
 def check_result(method_name: str, content_type: str, status_code: int, body):
     """
@@ -29,34 +57,119 @@ def check_result(method_name: str, content_type: str, status_code: int, body):
     if HTTPStatus.OK <= status_code <= HTTPStatus.IM_USED:
         return body
     elif status_code == HTTPStatus.BAD_REQUEST:
-        raise SberQrAPIError(f"{body} [{status_code}]")
+        raise SberQrAPIError(f"{body} [{status_code}]", status_code)
     elif status_code == HTTPStatus.NOT_FOUND:
-        raise SberQrAPIError(f"{body} [{status_code}]")
+        raise SberQrAPIError(f"{body} [{status_code}]", status_code)
     elif status_code == HTTPStatus.CONFLICT:
-        raise SberQrAPIError(f"{body} [{status_code}]")
+        raise SberQrAPIError(f"{body} [{status_code}]", status_code)
     elif status_code in (HTTPStatus.UNAUTHORIZED, HTTPStatus.FORBIDDEN):
-        raise SberQrAPIError(f"{body} [{status_code}]")
+        raise SberQrAPIError(f"{body} [{status_code}]", status_code)
+    elif status_code == HTTPStatus.TOO_MANY_REQUESTS:
+        raise SberQrAPIError(f"Rate limit exceeded: {body} [{status_code}]", status_code)
     elif status_code >= HTTPStatus.INTERNAL_SERVER_ERROR:
-        raise SberQrAPIError(f"{body} [{status_code}]")
+        raise SberQrAPIError(f"{body} [{status_code}]", status_code)
+    else:
+        raise SberQrAPIError(f"Unexpected response: {body} [{status_code}]", status_code)
 
 
-async def make_request(session, method, headers, data, **kwargs):
-    url = f'https://mc.api.sberbank.ru/prod/{method}'
+def decode_body(method_name: str, content_type: str, status_code: int, raw: bytes, codec: JSONCodec):
+    """
+    Декодирует тело ответа, прочитанное один раз как bytes.
+    Не-JSON ответ возвращается строкой, check_result превратит его в ошибку
 
-    if method != Methods.oauth:
-        async with session.post(url, json=data, headers=headers) as response:
-            try:
-                body = await response.json()
-            except:
-                body = response.text
-            return check_result(method, response.content_type, response.status, body)
-    else:
-        async with session.post(url, data=data, headers=headers) as response:
-            try:
-                body = await response.json()
-            except:
-                body = response.text
-            return check_result(method, response.content_type, response.status, body)
+    :raises NetworkError: если успешный ответ содержит некорректный JSON
+    """
+    if content_type != 'application/json':
+        return raw.decode('utf-8', errors='replace')
+    try:
+        return codec.loads(raw)
+    except ValueError as e:
+        if HTTPStatus.OK <= status_code <= HTTPStatus.IM_USED:
+            raise NetworkError(f'Invalid JSON in response for {method_name}: {raw[:200]!r}') from e
+        # ошибка API с некорректным телом: check_result выбросит SberQrAPIError с кодом ответа
+        return raw.decode('utf-8', errors='replace')
+
+
+class PreparedRequest(NamedTuple):
+    url: str
+    headers: Dict[str, str]
+    body: bytes
+
+
+def prepare_request(method: str, headers: Dict[str, str], data, codec: JSONCodec,
+                    base_url: Optional[str] = None) -> PreparedRequest:
+    """
+    Строит запрос к методу API без ввода-вывода: тело oauth кодируется как форма, остальных методов - как JSON.
+    Используется всеми транспортами (aiohttp, requests, httpx)
+    """
+    url = f'{base_url or API_URL}/{method}'
+    if method == Methods.oauth:
+        return PreparedRequest(url, headers, urlencode(data).encode('utf-8'))
+    return PreparedRequest(url, {**headers, 'Content-Type': 'application/json'}, codec.dumps(data))
+
+
+def parse_content_type(value: Optional[str]) -> str:
+    """
+    'application/json; charset=utf-8' -> 'application/json'
+    """
+    return (value or '').split(';', 1)[0].strip().lower()
+
+
+def parse_response(method_name: str, content_type: str, status_code: int, raw: bytes, codec: JSONCodec):
+    """
+    Разбирает ответ, прочитанный транспортом как bytes
+
+    :return: JSON ответа
+    :raises SberQrAPIError: если API вернул ошибку
+    :raises NetworkError: если ответ не JSON
+    """
+    body = decode_body(method_name, content_type, status_code, raw, codec)
+    return check_result(method_name, content_type, status_code, body)
+
+
+def get_timeout(timeout: Optional[Union[int, float, 'aiohttp.ClientTimeout']],
+                deadline: Optional[float] = None) -> 'aiohttp.ClientTimeout':
+    """
+    Приводит timeout к aiohttp.ClientTimeout и ограничивает общее время попытки оставшимся до deadline временем
+
+    :param timeout: секунды на весь запрос или aiohttp.ClientTimeout
+    :param deadline: момент времени по time.monotonic(), после которого запрос не выполняется
+    :raises RequestTimeoutError: если deadline уже наступил
+    """
+    import aiohttp
+
+    if timeout is None:
+        timeout = _get_default_timeout()
+    elif not isinstance(timeout, aiohttp.ClientTimeout):
+        timeout = aiohttp.ClientTimeout(total=timeout, connect=DEFAULT_CONNECT_TIMEOUT)
+    if deadline is None:
+        return timeout
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise RequestTimeoutError('Request deadline exceeded')
+    return aiohttp.ClientTimeout(total=min(timeout.total or remaining, remaining), connect=timeout.connect,
+                                 sock_read=timeout.sock_read, sock_connect=timeout.sock_connect)
+
+
+async def make_request(session, method, headers, data, timeout=None, deadline=None,
+                       codec: Optional[JSONCodec] = None, base_url: Optional[str] = None, **kwargs):
+    import asyncio
+    import aiohttp
+
+    timeout = get_timeout(timeout, deadline)
+    codec = codec or get_codec()
+    request = prepare_request(method, headers, data, codec, base_url)
+
+    try:
+        async with session.post(request.url, headers=request.headers, timeout=timeout,
+                                data=request.body) as response:
+            raw = await response.read()
+            return parse_response(method, response.content_type, response.status, raw, codec)
+    except asyncio.TimeoutError as e:
+        raise RequestTimeoutError(f'Request to {method} timed out') from e
+    except aiohttp.ClientError as e:
+        raise NetworkError(f'Request to {method} failed: {e!r}') from e
 
 
 class Methods:
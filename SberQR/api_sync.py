@@ -1,20 +1,89 @@
-from .api import check_result, Methods
-
-
-def make_request(session, method, headers, data, **kwargs):
-    url = f'https://mc.api.sberbank.ru/prod/{method}'
-
-    if method != Methods.oauth:
-        with session.post(url, json=data, headers=headers) as response:
-            try:
-                body = response.json()
-            except Exception:
-                body = response.text
-            return check_result(method, response.headers.get('Content-Type'), response.status_code, body)
-    else:
-        with session.post(url, data=data, headers=headers) as response:
-            try:
-                body = response.json()
-            except Exception:
-                body = response.text
-            return check_result(method, response.headers.get('Content-Type'), response.status_code, body)
+import time
+from typing import Optional, Tuple, Union
+
+import requests
+from urllib3.exceptions import HTTPError, ReadTimeoutError
+
+from .api import parse_content_type, parse_response, prepare_request
+from .codec import JSONCodec, get_codec
+from .exceptions import NetworkError, RequestTimeoutError
+
+# (connect, read)
+DEFAULT_TIMEOUT = (10, 30)
+_CHUNK_SIZE = 65536
+
+
+def request_deadline(timeout: Optional[Union[int, float, Tuple[float, float]]],
+                     deadline: Optional[float] = None) -> Optional[float]:
+    """
+    Число секунд в timeout - общее время запроса, как у AsyncSberQR: переводится в deadline попытки.
+    Для пары (connect, read) общее время ограничивает только deadline
+
+    :param deadline: момент времени по time.monotonic(), после которого запрос не выполняется
+    """
+    if timeout is None or isinstance(timeout, tuple):
+        return deadline
+    total = time.monotonic() + timeout
+    return total if deadline is None else min(total, deadline)
+
+
+def get_timeout(timeout: Optional[Union[int, float, Tuple[float, float]]],
+                deadline: Optional[float] = None) -> Tuple[float, float]:
+    """
+    Приводит timeout к паре (connect, read) для requests и ограничивает ее оставшимся до deadline временем
+
+    :param timeout: секунды на весь запрос (используйте вместе с request_deadline) или пара (connect, read)
+    :param deadline: момент времени по time.monotonic(), после которого запрос не выполняется
+    :raises RequestTimeoutError: если deadline уже наступил
+    """
+    if timeout is None:
+        timeout = DEFAULT_TIMEOUT
+    elif not isinstance(timeout, tuple):
+        timeout = (DEFAULT_TIMEOUT[0], timeout)
+    if deadline is None:
+        return timeout
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise RequestTimeoutError('Request deadline exceeded')
+    connect, read = timeout
+    return min(connect or remaining, remaining), min(read or remaining, remaining)
+
+
+def _read(response, method: str, deadline: Optional[float]) -> bytes:
+    if deadline is None:
+        return response.content
+    # requests ограничивает только каждое чтение из сокета, а iter_content ждет, пока часть заполнится целиком,
+    # поэтому тело читается по одному чтению из сокета (read1), общее время проверяется после каждого
+    chunks = []
+    try:
+        while True:
+            chunk = response.raw.read1(_CHUNK_SIZE, decode_content=True)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+            if time.monotonic() > deadline:
+                raise RequestTimeoutError(f'Request to {method} timed out')
+    except ReadTimeoutError as e:
+        raise RequestTimeoutError(f'Request to {method} timed out') from e
+    except HTTPError as e:
+        raise NetworkError(f'Request to {method} failed: {e!r}') from e
+
+
+def make_request(session, method, headers, data, timeout=None, deadline=None,
+                 codec: Optional[JSONCodec] = None, base_url: Optional[str] = None, **kwargs):
+    deadline = request_deadline(timeout, deadline)
+    timeout = get_timeout(timeout, deadline)
+    codec = codec or get_codec()
+    request = prepare_request(method, headers, data, codec, base_url)
+
+    try:
+        with session.post(request.url, headers=request.headers, timeout=timeout, data=request.body,
+                          stream=deadline is not None) as response:
+            content_type = parse_content_type(response.headers.get('Content-Type'))
+            return parse_response(method, content_type, response.status_code, _read(response, method, deadline),
+                                  codec)
+    except requests.Timeout as e:
+        raise RequestTimeoutError(f'Request to {method} timed out') from e
+    except requests.RequestException as e:
+        raise NetworkError(f'Request to {method} failed: {e!r}') from e
@@ -0,0 +1,155 @@
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from logging import getLogger
+from typing import (Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Mapping,
+                    NamedTuple, Optional, Union)
+
+from .ratelimit import RateLimiter
+
+logger = getLogger(__name__)
+
+Specs = Union[Iterable[Any], AsyncIterable[Any]]
+# все вызовы пакета ограничиваются одной корзиной
+_BATCH = 'batch'
+
+
+class BatchResult(NamedTuple):
+    # порядковый номер элемента во входной последовательности
+    index: int
+    spec: Any
+    result: Optional[Any]
+    error: Optional[BaseException]
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def call_with_spec(func: Callable, spec: Any):
+    """
+    Вызывает func с параметрами из spec: словарь - именованные аргументы,
+    кортеж или список - позиционные, иначе - единственный аргумент
+    """
+    if isinstance(spec, Mapping):
+        return func(**spec)
+    if isinstance(spec, (tuple, list)):
+        return func(*spec)
+    return func(spec)
+
+
+async def _aiter(specs: Specs) -> AsyncIterator[Any]:
+    if hasattr(specs, '__aiter__'):
+        iterator = specs.__aiter__()
+        try:
+            async for spec in iterator:
+                yield spec
+        finally:
+            # асинхронный генератор specs закрывается и при отмене или ошибке пакета
+            if hasattr(iterator, 'aclose'):
+                await iterator.aclose()
+    else:
+        for spec in specs:
+            yield spec
+
+
+async def run_batch(func: Callable[..., Awaitable[Any]], specs: Specs, concurrency: int = 10,
+                    rate: Optional[float] = None,
+                    prepare: Optional[Callable[[], Awaitable[Any]]] = None) -> AsyncIterator[BatchResult]:
+    """
+    Выполняет func для каждого элемента specs с ограничением параллельности и частоты вызовов.
+    Результаты возвращаются по мере готовности, ошибка одного элемента не прерывает обработку остальных.
+    Элементы specs читаются по мере освобождения мест, поэтому specs может быть бесконечным.
+
+    :param func: корутина-функция, например AsyncSberQR.creation
+    :param specs: параметры вызовов (см. call_with_spec), итерируемый или асинхронно итерируемый объект
+    :param concurrency: максимальное количество одновременных вызовов
+    :param rate: максимальное количество вызовов в секунду (None - без ограничения)
+    :param prepare: корутина-функция, выполняемая один раз перед первым вызовом (например, получение токена)
+    """
+    limiter = RateLimiter(default=rate) if rate else None
+
+    async def call(index: int, spec: Any) -> BatchResult:
+        if limiter is not None:
+            await limiter.acquire(_BATCH)
+        try:
+            return BatchResult(index, spec, await call_with_spec(func, spec), None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return BatchResult(index, spec, None, e)
+
+    if prepare is not None:
+        try:
+            await prepare()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # ошибка будет получена каждым элементом при вызове func
+            logger.warning('Batch preparation failed: %r', e)
+
+    iterator = _aiter(specs).__aiter__()
+    pending = set()
+    index = 0
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    spec = await iterator.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                pending.add(asyncio.ensure_future(call(index, spec)))
+                index += 1
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        await iterator.aclose()
+
+
+def run_batch_sync(func: Callable[..., Any], specs: Iterable[Any], max_workers: int = 10,
+                   prepare: Optional[Callable[[], Any]] = None) -> Iterator[BatchResult]:
+    """
+    Синхронный вариант run_batch: вызовы выполняются в ThreadPoolExecutor из max_workers потоков,
+    в очереди находится не больше max_workers элементов specs.
+
+    :param func: функция, например SberQR.status
+    :param specs: параметры вызовов (см. call_with_spec)
+    :param max_workers: количество потоков
+    :param prepare: функция, выполняемая один раз перед первым вызовом (например, получение токена)
+    """
+    def call(index: int, spec: Any) -> BatchResult:
+        try:
+            return BatchResult(index, spec, call_with_spec(func, spec), None)
+        except Exception as e:
+            return BatchResult(index, spec, None, e)
+
+    if prepare is not None:
+        try:
+            prepare()
+        except Exception as e:
+            logger.warning('Batch preparation failed: %r', e)
+
+    iterator = iter(specs)
+    pending = set()
+    exhausted = False
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for index, spec in enumerate(iterator):
+                pending.add(executor.submit(call, index, spec))
+                if len(pending) >= max_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            exhausted = True
+            for future in pending:
+                yield future.result()
+        finally:
+            if not exhausted:
+                for future in pending:
+                    future.cancel()
@@ -0,0 +1,61 @@
+import json
+from typing import Any, Callable, Optional, Union
+
+
+class JSONCodec:
+    """
+    Кодирование тел запросов и декодирование ответов.
+    dumps всегда возвращает bytes, loads принимает bytes
+    """
+
+    __slots__ = ('name', 'dumps', 'loads')
+
+    def __init__(self, name: str, dumps: Callable[[Any], bytes], loads: Callable[[bytes], Any]):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return f'JSONCodec({self.name!r})'
+
+
+def _orjson() -> JSONCodec:
+    import orjson
+    return JSONCodec('orjson', orjson.dumps, orjson.loads)
+
+
+def _ujson() -> JSONCodec:
+    import ujson
+    return JSONCodec('ujson', lambda obj: ujson.dumps(obj, ensure_ascii=False).encode('utf-8'), ujson.loads)
+
+
+def _stdlib() -> JSONCodec:
+    return JSONCodec('json', lambda obj: json.dumps(obj, ensure_ascii=False).encode('utf-8'), json.loads)
+
+
+_FACTORIES = {'orjson': _orjson, 'ujson': _ujson, 'json': _stdlib}
+_default: Optional[JSONCodec] = None
+
+
+def get_codec(codec: Union[str, JSONCodec, None] = None) -> JSONCodec:
+    """
+    :param codec: 'orjson', 'ujson', 'json', готовый JSONCodec или None - самый быстрый из установленных
+    :raises ImportError: если запрошенная библиотека не установлена
+    """
+    global _default
+    if isinstance(codec, JSONCodec):
+        return codec
+    if codec is not None:
+        if codec not in _FACTORIES:
+            raise ValueError(f'Unknown JSON codec {codec!r}, expected one of {", ".join(_FACTORIES)}')
+        return _FACTORIES[codec]()
+    if _default is None:
+        for factory in (_orjson, _ujson):
+            try:
+                _default = factory()
+                break
+            except ImportError:
+                continue
+        else:
+            _default = _stdlib()
+    return _default
@@ -2,5 +2,30 @@ class NetworkError(Exception):
     pass
 
 
+class RequestTimeoutError(NetworkError):
+    pass
+
+
 class SberQrAPIError(Exception):
-    pass
\ No newline at end of file
+
+    def __init__(self, message: str = '', status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(Exception):
+
+    def __init__(self, message: str = '', retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RateLimitExceeded(Exception):
+
+    def __init__(self, message: str = '', retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class IdempotencyConflict(Exception):
+    pass
@@ -0,0 +1,363 @@
+"""
+Колоночная выгрузка операций реестра для аналитики.
+
+Операции (RegistryOperation из registry_operations() или колонки ReconciliationStore.columns()) преобразуются
+в структурированный массив NumPy, таблицу Arrow или файл Parquet; CSV записывается потоково без зависимостей.
+Итоги по терминалам, дням и типам операций и сводка QUANTITY считаются векторно по массиву NumPy или прямо
+по колонкам: из колонок строятся только нужные для итогов массивы.
+
+    pip install SberQR[numpy]   # to_numpy, итоги
+    pip install SberQR[arrow]   # to_arrow, write_parquet
+"""
+import csv
+from datetime import date, datetime, timedelta, timezone
+from importlib import import_module
+from itertools import islice
+from operator import itemgetter
+from typing import (TYPE_CHECKING, Any, AsyncIterable, Dict, Iterable, Iterator, List, NamedTuple, Optional, TextIO,
+                    Tuple, Union)
+
+from .models import RegistryOperation, RegistryQuantity
+from .types import SUCCESS_RESPONSE_CODE, OperationType
+
+if TYPE_CHECKING:
+    import numpy
+    import pyarrow
+
+COLUMNS = RegistryOperation._fields
+# имя колонки -> значения; operation_date_time - datetime с часовым поясом, datetime в UTC без него
+# или секунды unix time (ReconciliationStore.columns())
+Columns = Dict[str, List[Any]]
+OperationsData = Union[Iterable[RegistryOperation], Columns]
+
+_DATE_TIME = COLUMNS.index('operation_date_time')
+_PAY = frozenset((OperationType.PAY.value,))
+_RETURNS = frozenset((OperationType.REFUND.value, OperationType.REVERSE.value))
+_SUCCESS = frozenset((SUCCESS_RESPONSE_CODE,))
+_EPOCH = date(1970, 1, 1)
+_SECONDS_PER_DAY = 24 * 60 * 60
+# день операции без времени
+_NO_DAY = -2 ** 62
+# колонки, нужные для итогов, кроме колонки группировки (id_qr, operation_date_time)
+TOTALS_FIELDS = ('operation_type', 'operation_sum', 'response_code')
+
+
+class Totals(NamedTuple):
+    count: int
+    # суммы в копейках
+    payment_sum: int
+    # возвраты: REFUND и REVERSE
+    refund_sum: int
+    net_sum: int
+
+
+def _require(module: str, extra: str):
+    try:
+        return import_module(module)
+    except ImportError as e:
+        raise ImportError(f'{module} is required: pip install SberQR[{extra}]') from e
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _timestamp(value: Union[datetime, int]) -> float:
+    if isinstance(value, int):
+        return value
+    return (value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def _as_datetime(value: Union[datetime, int, None]) -> Optional[datetime]:
+    # время из колонок в UTC без часового пояса
+    if isinstance(value, int):
+        return datetime(1970, 1, 1) + timedelta(seconds=value)
+    return _naive_utc(value)
+
+
+def to_columns(operations: Iterable[RegistryOperation], fields: Iterable[str] = COLUMNS) -> Columns:
+    """
+    Колонки операций
+
+    :param fields: имена колонок, по умолчанию все
+    """
+    if not isinstance(operations, (list, tuple)):
+        operations = list(operations)
+    return {name: list(map(itemgetter(COLUMNS.index(name)), operations)) for name in fields}
+
+
+def _as_columns(data: OperationsData, fields: Iterable[str] = COLUMNS) -> Columns:
+    return data if isinstance(data, dict) else to_columns(data, fields)
+
+
+def _strings(values: List[Optional[str]]) -> 'numpy.ndarray':
+    np = _require('numpy', 'numpy')
+    # проверка `in` выполняется без цикла Python, замена None нужна только для неполных колонок
+    return np.array(['' if value is None else value for value in values] if None in values else values, dtype=str)
+
+
+def _sums(values: Union['numpy.ndarray', List[Optional[int]]]) -> 'numpy.ndarray':
+    np = _require('numpy', 'numpy')
+    if hasattr(values, 'dtype'):
+        return values
+    return np.array([0 if value is None else value for value in values] if None in values else values,
+                    dtype=np.int64)
+
+
+def _epoch_seconds(values: Union['numpy.ndarray', List[Any]]) -> Tuple['numpy.ndarray', 'numpy.ndarray']:
+    """
+    Секунды unix time (int64) и маска пустых значений колонки operation_date_time
+    """
+    np = _require('numpy', 'numpy')
+    if hasattr(values, 'dtype'):
+        return values.astype(np.int64), np.isnat(values)
+    if None not in values:
+        if values and isinstance(values[0], int):
+            # ReconciliationStore.columns(): секунды без разбора datetime
+            return np.array(values, dtype=np.int64), np.zeros(len(values), dtype=bool)
+        # numpy медленно разбирает объекты datetime, поэтому время переводится в секунды по одному
+        seconds = np.fromiter(map(_timestamp, values), dtype=np.float64, count=len(values))
+        return seconds.astype(np.int64), np.zeros(len(values), dtype=bool)
+    seconds = np.fromiter((np.nan if value is None else _timestamp(value) for value in values), dtype=np.float64,
+                          count=len(values))
+    missing = np.isnan(seconds)
+    return np.where(missing, 0, seconds).astype(np.int64), missing
+
+
+def to_numpy(data: OperationsData, fields: Iterable[str] = COLUMNS) -> 'numpy.ndarray':
+    """
+    Структурированный массив NumPy. Строковые колонки - unicode фиксированной длины (None -> ''),
+    operation_date_time - datetime64[s] в UTC (None -> NaT), operation_sum - int64 в копейках (None -> 0)
+
+    :param fields: имена колонок массива, по умолчанию все; строковые колонки - самая дорогая часть преобразования
+    """
+    np = _require('numpy', 'numpy')
+    fields = [name for name in COLUMNS if name in set(fields)]
+    columns = _as_columns(data, fields)
+    arrays = {}
+    for name in fields:
+        if name == 'operation_date_time':
+            seconds, missing = _epoch_seconds(columns[name])
+            arrays[name] = seconds.astype('datetime64[s]')
+            arrays[name][missing] = np.datetime64('NaT')
+        elif name == 'operation_sum':
+            arrays[name] = _sums(columns[name])
+        else:
+            arrays[name] = _strings(columns[name])
+    size = len(columns[fields[0]]) if fields else 0
+    result = np.empty(size, dtype=[(name, arrays[name].dtype) for name in fields])
+    for name in fields:
+        result[name] = arrays[name]
+    return result
+
+
+def arrow_schema() -> 'pyarrow.Schema':
+    pa = _require('pyarrow', 'arrow')
+    types = {'operation_date_time': pa.timestamp('s', tz='UTC'), 'operation_sum': pa.int64()}
+    return pa.schema([(name, types.get(name, pa.string())) for name in COLUMNS])
+
+
+def to_arrow(data: OperationsData) -> 'pyarrow.Table':
+    """
+    Таблица Arrow; пустые значения сохраняются как null
+    """
+    pa = _require('pyarrow', 'arrow')
+    schema = arrow_schema()
+    columns = _as_columns(data)
+    return pa.table([pa.array(columns[field.name], type=field.type) for field in schema], schema=schema)
+
+
+def _batches(operations: Iterable[RegistryOperation], size: int) -> Iterator[List[RegistryOperation]]:
+    operations = iter(operations)
+    while True:
+        batch = list(islice(operations, size))
+        if not batch:
+            return
+        yield batch
+
+
+async def _async_batches(operations: AsyncIterable[RegistryOperation], size: int):
+    batch = []
+    async for operation in operations:
+        batch.append(operation)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_parquet(data: OperationsData, path: str, batch_size: int = 100000, compression: str = 'zstd') -> int:
+    """
+    Записывает операции в Parquet группами по batch_size строк, не держа в памяти всю выгрузку
+
+    :return: количество записанных операций
+    """
+    pq = _require('pyarrow.parquet', 'arrow')
+    if isinstance(data, dict):
+        table = to_arrow(data)
+        pq.write_table(table, path, compression=compression)
+        return table.num_rows
+    count = 0
+    with pq.ParquetWriter(path, arrow_schema(), compression=compression) as writer:
+        for batch in _batches(data, batch_size):
+            writer.write_table(to_arrow(batch))
+            count += len(batch)
+    return count
+
+
+async def write_parquet_async(operations: AsyncIterable[RegistryOperation], path: str, batch_size: int = 100000,
+                              compression: str = 'zstd') -> int:
+    """
+    write_parquet для registry_operations() и RegistryReader.operations()
+    """
+    pq = _require('pyarrow.parquet', 'arrow')
+    count = 0
+    with pq.ParquetWriter(path, arrow_schema(), compression=compression) as writer:
+        async for batch in _async_batches(operations, batch_size):
+            writer.write_table(to_arrow(batch))
+            count += len(batch)
+    return count
+
+
+def _csv_row(row: Tuple) -> Tuple:
+    date_time = _as_datetime(row[_DATE_TIME])
+    return (*row[:_DATE_TIME], f'{date_time.isoformat()}Z' if date_time else None, *row[_DATE_TIME + 1:])
+
+
+def _rows(data: OperationsData) -> Iterable[Tuple]:
+    return zip(*(data[name] for name in COLUMNS)) if isinstance(data, dict) else data
+
+
+def write_csv(data: OperationsData, file: TextIO, header: bool = True) -> int:
+    """
+    Записывает операции в CSV по одной (время в UTC, ISO 8601), без зависимостей
+
+    :param file: файл, открытый с newline=''
+    :return: количество записанных операций
+    """
+    writer = csv.writer(file)
+    if header:
+        writer.writerow(COLUMNS)
+    count = 0
+    for row in _rows(data):
+        writer.writerow(_csv_row(row))
+        count += 1
+    return count
+
+
+async def write_csv_async(operations: AsyncIterable[RegistryOperation], file: TextIO, header: bool = True) -> int:
+    """
+    write_csv для registry_operations() и RegistryReader.operations()
+    """
+    writer = csv.writer(file)
+    if header:
+        writer.writerow(COLUMNS)
+    count = 0
+    async for operation in operations:
+        writer.writerow(_csv_row(operation))
+        count += 1
+    return count
+
+
+def _as_data(data: Union['numpy.ndarray', OperationsData], fields: Iterable[str]):
+    # массив NumPy и колонки используются как есть, из RegistryOperation строятся только нужные колонки
+    return data if hasattr(data, 'dtype') or isinstance(data, dict) else to_columns(data, fields)
+
+
+def _isin(values: Union['numpy.ndarray', List[Any]], targets: frozenset) -> 'numpy.ndarray':
+    np = _require('numpy', 'numpy')
+    if hasattr(values, 'dtype'):
+        return np.isin(values, list(targets))
+    return np.fromiter(map(targets.__contains__, values), dtype=bool, count=len(values))
+
+
+def _factorize(values: Union['numpy.ndarray', List[Any]]) -> Tuple[List[Any], 'numpy.ndarray']:
+    """
+    Уникальные значения колонки и номера значений строк в них; None в колонках - '' (как в to_numpy)
+    """
+    np = _require('numpy', 'numpy')
+    if hasattr(values, 'dtype'):
+        unique, inverse = np.unique(values, return_inverse=True)
+        return unique.tolist(), inverse.reshape(-1)
+    if None in values:
+        values = ['' if value is None else value for value in values]
+    # dict вместо np.unique: без сортировки строк и без построения массива unicode
+    index = {value: code for code, value in enumerate(dict.fromkeys(values))}
+    return list(index), np.fromiter(map(index.__getitem__, values), dtype=np.intp, count=len(values))
+
+
+def _totals(data, keys: List[Any], inverse: 'numpy.ndarray', successful_only: bool) -> Dict[Any, Totals]:
+    np = _require('numpy', 'numpy')
+    types, sums = data['operation_type'], _sums(data['operation_sum'])
+    paid, returned = _isin(types, _PAY), _isin(types, _RETURNS)
+    if successful_only:
+        successful = _isin(data['response_code'], _SUCCESS)
+        inverse, sums, paid, returned = inverse[successful], sums[successful], paid[successful], returned[successful]
+    counts = np.bincount(inverse, minlength=len(keys))
+    # bincount суммирует во float64: суммы точны до 2**53 копеек
+    payments = np.bincount(inverse, weights=np.where(paid, sums, 0), minlength=len(keys))
+    refunds = np.bincount(inverse, weights=np.where(returned, sums, 0), minlength=len(keys))
+    return {key: Totals(int(count), int(payment), int(refund), int(payment) - int(refund))
+            for key, count, payment, refund in zip(keys, counts, payments, refunds) if count}
+
+
+def totals_by_terminal(data: Union['numpy.ndarray', OperationsData],
+                       successful_only: bool = True) -> Dict[str, Totals]:
+    """
+    Итоги по id_qr
+
+    :param successful_only: учитывать только успешные операции (response_code '00'), отклоненная оплата
+        не является поступлением денег
+    """
+    data = _as_data(data, ('id_qr', *TOTALS_FIELDS))
+    return _totals(data, *_factorize(data['id_qr']), successful_only)
+
+
+def totals_by_day(data: Union['numpy.ndarray', OperationsData], utc_offset: timedelta = timedelta(0),
+                  successful_only: bool = True) -> Dict[Optional[date], Totals]:
+    """
+    Итоги по дням
+
+    :param utc_offset: часовой пояс границы дня, например timedelta(hours=3) для московского времени
+    :param successful_only: как в totals_by_terminal
+    """
+    np = _require('numpy', 'numpy')
+    data = _as_data(data, ('operation_date_time', *TOTALS_FIELDS))
+    seconds, missing = _epoch_seconds(data['operation_date_time'])
+    days = (seconds + int(utc_offset.total_seconds())) // _SECONDS_PER_DAY
+    days[missing] = _NO_DAY
+    unique, inverse = np.unique(days, return_inverse=True)
+    keys = [None if day == _NO_DAY else _EPOCH + timedelta(days=day) for day in unique.tolist()]
+    return _totals(data, keys, inverse.reshape(-1), successful_only)
+
+
+def totals_by_operation_type(data: Union['numpy.ndarray', OperationsData],
+                             successful_only: bool = True) -> Dict[str, Totals]:
+    """
+    Итоги по типам операций
+
+    :param successful_only: как в totals_by_terminal
+    """
+    data = _as_data(data, TOTALS_FIELDS)
+    return _totals(data, *_factorize(data['operation_type']), successful_only)
+
+
+def quantity(data: Union['numpy.ndarray', OperationsData], successful_only: bool = True) -> RegistryQuantity:
+    """
+    Сводка RegistryType.QUANTITY по выгруженным операциям, без запроса к API
+
+    :param successful_only: считать только успешные операции (response_code '00')
+    """
+    np = _require('numpy', 'numpy')
+    data = _as_data(data, ('operation_type', 'response_code'))
+    types = data['operation_type']
+    selected = _isin(data['response_code'], _SUCCESS) if successful_only else np.ones(len(types), dtype=bool)
+
+    def count(operation_type: OperationType) -> int:
+        return int(np.count_nonzero(_isin(types, frozenset((operation_type.value,))) & selected))
+
+    return RegistryQuantity(int(np.count_nonzero(selected)), count(OperationType.PAY), count(OperationType.REFUND),
+                            count(OperationType.REVERSE))
@@ -0,0 +1,279 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from logging import getLogger
+from random import choices
+from string import hexdigits
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from .exceptions import IdempotencyConflict
+
+logger = getLogger(__name__)
+
+
+class IdempotencyRecord(NamedTuple):
+    rq_uid: str
+    # ответ creation, None - заказ еще не создан или результат неизвестен (таймаут)
+    result: Optional[Dict[str, Any]] = None
+    # хэш параметров запроса (request_fingerprint), None - не проверяется
+    fingerprint: Optional[str] = None
+
+
+def new_rq_uid() -> str:
+    return ''.join(choices(hexdigits, k=32))
+
+
+def request_fingerprint(params: Any) -> str:
+    """
+    Хэш параметров запроса, не зависящий от порядка ключей
+    """
+    encoded = json.dumps(params, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _check(key: str, record: IdempotencyRecord, fingerprint: Optional[str]):
+    if fingerprint is not None and record.fingerprint is not None and record.fingerprint != fingerprint:
+        raise IdempotencyConflict(f'Idempotency key {key} was already used with different request parameters')
+
+
+def is_created(result: Any) -> bool:
+    """
+    Ответ creation содержит созданный заказ
+    """
+    return isinstance(result, dict) and bool(result.get('orderId') or result.get('order_id'))
+
+
+def _dumps(record: IdempotencyRecord) -> str:
+    return json.dumps(record._asdict(), ensure_ascii=False)
+
+
+def _loads(value) -> IdempotencyRecord:
+    if isinstance(value, bytes):
+        value = value.decode('utf-8')
+    return IdempotencyRecord(**json.loads(value))
+
+
+class _IdempotencyMemory:
+
+    def __init__(self, ttl: float = 86400, max_size: int = 100000, redis=None, prefix: str = 'sberqr:creation:',
+                 wait_timeout: float = 10, wait_interval: float = 0.1):
+        """
+        :param ttl: сколько секунд хранится результат создания заказа
+        :param max_size: максимальное количество заказов в памяти процесса
+        :param redis: клиент Redis для общего кэша нескольких процессов
+        :param prefix: префикс ключей Redis
+        :param wait_timeout: сколько секунд ждать результата заказа, который создает другой процесс
+        :param wait_interval: интервал проверки результата в Redis
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.prefix = prefix
+        self.wait_timeout = wait_timeout
+        self.wait_interval = wait_interval
+        self._redis = redis
+        # key -> (record, expires_at)
+        self._records: 'OrderedDict[str, Tuple[IdempotencyRecord, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[IdempotencyRecord]:
+        with self._lock:
+            item = self._records.get(key)
+            if item is None:
+                return None
+            if item[1] <= time.monotonic():
+                del self._records[key]
+                return None
+            self._records.move_to_end(key)
+            return item[0]
+
+    def _remember(self, key: str, record: IdempotencyRecord):
+        with self._lock:
+            self._records[key] = (record, time.monotonic() + self.ttl)
+            self._records.move_to_end(key)
+            while len(self._records) > self.max_size:
+                self._records.popitem(last=False)
+
+    def forget(self, key: str):
+        with self._lock:
+            self._records.pop(key, None)
+
+
+class AsyncIdempotencyCache(_IdempotencyMemory):
+    """
+    Идемпотентное создание заказов по ключу (order_number терминала).
+
+    Для ключа запоминается RqUID первой попытки и ответ creation: повторный вызов возвращает сохраненный ответ,
+    повтор после ошибки или таймаута отправляется с тем же RqUID, одновременные вызовы с одним ключом
+    выполняют один запрос. С redis (redis.asyncio.Redis) кэш общий для нескольких процессов: RqUID закрепляется
+    за ключом через SET NX, остальные процессы ждут результата. Вместе с ключом сохраняется хэш параметров
+    запроса: повтор с тем же ключом, но другими параметрами вызывает IdempotencyConflict.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # key -> (запрос, fingerprint)
+        self._pending: Dict[str, Tuple[asyncio.Future, Optional[str]]] = {}
+
+    async def execute(self, key: str, send: Callable[[str], Awaitable[Dict[str, Any]]],
+                      rq_uid: Optional[str] = None, fingerprint: Optional[str] = None) -> Dict[str, Any]:
+        """
+        :param key: ключ идемпотентности
+        :param send: корутина-функция, создающая заказ с переданным RqUID
+        :param rq_uid: RqUID для первой попытки (по умолчанию случайный)
+        :param fingerprint: хэш параметров запроса (request_fingerprint)
+        :raises IdempotencyConflict: если ключ уже использован с другими параметрами
+        """
+        record = self.get(key)
+        if record is not None:
+            _check(key, record, fingerprint)
+            if record.result is not None:
+                return record.result
+
+        pending = self._pending.get(key)
+        if pending is None or pending[0].done():
+            future = asyncio.ensure_future(self._execute(key, send, rq_uid, fingerprint))
+            self._pending[key] = (future, fingerprint)
+            future.add_done_callback(lambda done: self._pending.pop(key, None))
+        else:
+            future = pending[0]
+            _check(key, IdempotencyRecord('', fingerprint=pending[1]), fingerprint)
+        return await asyncio.shield(future)
+
+    async def _execute(self, key, send, rq_uid, fingerprint):
+        record, claimed = await self._claim(key, rq_uid, fingerprint)
+        if record.result is None and not claimed:
+            # заказ создает другой процесс
+            record = await self._wait(key) or record
+            _check(key, record, fingerprint)
+        if record.result is not None:
+            return record.result
+
+        result = await send(record.rq_uid)
+        if is_created(result):
+            record = record._replace(result=result)
+            self._remember(key, record)
+            if self._redis is not None:
+                await self._redis.set(self.prefix + key, _dumps(record), ex=int(self.ttl))
+        return result
+
+    async def _claim(self, key: str, rq_uid: Optional[str],
+                     fingerprint: Optional[str]) -> Tuple[IdempotencyRecord, bool]:
+        """
+        :return: запись ключа и признак того, что RqUID закреплен за этим процессом
+        :raises IdempotencyConflict: если ключ уже использован с другими параметрами
+        """
+        record = self.get(key)
+        if record is not None:
+            _check(key, record, fingerprint)
+            return record, True
+        record = IdempotencyRecord(rq_uid or new_rq_uid(), fingerprint=fingerprint)
+        if self._redis is not None:
+            if not await self._redis.set(self.prefix + key, _dumps(record), nx=True, ex=int(self.ttl)):
+                value = await self._redis.get(self.prefix + key)
+                if value is not None:
+                    record = _loads(value)
+                    _check(key, record, fingerprint)
+                    self._remember(key, record)
+                    return record, False
+        self._remember(key, record)
+        return record, True
+
+    async def _wait(self, key: str) -> Optional[IdempotencyRecord]:
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.wait_interval)
+            value = await self._redis.get(self.prefix + key)
+            if value is not None:
+                record = _loads(value)
+                if record.result is not None:
+                    self._remember(key, record)
+                    return record
+        logger.warning('Order %s was not created by another process in %s s, retrying with the same RqUID',
+                       key, self.wait_timeout)
+        return None
+
+
+class IdempotencyCache(_IdempotencyMemory):
+    """
+    Синхронный вариант AsyncIdempotencyCache (redis - redis.Redis)
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # key -> [lock, количество потоков, использующих lock]
+        self._key_locks: Dict[str, list] = {}
+
+    def execute(self, key: str, send: Callable[[str], Dict[str, Any]],
+                rq_uid: Optional[str] = None, fingerprint: Optional[str] = None) -> Dict[str, Any]:
+        """
+        :param key: ключ идемпотентности
+        :param send: функция, создающая заказ с переданным RqUID
+        :param rq_uid: RqUID для первой попытки (по умолчанию случайный)
+        :param fingerprint: хэш параметров запроса (request_fingerprint)
+        :raises IdempotencyConflict: если ключ уже использован с другими параметрами
+        """
+        record = self.get(key)
+        if record is not None:
+            _check(key, record, fingerprint)
+            if record.result is not None:
+                return record.result
+
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                record, claimed = self._claim(key, rq_uid, fingerprint)
+                if record.result is None and not claimed:
+                    record = self._wait(key) or record
+                    _check(key, record, fingerprint)
+                if record.result is not None:
+                    return record.result
+
+                result = send(record.rq_uid)
+                if is_created(result):
+                    record = record._replace(result=result)
+                    self._remember(key, record)
+                    if self._redis is not None:
+                        self._redis.set(self.prefix + key, _dumps(record), ex=int(self.ttl))
+                return result
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    self._key_locks.pop(key, None)
+
+    def _claim(self, key: str, rq_uid: Optional[str],
+               fingerprint: Optional[str]) -> Tuple[IdempotencyRecord, bool]:
+        record = self.get(key)
+        if record is not None:
+            _check(key, record, fingerprint)
+            return record, True
+        record = IdempotencyRecord(rq_uid or new_rq_uid(), fingerprint=fingerprint)
+        if self._redis is not None:
+            if not self._redis.set(self.prefix + key, _dumps(record), nx=True, ex=int(self.ttl)):
+                value = self._redis.get(self.prefix + key)
+                if value is not None:
+                    record = _loads(value)
+                    _check(key, record, fingerprint)
+                    self._remember(key, record)
+                    return record, False
+        self._remember(key, record)
+        return record, True
+
+    def _wait(self, key: str) -> Optional[IdempotencyRecord]:
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.wait_interval)
+            value = self._redis.get(self.prefix + key)
+            if value is not None:
+                record = _loads(value)
+                if record.result is not None:
+                    self._remember(key, record)
+                    return record
+        logger.warning('Order %s was not created by another process in %s s, retrying with the same RqUID',
+                       key, self.wait_timeout)
+        return None
@@ -0,0 +1,324 @@
+"""
+Журнал изменяющих запросов (creation, revocation, cancel).
+
+Перед отправкой запроса в файл дописывается запись begin с RqUID и параметрами, после ответа - запись end
+с результатом. Запросы без end (процесс завершился или запрос закончился таймаутом) проверяются recover()
+вызовами status() вместо выгрузки реестра за день.
+
+    python -m SberQR.journal journal.jsonl
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging import getLogger
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .api import Methods
+from .exceptions import CircuitOpenError, NetworkError, SberQrAPIError
+from .types import CancelType, OperationType, OrderState
+
+logger = getLogger(__name__)
+
+# результат проверки запроса, оставшегося без ответа
+APPLIED = 'applied'
+NOT_APPLIED = 'not_applied'
+UNKNOWN = 'unknown'
+# в записи нет partner_order_number (revoke/cancel без него), status() невозможен
+NOT_CHECKED = 'not_checked'
+
+
+class JournalEntry(NamedTuple):
+    rq_uid: str
+    method: str
+    params: Dict[str, Any]
+    # время записи begin, unix time
+    started: float
+    # 'ok', 'error', 'recovered' или None - ответ не получен
+    outcome: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class RecoveryResult(NamedTuple):
+    entry: JournalEntry
+    # APPLIED, NOT_APPLIED, UNKNOWN или NOT_CHECKED
+    state: str
+    status: Optional[Dict[str, Any]] = None
+
+
+class Journal:
+    """
+    Журнал в формате JSON Lines, только дозапись. Незавершенные записи хранятся в памяти,
+    файл сжимается до них при превышении max_bytes. Потокобезопасен; один файл - один экземпляр Journal
+    (несколько процессов пишут в разные файлы).
+    """
+
+    def __init__(self, path: str, fsync: bool = True, max_bytes: Optional[int] = 64 * 1024 * 1024):
+        """
+        :param path: файл журнала, создается при первой записи
+        :param fsync: сбрасывать каждую запись на диск (os.fsync) до отправки запроса
+        :param max_bytes: размер файла, после которого он переписывается только с незавершенными записями
+        """
+        self.path = path
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending: Dict[str, JournalEntry] = {}
+        self._file = None
+        self._size = 0
+        if os.path.exists(path):
+            self._pending = {entry.rq_uid: entry for entry in read_journal(path) if entry.outcome is None}
+            self._size = os.path.getsize(path)
+            if self._size:
+                with open(path, 'rb') as file:
+                    file.seek(-1, os.SEEK_END)
+                    # строка, оборванная сбоем, не должна склеиться со следующей записью
+                    if file.read(1) != b'\n':
+                        self._write_line('\n')
+
+    def _write(self, record: Dict[str, Any]):
+        self._write_line(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+    def _write_line(self, line: str):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(line)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._size += len(line.encode('utf-8'))
+
+    def begin(self, rq_uid: str, method: str, params: Dict[str, Any]) -> JournalEntry:
+        """
+        Записывает запрос перед отправкой
+        """
+        entry = JournalEntry(rq_uid, method, params, time.time())
+        with self._lock:
+            self._write({'event': 'begin', 'rq_uid': rq_uid, 'method': method, 'params': params,
+                         'started': entry.started})
+            self._pending[rq_uid] = entry
+        return entry
+
+    def end(self, rq_uid: str, result: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None,
+            outcome: Optional[str] = None):
+        """
+        Записывает результат запроса
+
+        :param outcome: по умолчанию 'ok' или 'error' (если передан error)
+        """
+        outcome = outcome or ('error' if error is not None else 'ok')
+        with self._lock:
+            self._write({'event': 'end', 'rq_uid': rq_uid, 'outcome': outcome, 'result': result,
+                         'error': repr(error) if error is not None else None})
+            self._pending.pop(rq_uid, None)
+            if self.max_bytes is not None and self._size > self.max_bytes:
+                self._compact()
+
+    async def begin_async(self, rq_uid: str, method: str, params: Dict[str, Any]) -> JournalEntry:
+        """
+        begin для AsyncSberQR: с fsync запись выполняется в пуле потоков, чтобы не блокировать цикл событий
+        """
+        if not self.fsync:
+            return self.begin(rq_uid, method, params)
+        return await asyncio.get_running_loop().run_in_executor(None, self.begin, rq_uid, method, params)
+
+    async def end_async(self, rq_uid: str, result: Optional[Dict[str, Any]] = None,
+                        error: Optional[BaseException] = None, outcome: Optional[str] = None):
+        if not self.fsync:
+            return self.end(rq_uid, result, error, outcome)
+        await asyncio.get_running_loop().run_in_executor(None, self.end, rq_uid, result, error, outcome)
+
+    def pending(self) -> List[JournalEntry]:
+        """
+        Запросы без ответа в порядке отправки
+        """
+        with self._lock:
+            return sorted(self._pending.values(), key=lambda entry: entry.started)
+
+    def compact(self):
+        """
+        Переписывает файл, оставляя только незавершенные записи
+        """
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            for entry in sorted(self._pending.values(), key=lambda item: item.started):
+                file.write(json.dumps({'event': 'begin', 'rq_uid': entry.rq_uid, 'method': entry.method,
+                                       'params': entry.params, 'started': entry.started},
+                                      ensure_ascii=False, default=str) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+        self._size = os.path.getsize(self.path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_journal(path: str) -> List[JournalEntry]:
+    """
+    Записи журнала с результатами; обрезанная последняя строка (сбой во время записи) пропускается
+    """
+    entries: Dict[str, JournalEntry] = {}
+    with open(path, encoding='utf-8') as file:
+        for number, line in enumerate(file, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                logger.warning('Skipping corrupted journal line %s:%d', path, number)
+                continue
+            if record['event'] == 'begin':
+                entries[record['rq_uid']] = JournalEntry(record['rq_uid'], record['method'], record['params'],
+                                                         record['started'])
+            elif record['rq_uid'] in entries:
+                entries[record['rq_uid']] = entries[record['rq_uid']]._replace(
+                    outcome=record['outcome'], result=record.get('result'), error=record.get('error'))
+    return list(entries.values())
+
+
+def _operation_time(operation: Dict[str, Any]) -> Optional[float]:
+    value = operation.get('operationDateTime') or operation.get('operation_date_time')
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def resolve(entry: JournalEntry, status: Optional[Dict[str, Any]], clock_skew: float = 60) -> str:
+    """
+    Был ли применен запрос entry по ответу status заказа
+
+    :param clock_skew: допустимое расхождение часов процесса и банка, секунды
+    """
+    if status is None:
+        return UNKNOWN
+    state = status.get('orderState') or status.get('order_state')
+    if entry.method == Methods.revocation:
+        if state == OrderState.REVOKED.value:
+            return APPLIED
+        return NOT_APPLIED if state else UNKNOWN
+    if entry.method == Methods.cancel:
+        params = entry.params
+        operation_type = (OperationType.REVERSE.value if params.get('operation_type') == CancelType.REVERSE.value
+                          else OperationType.REFUND.value)
+        operations = status.get('orderOperationParams') or status.get('order_operation_params') or []
+        for operation in operations:
+            operation_time = _operation_time(operation)
+            if (operation.get('operationType', operation.get('operation_type')) == operation_type
+                    and int(operation.get('operationSum', operation.get('operation_sum', -1)))
+                    == int(params['cancel_operation_sum'])
+                    and (operation_time is None or operation_time >= entry.started - clock_skew)):
+                return APPLIED
+        return NOT_APPLIED if state else UNKNOWN
+    return UNKNOWN
+
+
+def _status_params(entry: JournalEntry) -> Optional[Tuple[str, str]]:
+    if entry.method == Methods.creation:
+        # заказ создан, но ответ с order_id не получен: status невозможен
+        return None
+    order_id = entry.params.get('order_id')
+    partner_order_number = entry.params.get('partner_order_number')
+    if order_id is None or not partner_order_number:
+        return None
+    return order_id, partner_order_number
+
+
+def _unchecked(entry: JournalEntry) -> RecoveryResult:
+    logger.warning('Journal entry %s has no partner_order_number, status() is not possible', entry.rq_uid)
+    return RecoveryResult(entry, NOT_CHECKED)
+
+
+async def recover(client, journal: Journal, clock_skew: float = 60) -> List[RecoveryResult]:
+    """
+    Проверяет запросы журнала без ответа вызовами status() AsyncSberQR и записывает результат.
+    creation без ответа остается UNKNOWN: повторите его с тем же RqUID - creation(..., rq_uid=entry.rq_uid).
+    revoke и cancel, вызванные без partner_order_number, возвращаются с состоянием NOT_CHECKED.
+    Записи, для которых status() завершился ошибкой (в том числе сетевой), остаются без ответа до следующего вызова
+
+    :param clock_skew: допустимое расхождение часов процесса и банка, секунды
+    """
+    results = []
+    for entry in journal.pending():
+        params = _status_params(entry)
+        if params is None and entry.method != Methods.creation:
+            results.append(_unchecked(entry))
+            continue
+        status = None
+        if params is not None:
+            try:
+                status = await client.status(*params)
+            except (SberQrAPIError, NetworkError, CircuitOpenError) as e:
+                logger.warning('Status of %s for journal entry %s failed: %r', params[0], entry.rq_uid, e)
+        results.append(_record(journal, entry, status, clock_skew))
+    return results
+
+
+def recover_sync(client, journal: Journal, clock_skew: float = 60) -> List[RecoveryResult]:
+    """
+    recover для синхронного SberQR
+    """
+    results = []
+    for entry in journal.pending():
+        params = _status_params(entry)
+        if params is None and entry.method != Methods.creation:
+            results.append(_unchecked(entry))
+            continue
+        status = None
+        if params is not None:
+            try:
+                status = client.status(*params)
+            except (SberQrAPIError, NetworkError, CircuitOpenError) as e:
+                logger.warning('Status of %s for journal entry %s failed: %r', params[0], entry.rq_uid, e)
+        results.append(_record(journal, entry, status, clock_skew))
+    return results
+
+
+def _record(journal: Journal, entry: JournalEntry, status: Optional[Dict[str, Any]],
+            clock_skew: float) -> RecoveryResult:
+    state = resolve(entry, status, clock_skew)
+    if state != UNKNOWN:
+        journal.end(entry.rq_uid, {'state': state, 'status': status}, outcome='recovered')
+    return RecoveryResult(entry, state, status)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Запросы журнала SberQR без ответа')
+    parser.add_argument('path', help='файл журнала')
+    parser.add_argument('--compact', action='store_true', help='оставить в файле только незавершенные записи')
+    args = parser.parse_args(argv)
+
+    journal = Journal(args.path, max_bytes=None)
+    pending = journal.pending()
+    for entry in pending:
+        started = datetime.fromtimestamp(entry.started, timezone.utc).isoformat(timespec='seconds')
+        print(f'{started}  {entry.method:<24} {entry.rq_uid}  {json.dumps(entry.params, ensure_ascii=False)}')
+    print(f'{len(pending)} pending', file=sys.stderr)
+    if args.compact:
+        journal.compact()
+    journal.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
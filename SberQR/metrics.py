@@ -0,0 +1,409 @@
+import bisect
+import threading
+from logging import getLogger
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .exceptions import NetworkError, RequestTimeoutError, SberQrAPIError
+from .scope import Scope
+
+logger = getLogger(__name__)
+
+# границы корзин гистограммы времени ответа, секунды
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def status_label(error: Optional[BaseException]) -> str:
+    """
+    Метка результата запроса: '2xx', HTTP код ошибки API, 'timeout' или 'network'
+    """
+    if error is None:
+        return '2xx'
+    if isinstance(error, SberQrAPIError) and error.status_code is not None:
+        return str(error.status_code)
+    if isinstance(error, RequestTimeoutError):
+        return 'timeout'
+    if isinstance(error, NetworkError):
+        return 'network'
+    return 'error'
+
+
+class Instrumentation:
+    """
+    Точки наблюдения за клиентом. Базовый класс ничего не делает, наследники переопределяют нужные методы.
+    Методы вызываются в потоке/цикле запроса и не должны блокироваться.
+    """
+
+    def request_start(self, method: str, attempt: int) -> Any:
+        """
+        Перед отправкой попытки запроса
+
+        :param method: метод API (Methods)
+        :param attempt: номер попытки, начиная с 0
+        :return: произвольное состояние, переданное затем в request_end
+        """
+
+    def request_end(self, method: str, attempt: int, duration: float, error: Optional[BaseException],
+                    state: Any = None):
+        """
+        После завершения попытки запроса
+
+        :param duration: время запроса, секунды
+        :param error: исключение (NetworkError, SberQrAPIError, ...) или None для успешного ответа
+        :param state: значение, возвращенное request_start
+        """
+
+    def retry(self, method: str, attempt: int, delay: float, error: BaseException):
+        """
+        Перед повторной попыткой запроса
+        """
+
+    def token_lookup(self, scope: Scope, hit: bool):
+        """
+        При запросе токена: hit - токен найден в памяти процесса
+        """
+
+    def pool_usage(self, in_use: int, size: Optional[int]):
+        """
+        При изменении количества выполняющихся запросов
+
+        :param in_use: количество выполняющихся запросов (занятых соединений)
+        :param size: размер пула соединений клиента (None - без ограничения)
+        """
+
+    def rate_limit(self, method: str, wait: float, rejected: bool):
+        """
+        После проверки лимита запросов (rate_limiter клиента)
+
+        :param wait: время ожидания лимита, секунды
+        :param rejected: запрос отклонен без отправки (RateLimitExceeded)
+        """
+
+
+class CompositeInstrumentation(Instrumentation):
+    """
+    Передает события нескольким Instrumentation
+    """
+
+    def __init__(self, *instruments: Instrumentation):
+        self.instruments = instruments
+
+    def request_start(self, method, attempt):
+        return [instrument.request_start(method, attempt) for instrument in self.instruments]
+
+    def request_end(self, method, attempt, duration, error, state=None):
+        states = state if state is not None else [None] * len(self.instruments)
+        for instrument, instrument_state in zip(self.instruments, states):
+            instrument.request_end(method, attempt, duration, error, instrument_state)
+
+    def retry(self, method, attempt, delay, error):
+        for instrument in self.instruments:
+            instrument.retry(method, attempt, delay, error)
+
+    def token_lookup(self, scope, hit):
+        for instrument in self.instruments:
+            instrument.token_lookup(scope, hit)
+
+    def pool_usage(self, in_use, size):
+        for instrument in self.instruments:
+            instrument.pool_usage(in_use, size)
+
+    def rate_limit(self, method, wait, rejected):
+        for instrument in self.instruments:
+            instrument.rate_limit(method, wait, rejected)
+
+
+class CallbackInstrumentation(Instrumentation):
+    """
+    Вызывает функции on_request_start(method, attempt) и
+    on_request_end(method, attempt, duration, error). Исключения в функциях логируются и не прерывают запрос
+    """
+
+    def __init__(self, on_request_start: Optional[Callable[[str, int], Any]] = None,
+                 on_request_end: Optional[Callable[[str, int, float, Optional[BaseException]], Any]] = None):
+        self.on_request_start = on_request_start
+        self.on_request_end = on_request_end
+
+    def request_start(self, method, attempt):
+        if self.on_request_start is not None:
+            try:
+                self.on_request_start(method, attempt)
+            except Exception:
+                logger.exception('on_request_start hook failed')
+
+    def request_end(self, method, attempt, duration, error, state=None):
+        if self.on_request_end is not None:
+            try:
+                self.on_request_end(method, attempt, duration, error)
+            except Exception:
+                logger.exception('on_request_end hook failed')
+
+
+class _Histogram:
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # последняя корзина - значения больше buckets[-1]
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Оценка квантиля по верхней границе корзины
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+
+class Metrics(Instrumentation):
+    """
+    Метрики клиента в памяти процесса: гистограммы времени ответа по методам, количество ответов по кодам,
+    ошибки по классам, повторы, ожидание лимита запросов, попадания в кэш токенов и загрузка пула соединений.
+    Потокобезопасен, один экземпляр можно передать нескольким клиентам.
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self._buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._latency: Dict[str, _Histogram] = {}
+        self._statuses: Dict[str, Dict[str, int]] = {}
+        self._errors: Dict[str, Dict[str, int]] = {}
+        self._retries: Dict[str, int] = {}
+        self._rate_limit_wait: Dict[str, _Histogram] = {}
+        self._rate_limit_rejected: Dict[str, int] = {}
+        self.token_hits = 0
+        self.token_misses = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.pool_size: Optional[int] = None
+
+    def request_start(self, method, attempt):
+        with self._lock:
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+
+    def request_end(self, method, attempt, duration, error, state=None):
+        status = status_label(error)
+        with self._lock:
+            self.in_use -= 1
+            histogram = self._latency.get(method)
+            if histogram is None:
+                histogram = self._latency[method] = _Histogram(self._buckets)
+            histogram.observe(duration)
+            statuses = self._statuses.setdefault(method, {})
+            statuses[status] = statuses.get(status, 0) + 1
+            if error is not None:
+                errors = self._errors.setdefault(method, {})
+                name = type(error).__name__
+                errors[name] = errors.get(name, 0) + 1
+
+    def retry(self, method, attempt, delay, error):
+        with self._lock:
+            self._retries[method] = self._retries.get(method, 0) + 1
+
+    def rate_limit(self, method, wait, rejected):
+        with self._lock:
+            if rejected:
+                self._rate_limit_rejected[method] = self._rate_limit_rejected.get(method, 0) + 1
+                return
+            histogram = self._rate_limit_wait.get(method)
+            if histogram is None:
+                histogram = self._rate_limit_wait[method] = _Histogram(self._buckets)
+            histogram.observe(wait)
+
+    def token_lookup(self, scope, hit):
+        with self._lock:
+            if hit:
+                self.token_hits += 1
+            else:
+                self.token_misses += 1
+
+    def pool_usage(self, in_use, size):
+        # in_use считается по request_start/request_end, чтобы суммировать запросы нескольких клиентов
+        self.pool_size = size
+
+    @property
+    def token_hit_rate(self) -> Optional[float]:
+        total = self.token_hits + self.token_misses
+        return self.token_hits / total if total else None
+
+    def quantile(self, method: str, q: float) -> Optional[float]:
+        """
+        Оценка квантиля времени ответа метода (например, q=0.99), секунды
+        """
+        with self._lock:
+            histogram = self._latency.get(method)
+            return histogram.quantile(q) if histogram is not None else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            methods = {}
+            for method, histogram in self._latency.items():
+                methods[method] = {'count': histogram.count,
+                                   'sum': histogram.sum,
+                                   'buckets': dict(zip(self._buckets + (float('inf'),), histogram.counts)),
+                                   'p50': histogram.quantile(0.5),
+                                   'p99': histogram.quantile(0.99),
+                                   'statuses': dict(self._statuses.get(method, {})),
+                                   'errors': dict(self._errors.get(method, {})),
+                                   'retries': self._retries.get(method, 0)}
+            rate_limit = {}
+            for method in set(self._rate_limit_wait) | set(self._rate_limit_rejected):
+                histogram = self._rate_limit_wait.get(method, _Histogram(self._buckets))
+                rate_limit[method] = {'count': histogram.count,
+                                      'wait_sum': histogram.sum,
+                                      'wait_p99': histogram.quantile(0.99),
+                                      'rejected': self._rate_limit_rejected.get(method, 0)}
+            return {'methods': methods,
+                    'rate_limit': rate_limit,
+                    'tokens': {'hits': self.token_hits, 'misses': self.token_misses,
+                               'hit_rate': self.token_hit_rate},
+                    'pool': {'in_use': self.in_use, 'max_in_use': self.max_in_use, 'size': self.pool_size}}
+
+
+class PrometheusInstrumentation(Instrumentation):
+    """
+    Метрики prometheus_client:
+    <namespace>_request_duration_seconds{method, status}, <namespace>_requests_total{method, status},
+    <namespace>_request_errors_total{method, error}, <namespace>_retries_total{method},
+    <namespace>_rate_limit_wait_seconds{method}, <namespace>_rate_limit_rejections_total{method},
+    <namespace>_token_lookups_total{result}, <namespace>_connections_in_use, <namespace>_connections_limit
+    """
+
+    def __init__(self, registry=None, namespace: str = 'sberqr', buckets: Iterable[float] = DEFAULT_BUCKETS):
+        """
+        :param registry: CollectorRegistry, по умолчанию prometheus_client.REGISTRY
+        :raises ImportError: если prometheus_client не установлен
+        """
+        try:
+            from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+        except ImportError as e:
+            raise ImportError('PrometheusInstrumentation requires prometheus_client: '
+                              'pip install SberQR[prometheus]') from e
+        registry = registry if registry is not None else REGISTRY
+        self.duration = Histogram('request_duration_seconds', 'SberQR API request duration',
+                                  ('method', 'status'), namespace=namespace, buckets=tuple(buckets),
+                                  registry=registry)
+        self.requests = Counter('requests', 'SberQR API requests', ('method', 'status'),
+                                namespace=namespace, registry=registry)
+        self.errors = Counter('request_errors', 'SberQR API request errors', ('method', 'error'),
+                              namespace=namespace, registry=registry)
+        self.retries = Counter('retries', 'SberQR API request retries', ('method',),
+                               namespace=namespace, registry=registry)
+        self.rate_limit_wait = Histogram('rate_limit_wait_seconds', 'Time spent waiting for the client rate limit',
+                                         ('method',), namespace=namespace, buckets=tuple(buckets),
+                                         registry=registry)
+        self.rate_limit_rejections = Counter('rate_limit_rejections', 'Requests rejected by the client rate limit',
+                                             ('method',), namespace=namespace, registry=registry)
+        self.token_lookups = Counter('token_lookups', 'Token cache lookups', ('result',),
+                                     namespace=namespace, registry=registry)
+        self.in_use = Gauge('connections_in_use', 'SberQR API requests in flight',
+                            namespace=namespace, registry=registry)
+        self.limit = Gauge('connections_limit', 'SberQR client connection pool size',
+                           namespace=namespace, registry=registry)
+
+    def request_start(self, method, attempt):
+        self.in_use.inc()
+
+    def request_end(self, method, attempt, duration, error, state=None):
+        status = status_label(error)
+        self.in_use.dec()
+        self.duration.labels(method, status).observe(duration)
+        self.requests.labels(method, status).inc()
+        if error is not None:
+            self.errors.labels(method, type(error).__name__).inc()
+
+    def retry(self, method, attempt, delay, error):
+        self.retries.labels(method).inc()
+
+    def rate_limit(self, method, wait, rejected):
+        if rejected:
+            self.rate_limit_rejections.labels(method).inc()
+        else:
+            self.rate_limit_wait.labels(method).observe(wait)
+
+    def token_lookup(self, scope, hit):
+        self.token_lookups.labels('hit' if hit else 'miss').inc()
+
+    def pool_usage(self, in_use, size):
+        if size is not None:
+            self.limit.set(size)
+
+
+class OpenTelemetryInstrumentation(Instrumentation):
+    """
+    Span на каждую попытку запроса (SpanKind.CLIENT) и, если передан meter, гистограмма
+    sberqr.request.duration, счетчик sberqr.retries и гистограмма sberqr.rate_limit.wait
+    """
+
+    def __init__(self, tracer=None, meter=None):
+        """
+        :param tracer: opentelemetry Tracer, по умолчанию trace.get_tracer('SberQR')
+        :param meter: opentelemetry Meter для метрик (None - только трассировка)
+        :raises ImportError: если opentelemetry-api не установлен
+        """
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError('OpenTelemetryInstrumentation requires opentelemetry-api: '
+                              'pip install SberQR[opentelemetry]') from e
+        self._trace = trace
+        self.tracer = tracer if tracer is not None else trace.get_tracer('SberQR')
+        self.duration = None
+        self.retries = None
+        self.rate_limit_wait = None
+        if meter is not None:
+            self.duration = meter.create_histogram('sberqr.request.duration', unit='s',
+                                                   description='SberQR API request duration')
+            self.retries = meter.create_counter('sberqr.retries', description='SberQR API request retries')
+            self.rate_limit_wait = meter.create_histogram('sberqr.rate_limit.wait', unit='s',
+                                                          description='Time spent waiting for the client rate limit')
+
+    def request_start(self, method, attempt):
+        return self.tracer.start_span(f'SberQR {method}', kind=self._trace.SpanKind.CLIENT,
+                                      attributes={'sberqr.method': method, 'sberqr.attempt': attempt})
+
+    def request_end(self, method, attempt, duration, error, state=None):
+        status = status_label(error)
+        if state is not None:
+            state.set_attribute('sberqr.status', status)
+            if isinstance(error, SberQrAPIError) and error.status_code is not None:
+                state.set_attribute('http.status_code', error.status_code)
+            if error is not None:
+                state.record_exception(error)
+                state.set_status(self._trace.Status(self._trace.StatusCode.ERROR, str(error)))
+            state.end()
+        if self.duration is not None:
+            self.duration.record(duration, {'method': method, 'status': status})
+
+    def retry(self, method, attempt, delay, error):
+        if self.retries is not None:
+            self.retries.add(1, {'method': method})
+
+    def rate_limit(self, method, wait, rejected):
+        if self.rate_limit_wait is not None:
+            self.rate_limit_wait.record(wait, {'method': method, 'rejected': rejected})
+
+
+def combine(*instruments: Optional[Instrumentation]) -> Instrumentation:
+    """
+    Объединяет несколько Instrumentation (None пропускаются)
+    """
+    selected: List[Instrumentation] = [instrument for instrument in instruments if instrument is not None]
+    if not selected:
+        return Instrumentation()
+    if len(selected) == 1:
+        return selected[0]
+    return CompositeInstrumentation(*selected)
@@ -0,0 +1,335 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from .payload import normalize_keys, snake_case
+
+
+def parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    """
+    Разбирает дату в формате ISO 8601 ('2023-01-01T10:00:00Z', '2023-01-01T10:00:00+03:00')
+
+    :raises ValueError: если дата в неизвестном формате
+    """
+    if not value:
+        return None
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    result = datetime.fromisoformat(value)
+    if result.tzinfo is None:
+        result = result.replace(tzinfo=timezone.utc)
+    return result
+
+
+def _as_list(value: Union[None, Dict, List], key: str) -> List[Dict[str, Any]]:
+    """
+    Списки в ответах API бывают обернуты в объект: {"orderParam": [...]}
+    """
+    if isinstance(value, dict):
+        value = value[key] if key in value else [value]
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        return [value]
+    return list(value)
+
+
+def _shallow_snake(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {snake_case(k): v for k, v in data.items()}
+
+
+def _int(value) -> Optional[int]:
+    return int(value) if value not in (None, '') else None
+
+
+def _require(data: Dict[str, Any], model: str, *keys: str):
+    missing = [key for key in keys if data.get(key) in (None, '')]
+    if missing:
+        raise ValueError(f'{model} response does not contain {", ".join(missing)}: {data!r}')
+
+
+def _without_none(payload: Dict[str, Any]) -> Dict[str, Any]:
+    # обязательные поля со значением None не передаются, как и необязательные
+    if None in payload.values():
+        return {key: value for key, value in payload.items() if value is not None}
+    return payload
+
+
+# Тела запросов строятся словарями-литералами: это дешевле обхода _fields на каждом запросе
+class Position(NamedTuple):
+    position_name: str
+    position_count: int
+    # сумма позиции в копейках
+    position_sum: int
+    position_description: str
+
+    def to_payload(self) -> Dict[str, Any]:
+        name, count, amount, description = self
+        return _without_none({'position_name': name, 'position_count': count, 'position_sum': amount,
+                              'position_description': description})
+
+
+class CreationRequest(NamedTuple):
+    rq_uid: str
+    rq_tm: str
+    member_id: str
+    order_number: str
+    order_create_date: str
+    order_params_type: Sequence[Union[Position, Dict[str, Any]]]
+    id_qr: str
+    order_sum: int
+    currency: str
+    description: str
+    sbp_member_id: Optional[str] = None
+
+    def to_payload(self) -> Dict[str, Any]:
+        """
+        Тело запроса: поля со значением None не передаются, позиции Position сериализуются
+        """
+        (rq_uid, rq_tm, member_id, order_number, order_create_date, positions, id_qr, order_sum, currency,
+         description, sbp_member_id) = self
+        payload = _without_none({
+            'rq_uid': rq_uid, 'rq_tm': rq_tm, 'member_id': member_id, 'order_number': order_number,
+            'order_create_date': order_create_date,
+            'order_params_type': [position.to_payload() if isinstance(position, Position) else position
+                                  for position in positions],
+            'id_qr': id_qr, 'order_sum': order_sum, 'currency': currency, 'description': description})
+        if sbp_member_id is not None:
+            payload['sbp_member_id'] = sbp_member_id
+        return payload
+
+
+class StatusRequest(NamedTuple):
+    rq_uid: str
+    rq_tm: str
+    order_id: str
+    tid: str
+    partner_order_number: str
+
+    def to_payload(self) -> Dict[str, Any]:
+        rq_uid, rq_tm, order_id, tid, partner_order_number = self
+        return _without_none({'rq_uid': rq_uid, 'rq_tm': rq_tm, 'order_id': order_id, 'tid': tid,
+                              'partner_order_number': partner_order_number})
+
+
+class RevokeRequest(NamedTuple):
+    rq_uid: str
+    rq_tm: str
+    order_id: str
+
+    def to_payload(self) -> Dict[str, Any]:
+        rq_uid, rq_tm, order_id = self
+        return _without_none({'rq_uid': rq_uid, 'rq_tm': rq_tm, 'order_id': order_id})
+
+
+class CancelRequest(NamedTuple):
+    rq_uid: str
+    rq_tm: str
+    order_id: str
+    operation_type: str
+    operation_id: str
+    auth_code: str
+    id_qr: str
+    tid: str
+    cancel_operation_sum: int
+    operation_currency: str
+    sbp_payer_id: Optional[str] = None
+
+    def to_payload(self) -> Dict[str, Any]:
+        (rq_uid, rq_tm, order_id, operation_type, operation_id, auth_code, id_qr, tid, cancel_operation_sum,
+         operation_currency, sbp_payer_id) = self
+        payload = _without_none({
+            'rq_uid': rq_uid, 'rq_tm': rq_tm, 'order_id': order_id, 'operation_type': operation_type,
+            'operation_id': operation_id, 'auth_code': auth_code, 'id_qr': id_qr, 'tid': tid,
+            'cancel_operation_sum': cancel_operation_sum, 'operation_currency': operation_currency})
+        if sbp_payer_id is not None:
+            payload['sbp_payer_id'] = sbp_payer_id
+        return payload
+
+
+
+# Ответы разбираются один раз: обязательные поля проверяются при разборе, а не при обращении к словарю
+class CreationResult(NamedTuple):
+    order_id: str
+    order_state: Optional[str]
+    order_form_url: str
+    order_number: Optional[str]
+    rq_uid: Optional[str]
+    error_code: Optional[str]
+    error_description: Optional[str]
+
+    @classmethod
+    def from_response(cls, response: Dict[str, Any]) -> 'CreationResult':
+        """
+        :raises ValueError: если в ответе нет order_id или order_form_url
+        """
+        data = normalize_keys(response)
+        _require(data, 'creation', 'order_id', 'order_form_url')
+        return cls(data['order_id'], data.get('order_state'), data['order_form_url'], data.get('order_number'),
+                   data.get('rq_uid'), data.get('error_code'), data.get('error_description'))
+
+
+class OrderOperation(NamedTuple):
+    operation_id: str
+    operation_type: Optional[str]
+    operation_date_time: Optional[datetime]
+    # сумма операции в копейках
+    operation_sum: Optional[int]
+    operation_currency: Optional[str]
+    auth_code: Optional[str]
+    rrn: Optional[str]
+    response_code: Optional[str]
+
+    @classmethod
+    def from_params(cls, data: Dict[str, Any]) -> 'OrderOperation':
+        """
+        :param data: параметры операции заказа (ключи в snake_case)
+        :raises ValueError: если нет operation_id
+        """
+        _require(data, 'order operation', 'operation_id')
+        return cls(data['operation_id'], data.get('operation_type'),
+                   parse_datetime(data.get('operation_date_time')), _int(data.get('operation_sum')),
+                   data.get('operation_currency'), data.get('auth_code'), data.get('rrn'), data.get('response_code'))
+
+
+class StatusResult(NamedTuple):
+    order_id: str
+    order_state: str
+    operations: Tuple[OrderOperation, ...]
+    rq_uid: Optional[str]
+    error_code: Optional[str]
+    error_description: Optional[str]
+
+    @classmethod
+    def from_response(cls, response: Dict[str, Any]) -> 'StatusResult':
+        """
+        :raises ValueError: если в ответе нет order_id или order_state (например, заказ не найден)
+        """
+        data = normalize_keys(response)
+        _require(data, 'status', 'order_id', 'order_state')
+        operations = tuple(OrderOperation.from_params(operation) for operation in
+                           _as_list(data.get('order_operation_params'), 'order_operation_param'))
+        return cls(data['order_id'], data['order_state'], operations, data.get('rq_uid'),
+                   data.get('error_code'), data.get('error_description'))
+
+
+class RevokeResult(NamedTuple):
+    order_id: str
+    order_state: Optional[str]
+    rq_uid: Optional[str]
+    error_code: Optional[str]
+    error_description: Optional[str]
+
+    @classmethod
+    def from_response(cls, response: Dict[str, Any]) -> 'RevokeResult':
+        """
+        :raises ValueError: если в ответе нет order_id
+        """
+        data = normalize_keys(response)
+        _require(data, 'revocation', 'order_id')
+        return cls(data['order_id'], data.get('order_state'), data.get('rq_uid'),
+                   data.get('error_code'), data.get('error_description'))
+
+
+class CancelResult(NamedTuple):
+    order_id: str
+    order_status: Optional[str]
+    # операция возврата; в ответе с ошибкой ее нет
+    operation_id: Optional[str]
+    operation_type: Optional[str]
+    operation_date_time: Optional[datetime]
+    auth_code: Optional[str]
+    rrn: Optional[str]
+    rq_uid: Optional[str]
+    error_code: Optional[str]
+    error_description: Optional[str]
+
+    @classmethod
+    def from_response(cls, response: Dict[str, Any]) -> 'CancelResult':
+        """
+        :raises ValueError: если в ответе нет order_id
+        """
+        data = normalize_keys(response)
+        _require(data, 'cancel', 'order_id')
+        return cls(data['order_id'], data.get('order_status'), data.get('operation_id'), data.get('operation_type'),
+                   parse_datetime(data.get('operation_date_time')), data.get('auth_code'), data.get('rrn'),
+                   data.get('rq_uid'), data.get('error_code'), data.get('error_description'))
+
+class RegistryOperation(NamedTuple):
+    id_qr: Optional[str]
+    order_id: str
+    partner_order_number: Optional[str]
+    order_state: Optional[str]
+    operation_id: str
+    operation_type: Optional[str]
+    operation_date_time: Optional[datetime]
+    # сумма операции в копейках
+    operation_sum: Optional[int]
+    operation_currency: Optional[str]
+    auth_code: Optional[str]
+    rrn: Optional[str]
+    response_code: Optional[str]
+
+    @classmethod
+    def from_params(cls, order: Dict[str, Any], operation: Dict[str, Any],
+                    id_qr: Optional[str] = None) -> 'RegistryOperation':
+        """
+        :param order: параметры заказа из реестра (ключи в snake_case)
+        :param operation: параметры операции заказа (ключи в snake_case)
+        :raises ValueError: если нет order_id или operation_id
+        """
+        order_id, operation_id = order.get('order_id'), operation.get('operation_id')
+        if not order_id or not operation_id:
+            raise ValueError(f'Registry operation must contain order_id and operation_id: {order!r}')
+        return cls(id_qr=order.get('id_qr', id_qr),
+                   order_id=order_id,
+                   partner_order_number=order.get('partner_order_number'),
+                   order_state=order.get('order_state'),
+                   operation_id=operation_id,
+                   operation_type=operation.get('operation_type'),
+                   operation_date_time=parse_datetime(operation.get('operation_date_time')),
+                   operation_sum=_int(operation.get('operation_sum')),
+                   operation_currency=operation.get('operation_currency'),
+                   auth_code=operation.get('auth_code'),
+                   rrn=operation.get('rrn'),
+                   response_code=operation.get('response_code'))
+
+
+def iter_registry_operations(response: Dict[str, Any], id_qr: Optional[str] = None) -> Iterator[RegistryOperation]:
+    """
+    Операции из ответа метода registry (RegistryType.REGISTRY) по одной, без построения промежуточных списков
+
+    :param response: ответ registry
+    :param id_qr: идентификатор QR, если его нет в ответе
+    """
+    # ключи приводятся к snake_case поверхностно, заказы нормализуются по одному при итерации
+    response = _shallow_snake(response)
+    id_qr = response.get('id_qr', id_qr)
+    registry_data = _shallow_snake(response.get('registry_data') or {})
+    order_params = registry_data.get('order_params')
+    if isinstance(order_params, dict):
+        order_params = _shallow_snake(order_params)
+    for order in _as_list(order_params, 'order_param'):
+        order = normalize_keys(order)
+        for operation in _as_list(order.get('order_operation_params'), 'order_operation_param'):
+            yield RegistryOperation.from_params(order, operation, id_qr)
+
+
+class RegistryQuantity(NamedTuple):
+    total_count: int
+    payment_count: int
+    refund_count: int
+    reverse_count: int
+
+    @classmethod
+    def from_response(cls, response: Dict[str, Any]) -> 'RegistryQuantity':
+        """
+        Ответ метода registry (RegistryType.QUANTITY)
+
+        :raises ValueError: если в ответе нет quantity_data
+        """
+        data = normalize_keys(response)
+        quantity = (data.get('registry_data') or {}).get('quantity_data')
+        if not isinstance(quantity, dict):
+            raise ValueError(f'registry response does not contain quantity_data: {response!r}')
+        return cls(_int(quantity.get('total_count')) or 0, _int(quantity.get('payment_count')) or 0,
+                   _int(quantity.get('refund_count')) or 0, _int(quantity.get('reverse_count')) or 0)
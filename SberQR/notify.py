@@ -0,0 +1,196 @@
+import asyncio
+import inspect
+from collections import OrderedDict
+from logging import getLogger
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from aiohttp import web
+
+from .payload import normalize_keys
+from .poller import PollResult, StatusPoller
+from .types import TERMINAL_ORDER_STATES
+
+logger = getLogger(__name__)
+
+
+class Notification(NamedTuple):
+    order_id: str
+    order_state: str
+    operation_id: Optional[str]
+    operation_type: Optional[str]
+    operation_sum: Optional[int]
+    partner_order_number: Optional[str]
+    # 'notify' - уведомление банка, 'poll' - результат резервного опроса статуса
+    source: str
+    raw: Dict[str, Any]
+
+    @property
+    def key(self) -> Tuple[str, Optional[str], str]:
+        return self.order_id, self.operation_id, self.order_state
+
+    @classmethod
+    def parse(cls, data: Dict[str, Any], source: str = 'notify') -> 'Notification':
+        """
+        :raises ValueError: если в уведомлении нет order_id или order_state
+        """
+        if not isinstance(data, dict):
+            raise ValueError('Notification must be a JSON object')
+        data = normalize_keys(data)
+        order_id, order_state = data.get('order_id'), data.get('order_state')
+        if not order_id or not order_state:
+            raise ValueError('Notification must contain order_id and order_state')
+        operation_sum = data.get('operation_sum')
+        return cls(order_id=str(order_id), order_state=str(order_state),
+                   operation_id=data.get('operation_id'), operation_type=data.get('operation_type'),
+                   operation_sum=int(operation_sum) if operation_sum is not None else None,
+                   partner_order_number=data.get('partner_order_number'),
+                   source=source, raw=data)
+
+
+class NotificationReceiver:
+    """
+    Прием уведомлений банка об изменении состояния заказа (Scope.notify).
+
+    Уведомления проверяются, дедуплицируются по (order_id, operation_id, order_state)
+    и передаются обработчикам on_notification. Если обработчик завершился ошибкой,
+    банку возвращается 500 и повторная доставка того же уведомления будет обработана.
+
+    Если передан client, заказы, зарегистрированные через expect(), опрашиваются через status(),
+    пока не придет уведомление с конечным состоянием. Результаты опроса передаются тем же обработчикам.
+
+    Соединение с банком должно быть защищено mTLS на стороне веб-сервера/балансировщика.
+    """
+
+    def __init__(self, client=None, path: str = '/sberqr/notify', dedup_size: int = 10000,
+                 fallback_delay: float = 30.0, fallback_max_interval: float = 60.0,
+                 fallback_max_age: Optional[float] = 900.0, fallback_concurrency: int = 10):
+        """
+        :param client: AsyncSberQR для резервного опроса статусов (None - без опроса)
+        :param path: путь, на который банк отправляет уведомления
+        :param dedup_size: сколько последних уведомлений помнить для дедупликации
+        :param fallback_delay: через сколько секунд после expect() начать опрос статуса
+        :param fallback_max_interval: максимальный интервал резервного опроса
+        :param fallback_max_age: через сколько секунд прекратить резервный опрос заказа
+        :param fallback_concurrency: максимальное количество одновременных запросов статуса
+        """
+        self.path = path
+        self._dedup_size = dedup_size
+        self._seen: 'OrderedDict[Tuple, None]' = OrderedDict()
+        self._processing: Dict[Tuple, asyncio.Future] = {}
+        self._handlers: List[Callable[[Notification], Any]] = []
+        self._poller: Optional[StatusPoller] = None
+        if client is not None:
+            self._poller = StatusPoller(client, concurrency=fallback_concurrency,
+                                        initial_interval=fallback_delay, max_interval=fallback_max_interval,
+                                        max_age=fallback_max_age)
+            self._poller.on_result(self._on_poll_result)
+
+    def on_notification(self, handler: Callable[[Notification], Any]):
+        """
+        Регистрирует обработчик уведомлений (функцию или корутину).
+        Может использоваться как декоратор.
+        """
+        self._handlers.append(handler)
+        return handler
+
+    def expect(self, order_id: str, partner_order_number: str):
+        """
+        Регистрирует заказ для резервного опроса статуса на случай, если уведомление не придет
+        """
+        if self._poller is None:
+            raise RuntimeError('NotificationReceiver was created without client, status polling is unavailable')
+        self._poller.start()
+        self._poller.add(order_id, partner_order_number)
+
+    def setup(self, app: web.Application):
+        """
+        Добавляет обработчик уведомлений в существующее приложение aiohttp
+        """
+        app.router.add_post(self.path, self.handle)
+        app.on_cleanup.append(self._on_cleanup)
+
+    def app(self) -> web.Application:
+        """
+        Создает приложение aiohttp с обработчиком уведомлений
+        """
+        app = web.Application()
+        self.setup(app)
+        return app
+
+    async def close(self):
+        if self._poller is not None:
+            await self._poller.stop()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        try:
+            notification = Notification.parse(await request.json())
+        except ValueError as e:
+            logger.warning('Invalid notification: %s', e)
+            return web.json_response({'error': str(e)}, status=400)
+
+        try:
+            await self.dispatch(notification)
+        except Exception:
+            logger.exception('Error while processing notification for order %s', notification.order_id)
+            return web.json_response({'error': 'processing failed'}, status=500)
+        return web.json_response({'order_id': notification.order_id})
+
+    async def dispatch(self, notification: Notification) -> bool:
+        """
+        Передает уведомление обработчикам, если оно не было обработано ранее
+        :return: False для повторного уведомления
+        """
+        key = notification.key
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            return False
+        if key in self._processing:
+            # та же операция уже обрабатывается, ждем ее результата
+            await asyncio.shield(self._processing[key])
+            return False
+
+        future = asyncio.get_running_loop().create_future()
+        self._processing[key] = future
+        try:
+            if self._poller is not None and notification.order_state in TERMINAL_ORDER_STATES:
+                self._poller.discard(notification.order_id)
+            for handler in self._handlers:
+                result = handler(notification)
+                if inspect.isawaitable(result):
+                    await result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # исключение получат ожидающие дубликаты, если они есть
+            future.exception()
+            raise
+        else:
+            future.set_result(None)
+        finally:
+            del self._processing[key]
+
+        self._seen[key] = None
+        if len(self._seen) > self._dedup_size:
+            self._seen.popitem(last=False)
+        return True
+
+    async def _on_poll_result(self, result: PollResult):
+        if result.response is None or result.order_state is None:
+            return
+        # ответ status приходит в camelCase, операции ищем после приведения ключей
+        data = normalize_keys(result.response)
+        data.setdefault('partner_order_number', result.partner_order_number)
+        operations = data.get('order_operation_params') or []
+        if operations:
+            data = {**operations[-1], **data}
+        try:
+            await self.dispatch(Notification.parse(data, source='poll'))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Error while processing status of order %s', result.order_id)
+
+    async def _on_cleanup(self, app: web.Application):
+        await self.close()
@@ -1,15 +1,26 @@
-import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict
 
-logger = logging.getLogger('payload')
-DEFAULT_FILTER = ['self', 'cls']
+_CAMEL_RE = re.compile(r'(?<=[a-z0-9])(?=[A-Z])')
 
 
-def generate_payload(exclude=None, **kwargs):
-    if exclude is None:
-        exclude = ['headers', 'dt']
-    data = dict()
-    for k, v in kwargs.items():
-        if k not in exclude + DEFAULT_FILTER and v is not None:
-            data[k] = v
-    logger.debug(data)
-    return data
+# набор ключей ответов API невелик, каждый ключ преобразуется один раз
+@lru_cache(maxsize=1024)
+def snake_case(key: str) -> str:
+    return _CAMEL_RE.sub('_', key).lower()
+
+
+def normalize_keys(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Приводит ключи ответа к snake_case (orderId -> order_id, idQR -> id_qr), в том числе во вложенных объектах
+    """
+    return {snake_case(k): _normalize_value(v) for k, v in data.items()}
+
+
+def _normalize_value(value):
+    if isinstance(value, dict):
+        return normalize_keys(value)
+    if isinstance(value, list):
+        return [_normalize_value(v) for v in value]
+    return value
@@ -0,0 +1,257 @@
+import asyncio
+import heapq
+import inspect
+import itertools
+import time
+from logging import getLogger
+from typing import (Any, AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple)
+
+from .api import Methods
+from .ratelimit import RateLimiter
+from .types import TERMINAL_ORDER_STATES
+
+logger = getLogger(__name__)
+
+_IDLE = object()
+_STOP = object()
+
+
+class PollResult(NamedTuple):
+    order_id: str
+    partner_order_number: str
+    order_state: Optional[str]
+    response: Optional[Dict[str, Any]]
+    error: Optional[BaseException]
+    final: bool
+
+
+class _Order:
+    __slots__ = ('order_id', 'partner_order_number', 'added', 'interval', 'state')
+
+    def __init__(self, order_id: str, partner_order_number: str, interval: float):
+        self.order_id = order_id
+        self.partner_order_number = partner_order_number
+        self.added = time.monotonic()
+        self.interval = interval
+        self.state: Optional[str] = None
+
+
+class StatusPoller:
+    """
+    Опрос статусов множества заказов через AsyncSberQR.status.
+
+    Заказы опрашиваются с ограничением параллельности и общего количества запросов в секунду.
+    Интервал опроса заказа начинается с `initial_interval` и увеличивается в `backoff` раз
+    после каждого запроса, но не больше `max_interval`. Опрос заказа прекращается,
+    когда он переходит в одно из `terminal_states` или когда с момента добавления прошло `max_age` секунд.
+
+    Результаты (смена состояния, ошибка, завершение опроса) передаются в обработчики on_result
+    и в асинхронные итераторы results().
+    """
+
+    def __init__(self, client, concurrency: int = 10, rate: Optional[float] = None,
+                 initial_interval: float = 2.0, max_interval: float = 60.0, backoff: float = 1.5,
+                 max_age: Optional[float] = 900.0, terminal_states: Iterable[str] = TERMINAL_ORDER_STATES):
+        """
+        :param client: AsyncSberQR
+        :param concurrency: максимальное количество одновременных запросов статуса
+        :param rate: максимальное количество запросов статуса в секунду (None - без ограничения)
+        :param initial_interval: интервал первого опроса заказа, секунды
+        :param max_interval: максимальный интервал опроса, секунды
+        :param backoff: множитель интервала после каждого опроса
+        :param max_age: через сколько секунд после добавления прекратить опрос заказа (None - не прекращать)
+        :param terminal_states: состояния заказа, после которых опрос прекращается
+        """
+        self._client = client
+        self._concurrency = concurrency
+        self._limiter = RateLimiter(default=rate) if rate else None
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_age = max_age
+        self.terminal_states = frozenset(terminal_states)
+
+        self._orders: Dict[str, _Order] = {}
+        self._heap: List[Tuple[float, int, _Order]] = []
+        self._counter = itertools.count()
+        self._callbacks: List[Callable[[PollResult], Any]] = []
+        self._queues: Set[asyncio.Queue] = set()
+        self._tasks: Set[asyncio.Future] = set()
+        self._runner: Optional[asyncio.Future] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __contains__(self, order_id: str):
+        return order_id in self._orders
+
+    def add(self, order_id: str, partner_order_number: str, delay: Optional[float] = None):
+        """
+        Добавляет заказ в опрос. Повторное добавление заказа перезапускает его расписание.
+
+        :param delay: задержка первого опроса, по умолчанию initial_interval
+        """
+        order = _Order(order_id, partner_order_number, self.initial_interval)
+        self._orders[order_id] = order
+        self._schedule(order, self.initial_interval if delay is None else delay)
+
+    def add_many(self, orders: Iterable[Tuple[str, str]]):
+        """
+        :param orders: пары (order_id, partner_order_number)
+        """
+        for order_id, partner_order_number in orders:
+            self.add(order_id, partner_order_number)
+
+    def discard(self, order_id: str):
+        """
+        Прекращает опрос заказа
+        """
+        self._orders.pop(order_id, None)
+        self._check_idle()
+
+    def on_result(self, callback: Callable[[PollResult], Any]):
+        """
+        Регистрирует обработчик результатов (функцию или корутину).
+        Может использоваться как декоратор.
+        """
+        self._callbacks.append(callback)
+        return callback
+
+    def start(self):
+        if self._runner is None or self._runner.done():
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """
+        Останавливает опрос. Незавершенные запросы отменяются, итераторы results() завершаются.
+        """
+        tasks = list(self._tasks)
+        if self._runner is not None:
+            tasks.append(self._runner)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._runner = None
+        for queue in self._queues:
+            queue.put_nowait(_STOP)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+    async def results(self, until_idle: bool = True) -> AsyncIterator[PollResult]:
+        """
+        Асинхронный итератор результатов опроса.
+
+        :param until_idle: завершить итерацию, когда не останется заказов в опросе,
+            иначе итерация продолжается до stop()
+        """
+        self.start()
+        queue: asyncio.Queue = asyncio.Queue()
+        self._queues.add(queue)
+        try:
+            while not (until_idle and not self._orders and queue.empty()):
+                item = await queue.get()
+                if item is _STOP:
+                    break
+                if item is _IDLE:
+                    continue
+                yield item
+        finally:
+            self._queues.discard(queue)
+
+    async def wait(self):
+        """
+        Ожидает завершения опроса всех добавленных заказов
+        """
+        async for _ in self.results(until_idle=True):
+            pass
+
+    def _schedule(self, order: _Order, delay: float):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), order))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            if not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, order = heapq.heappop(self._heap)
+            if self._orders.get(order.order_id) is not order:
+                # заказ удален или добавлен заново
+                continue
+            await self._semaphore.acquire()
+            if self._limiter is not None:
+                await self._limiter.acquire(Methods.status)
+            task = asyncio.ensure_future(self._poll(order))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _poll(self, order: _Order):
+        response, error = None, None
+        try:
+            response = await self._client.status(order.order_id, order.partner_order_number)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning('Status request for order %s failed: %r', order.order_id, e)
+            error = e
+        finally:
+            self._semaphore.release()
+
+        if self._orders.get(order.order_id) is not order:
+            return
+
+        state = (response.get('orderState') or response.get('order_state')) if isinstance(response, dict) else None
+        expired = self.max_age is not None and time.monotonic() - order.added >= self.max_age
+        final = state in self.terminal_states or expired
+        changed = state is not None and state != order.state
+        if state is not None:
+            order.state = state
+
+        if final:
+            del self._orders[order.order_id]
+        else:
+            order.interval = min(order.interval * self.backoff, self.max_interval)
+            self._schedule(order, order.interval)
+
+        if changed or final or error is not None:
+            await self._emit(PollResult(order.order_id, order.partner_order_number, order.state,
+                                        response, error, final))
+        self._check_idle()
+
+    async def _emit(self, result: PollResult):
+        for queue in self._queues:
+            queue.put_nowait(result)
+        for callback in self._callbacks:
+            try:
+                ret = callback(result)
+                if inspect.isawaitable(ret):
+                    await ret
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Error in poll result callback')
+
+    def _check_idle(self):
+        if not self._orders:
+            for queue in self._queues:
+                queue.put_nowait(_IDLE)
@@ -0,0 +1,141 @@
+import asyncio
+import ssl
+from logging import getLogger
+from typing import Dict, Mapping, Optional, Tuple
+
+import aiohttp
+
+from .AsyncSberQR import AsyncSberQR, create_ssl_context
+from .ratelimit import Limit, RateLimiter
+from .tokens import TokenCache
+
+logger = getLogger(__name__)
+
+# (crt_file_path, key_file_path, russian_crt)
+CertKey = Tuple[str, str, str]
+
+
+class _PooledAsyncSberQR(AsyncSberQR):
+    """
+    AsyncSberQR, использующий сессию пула. Сессия закрывается пулом, а не клиентом,
+    транспорт, созданный клиентом (transport='httpx'), - клиентом
+    """
+
+    def __init__(self, pool: 'AsyncSberQRPool', cert_key: CertKey, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = pool
+        self._cert_key = cert_key
+        self._pool_size = pool._connector_init['limit'] or None
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        return await self._pool.get_session(self._cert_key)
+
+    async def close(self):
+        await self.stop_token_refresher()
+        if self._own_transport:
+            await self.transport.close()
+
+
+class AsyncSberQRPool:
+    """
+    Общие SSL контексты, соединения и токены для множества терминалов.
+
+    Клиенты с одинаковым сертификатом используют один aiohttp.ClientSession (и один пул соединений),
+    клиенты с одинаковым client_id - один кэш токенов и общие лимиты запросов.
+
+    Пример::
+
+        pool = AsyncSberQRPool(connections_limit=200)
+        sber_qr = pool.client(member_id, id_qr, tid, client_id, client_secret,
+                              crt_file_path, key_file_path, pkcs12_password, russian_crt)
+        ...
+        await pool.close()
+    """
+
+    def __init__(self, connections_limit: int = 100, limit_per_host: int = 0,
+                 keepalive_timeout: float = 30.0, ttl_dns_cache: Optional[int] = 300,
+                 token_refresh_margin: float = 60, rate_limits: Optional[Mapping[str, Limit]] = None,
+                 **client_kwargs):
+        """
+        :param connections_limit: максимальное количество соединений одного сертификата
+        :param limit_per_host: максимальное количество соединений с одним хостом (0 - без ограничения)
+        :param keepalive_timeout: сколько секунд держать неиспользуемое соединение открытым
+        :param ttl_dns_cache: время кэширования DNS, секунды (None - бессрочно)
+        :param token_refresh_margin: за сколько секунд до истечения обновлять токен
+        :param rate_limits: лимиты запросов по методам API на client_id, например {Methods.creation: 50}
+        :param client_kwargs: параметры, передаваемые всем клиентам AsyncSberQR (timeout, retry, ...)
+        """
+        self._connector_init = dict(limit=connections_limit, limit_per_host=limit_per_host,
+                                    keepalive_timeout=keepalive_timeout, ttl_dns_cache=ttl_dns_cache,
+                                    use_dns_cache=True)
+        self._token_refresh_margin = token_refresh_margin
+        self._client_kwargs = client_kwargs
+        self._ssl_contexts: Dict[CertKey, ssl.SSLContext] = {}
+        self._sessions: Dict[CertKey, aiohttp.ClientSession] = {}
+        self._token_caches: Dict[str, TokenCache] = {}
+        self._rate_limits = rate_limits
+        self._rate_limiters: Dict[str, RateLimiter] = {}
+        self._lock: Optional[asyncio.Lock] = None
+
+    def client(self, member_id: str, id_qr: str, tid: str, client_id: str, client_secret: str,
+               crt_file_path: str, key_file_path: str, pkcs12_password: str, russian_crt: str,
+               **kwargs) -> AsyncSberQR:
+        """
+        Клиент терминала, использующий общие соединения пула.
+        kwargs переопределяют параметры клиента, переданные в пул
+        """
+        cert_key = (crt_file_path, key_file_path, russian_crt)
+        ssl_context = self._ssl_contexts.get(cert_key)
+        if ssl_context is None:
+            ssl_context = create_ssl_context(crt_file_path, key_file_path, pkcs12_password, russian_crt)
+            self._ssl_contexts[cert_key] = ssl_context
+        token_cache = self._token_caches.setdefault(client_id, TokenCache(self._token_refresh_margin))
+        if self._rate_limits is not None and 'rate_limiter' not in kwargs:
+            kwargs['rate_limiter'] = self._rate_limiters.setdefault(client_id, RateLimiter(self._rate_limits))
+        return _PooledAsyncSberQR(self, cert_key, member_id, id_qr, tid, client_id, client_secret,
+                                  crt_file_path, key_file_path, pkcs12_password, russian_crt,
+                                  ssl_context=ssl_context, token_cache=token_cache,
+                                  **{**self._client_kwargs, **kwargs})
+
+    async def get_session(self, cert_key: CertKey) -> aiohttp.ClientSession:
+        session = self._sessions.get(cert_key)
+        if session is not None and not session.closed:
+            return session
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            session = self._sessions.get(cert_key)
+            if session is None or session.closed:
+                connector = aiohttp.TCPConnector(ssl=self._ssl_contexts[cert_key], **self._connector_init)
+                session = aiohttp.ClientSession(connector=connector)
+                self._sessions[cert_key] = session
+            return session
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Количество сертификатов, клиентов (client_id) и открытых соединений пула
+        """
+        connections = {}
+        for (crt_file_path, _, _), session in self._sessions.items():
+            connector = session.connector
+            if connector is not None and not session.closed:
+                connections[crt_file_path] = {'limit': connector.limit,
+                                              'acquired': len(getattr(connector, '_acquired', ()))}
+        return {'certificates': len(self._ssl_contexts), 'client_ids': len(self._token_caches),
+                'connections': connections}
+
+    async def close(self):
+        """
+        Закрывает все сессии пула
+        """
+        sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            await session.close()
+
+
+def __getattr__(name: str):
+    # синхронный пул перенесен в pool_sync, чтобы пул AsyncSberQR не загружал requests
+    if name == 'SberQRPool':
+        from .pool_sync import SberQRPool
+        return SberQRPool
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
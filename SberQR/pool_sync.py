@@ -0,0 +1,107 @@
+import ssl
+import threading
+from logging import getLogger
+from typing import Dict, Mapping, Optional, Tuple
+
+import requests
+
+from .SberQr import SberQR, SSLAdapter, create_ssl_context
+from .ratelimit import Limit, RateLimiter
+from .tokens import TokenCache
+
+logger = getLogger(__name__)
+
+# (crt_file_path, key_file_path, russian_crt)
+CertKey = Tuple[str, str, str]
+
+
+class _PooledSberQR(SberQR):
+    """
+    SberQR, использующий сессию пула. Сессия закрывается пулом, а не клиентом,
+    транспорт, созданный клиентом (transport='httpx'), - клиентом
+    """
+
+    def __init__(self, pool: 'SberQRPool', cert_key: CertKey, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = pool
+        self._cert_key = cert_key
+        self._pool_size = pool._adapter_init['pool_maxsize']
+
+    def get_session(self) -> requests.Session:
+        return self._pool.get_session(self._cert_key)
+
+    def close(self):
+        self.stop_token_refresher()
+        if self._own_transport:
+            self.transport.close()
+
+
+class SberQRPool:
+    """
+    Общие SSL контексты, соединения и токены для множества терминалов (синхронная версия).
+
+    Клиенты с одинаковым сертификатом используют один requests.Session с общим пулом соединений urllib3,
+    клиенты с одинаковым client_id - один кэш токенов и общие лимиты запросов.
+    """
+
+    def __init__(self, pool_maxsize: int = 10, pool_block: bool = False,
+                 token_refresh_margin: float = 60, rate_limits: Optional[Mapping[str, Limit]] = None,
+                 **client_kwargs):
+        """
+        :param pool_maxsize: максимальное количество соединений с хостом API одного сертификата
+        :param pool_block: ждать освобождения соединения вместо открытия временного сверх pool_maxsize
+        :param token_refresh_margin: за сколько секунд до истечения обновлять токен
+        :param rate_limits: лимиты запросов по методам API на client_id, например {Methods.creation: 50}
+        :param client_kwargs: параметры, передаваемые всем клиентам SberQR (timeout, retry, ...)
+        """
+        self._adapter_init = dict(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=pool_block)
+        self._token_refresh_margin = token_refresh_margin
+        self._client_kwargs = client_kwargs
+        self._ssl_contexts: Dict[CertKey, ssl.SSLContext] = {}
+        self._sessions: Dict[CertKey, requests.Session] = {}
+        self._token_caches: Dict[str, TokenCache] = {}
+        self._rate_limits = rate_limits
+        self._rate_limiters: Dict[str, RateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def client(self, member_id: str, id_qr: str, tid: str, client_id: str, client_secret: str,
+               crt_file_path: str, key_file_path: str, pkcs12_password: str, russian_crt: str,
+               **kwargs) -> SberQR:
+        """
+        Клиент терминала, использующий общие соединения пула.
+        kwargs переопределяют параметры клиента, переданные в пул
+        """
+        cert_key = (crt_file_path, key_file_path, russian_crt)
+        with self._lock:
+            ssl_context = self._ssl_contexts.get(cert_key)
+            if ssl_context is None:
+                ssl_context = create_ssl_context(crt_file_path, key_file_path, pkcs12_password, russian_crt)
+                self._ssl_contexts[cert_key] = ssl_context
+            token_cache = self._token_caches.setdefault(client_id, TokenCache(self._token_refresh_margin))
+            if self._rate_limits is not None and 'rate_limiter' not in kwargs:
+                kwargs['rate_limiter'] = self._rate_limiters.setdefault(client_id, RateLimiter(self._rate_limits))
+        return _PooledSberQR(self, cert_key, member_id, id_qr, tid, client_id, client_secret,
+                             crt_file_path, key_file_path, pkcs12_password, russian_crt,
+                             ssl_context=ssl_context, token_cache=token_cache,
+                             **{**self._client_kwargs, **kwargs})
+
+    def get_session(self, cert_key: CertKey) -> requests.Session:
+        session = self._sessions.get(cert_key)
+        if session is not None:
+            return session
+        with self._lock:
+            session = self._sessions.get(cert_key)
+            if session is None:
+                session = requests.Session()
+                session.mount('https://', SSLAdapter(self._ssl_contexts[cert_key], **self._adapter_init))
+                self._sessions[cert_key] = session
+            return session
+
+    def close(self):
+        """
+        Закрывает все сессии пула
+        """
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
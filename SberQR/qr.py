@@ -0,0 +1,157 @@
+import asyncio
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from enum import Enum
+from typing import Any, Dict, Mapping, Optional, Tuple, Union
+
+# (url, format, box_size, border)
+QRKey = Tuple[str, str, int, int]
+QRImage = Union[bytes, str]
+
+
+class QRFormat(Enum):
+    PNG = 'png'
+    SVG = 'svg'
+    # текст для вывода в терминал (полублоки Unicode)
+    TEXT = 'text'
+
+
+def order_form_url(order: Union[str, Mapping[str, Any]]) -> str:
+    """
+    Ссылка на оплату из строки или ответа creation
+    """
+    if isinstance(order, str):
+        return order
+    url = order.get('order_form_url') or order.get('orderFormUrl')
+    if not url:
+        raise ValueError(f'Response does not contain order_form_url: {order!r}')
+    return url
+
+
+def _matrix_text(matrix) -> str:
+    # две строки матрицы в одной строке текста: верхний и нижний полублоки
+    chars = {(False, False): ' ', (True, False): '▀', (False, True): '▄', (True, True): '█'}
+    lines = []
+    for row in range(0, len(matrix), 2):
+        upper = matrix[row]
+        lower = matrix[row + 1] if row + 1 < len(matrix) else [False] * len(upper)
+        lines.append(''.join(chars[pair] for pair in zip(upper, lower)))
+    return '\n'.join(lines)
+
+
+def render_qr(url: str, fmt: Union[str, QRFormat] = QRFormat.PNG, box_size: int = 10, border: int = 4) -> QRImage:
+    """
+    QR-код ссылки: PNG (bytes), SVG (bytes) или текст для терминала (str).
+    Функция не использует общих данных и может выполняться в пуле процессов
+
+    :param box_size: размер модуля в пикселях (PNG, SVG)
+    :param border: ширина рамки в модулях
+    :raises ImportError: если qrcode не установлен
+    """
+    try:
+        import qrcode
+    except ImportError as e:
+        raise ImportError('QR rendering requires qrcode: pip install SberQR[qr]') from e
+
+    fmt = QRFormat(fmt)
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, box_size=box_size, border=border)
+    qr.add_data(url)
+    qr.make(fit=True)
+    if fmt == QRFormat.TEXT:
+        # темные модули на светлом фоне терминала
+        return _matrix_text(qr.get_matrix())
+
+    buffer = io.BytesIO()
+    if fmt == QRFormat.SVG:
+        from qrcode.image.svg import SvgPathImage
+        qr.make_image(image_factory=SvgPathImage).save(buffer)
+    else:
+        qr.make_image().save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class QRRenderer:
+    """
+    Рендеринг QR-кодов с LRU кэшем по (url, формат, размер).
+
+    render_async выполняет рендеринг вне цикла событий (в executor, по умолчанию - пул потоков цикла),
+    одновременные запросы одного изображения выполняют один рендеринг.
+    """
+
+    def __init__(self, cache_size: int = 1024, executor: Optional[Executor] = None):
+        """
+        :param cache_size: количество изображений в кэше (0 - без кэша)
+        :param executor: ThreadPoolExecutor или ProcessPoolExecutor для render_async
+        """
+        self.cache_size = cache_size
+        self.executor = executor
+        # hits - изображения из кэша, misses - выполненные рендеринги
+        self.hits = 0
+        self.misses = 0
+        self._cache: 'OrderedDict[QRKey, QRImage]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending: Dict[QRKey, asyncio.Future] = {}
+
+    @staticmethod
+    def _key(url: str, fmt: Union[str, QRFormat], box_size: int, border: int) -> QRKey:
+        return url, QRFormat(fmt).value, box_size, border
+
+    def _get(self, key: QRKey) -> Optional[QRImage]:
+        with self._lock:
+            image = self._cache.get(key)
+            if image is None:
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def _put(self, key: QRKey, image: QRImage):
+        if not self.cache_size:
+            return
+        with self._lock:
+            self._cache[key] = image
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def render(self, order: Union[str, Mapping[str, Any]], fmt: Union[str, QRFormat] = QRFormat.PNG,
+               box_size: int = 10, border: int = 4) -> QRImage:
+        """
+        :param order: ссылка на оплату или ответ creation
+        """
+        key = self._key(order_form_url(order), fmt, box_size, border)
+        image = self._get(key)
+        if image is None:
+            self.misses += 1
+            image = render_qr(*key)
+            self._put(key, image)
+        return image
+
+    async def render_async(self, order: Union[str, Mapping[str, Any]], fmt: Union[str, QRFormat] = QRFormat.PNG,
+                           box_size: int = 10, border: int = 4) -> QRImage:
+        """
+        :param order: ссылка на оплату или ответ creation
+        """
+        key = self._key(order_form_url(order), fmt, box_size, border)
+        image = self._get(key)
+        if image is not None:
+            return image
+
+        future = self._pending.get(key)
+        if future is None:
+            self.misses += 1
+            future = asyncio.get_running_loop().run_in_executor(self.executor, render_qr, *key)
+            self._pending[key] = future
+            future.add_done_callback(lambda done: self._done(key, done))
+        return await asyncio.shield(future)
+
+    def _done(self, key: QRKey, future: asyncio.Future):
+        self._pending.pop(key, None)
+        if not future.cancelled() and future.exception() is None:
+            self._put(key, future.result())
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
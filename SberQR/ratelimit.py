@@ -0,0 +1,219 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Mapping, Optional, Tuple, Union
+
+from .exceptions import RateLimitExceeded
+
+
+# rate или (rate, burst): запросов в секунду и емкость корзины
+Limit = Union[float, Tuple[float, int]]
+
+# Сравнение и списание токенов атомарно на стороне Redis, время - TIME сервера, чтобы не зависеть от часов процессов.
+# Возвращает {1, wait} - токен списан, запрос можно отправить через wait секунд, {0, wait} - отказ
+_REDIS_ACQUIRE = """
+local rate, burst, max_wait = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+end
+if max_wait >= 0 and wait > max_wait then
+    return {0, tostring(wait)}
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst / rate + wait) * 1000) + 1000)
+return {1, tostring(wait)}
+"""
+
+
+class _TokenBucket:
+    """
+    Корзина с резервированием: токен списывается сразу (баланс может стать отрицательным),
+    а вызывающий ждет возвращенное время вне блокировки
+    """
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self, max_wait: Optional[float]) -> Optional[float]:
+        """
+        :return: время ожидания, секунды, или None, если ждать пришлось бы дольше max_wait
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        if max_wait is not None and wait > max_wait:
+            return None
+        self.tokens -= 1
+        return wait
+
+
+class _MethodLimits:
+
+    def __init__(self, limits: Optional[Mapping[str, Limit]] = None, default: Optional[Limit] = None,
+                 block: bool = True, max_wait: Optional[float] = None):
+        """
+        :param limits: лимиты методов API, например {Methods.creation: 50, Methods.status: (100, 20)}
+        :param default: лимит остальных методов (None - без ограничения)
+        :param block: ждать освобождения лимита; False - сразу отказывать RateLimitExceeded
+        :param max_wait: максимальное ожидание, секунды; дольше - RateLimitExceeded
+        """
+        self.limits: Dict[str, Tuple[float, float]] = {
+            method: self._parse(limit) for method, limit in (limits or {}).items()}
+        self.default = self._parse(default) if default is not None else None
+        self.block = block
+        self.max_wait = max_wait
+
+    @staticmethod
+    def _parse(limit: Limit) -> Tuple[float, float]:
+        rate, burst = limit if isinstance(limit, tuple) else (limit, None)
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        return float(rate), float(burst if burst is not None else max(1, int(rate)))
+
+    def limit(self, method: str) -> Optional[Tuple[float, float]]:
+        return self.limits.get(method, self.default)
+
+    def _max_wait(self, max_wait: Optional[float]) -> Optional[float]:
+        if not self.block:
+            return 0.0
+        if self.max_wait is None:
+            return max_wait
+        return self.max_wait if max_wait is None else min(self.max_wait, max_wait)
+
+    @staticmethod
+    def _rejected(method: str, retry_after: float) -> RateLimitExceeded:
+        return RateLimitExceeded(f'Rate limit of {method} exceeded, retry after {retry_after:.3f} s', retry_after)
+
+
+class RateLimiter(_MethodLimits):
+    """
+    Token bucket лимиты запросов по методам API в памяти процесса.
+    Квоты банка выдаются на client_id, поэтому один экземпляр передается всем клиентам одного client_id
+    (AsyncSberQRPool и SberQRPool делают это сами). Потокобезопасен: acquire - для AsyncSberQR,
+    acquire_sync - для SberQR
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _reserve(self, method: str, max_wait: Optional[float]) -> float:
+        limit = self.limit(method)
+        if limit is None:
+            return 0.0
+        with self._lock:
+            bucket = self._buckets.get(method)
+            if bucket is None:
+                bucket = self._buckets[method] = _TokenBucket(*limit)
+            wait = bucket.reserve(self._max_wait(max_wait))
+            if wait is None:
+                raise self._rejected(method, (1 - bucket.tokens) / bucket.rate)
+        return wait
+
+    async def acquire(self, method: str, max_wait: Optional[float] = None) -> float:
+        """
+        Ждет освобождения лимита метода
+
+        :param max_wait: максимальное ожидание для этого вызова (например, остаток deadline)
+        :return: время ожидания, секунды
+        :raises RateLimitExceeded: если ждать нельзя или пришлось бы дольше max_wait
+        """
+        wait = self._reserve(method, max_wait)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def acquire_sync(self, method: str, max_wait: Optional[float] = None) -> float:
+        """
+        Синхронный вариант acquire
+        """
+        wait = self._reserve(method, max_wait)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self, method: str) -> bool:
+        """
+        Забирает токен метода без ожидания
+
+        :return: False, если лимит исчерпан
+        """
+        try:
+            self._reserve(method, 0.0)
+        except RateLimitExceeded:
+            return False
+        return True
+
+
+class _RedisRateLimits(_MethodLimits):
+
+    def __init__(self, redis, client_id: str, *args, prefix: str = 'sberqr:ratelimit:', **kwargs):
+        """
+        :param redis: клиент Redis
+        :param client_id: client_id, на который банк выдал квоты
+        """
+        super().__init__(*args, **kwargs)
+        self._redis = redis
+        self.client_id = client_id
+        self.prefix = prefix
+
+    def key(self, method: str) -> str:
+        return f'{self.prefix}{self.client_id}:{method}'
+
+    def _result(self, method: str, result) -> float:
+        allowed, wait = int(result[0]), float(result[1])
+        if not allowed:
+            raise self._rejected(method, wait)
+        return wait
+
+    def _args(self, method: str, limit: Tuple[float, float], max_wait: Optional[float]):
+        max_wait = self._max_wait(max_wait)
+        return _REDIS_ACQUIRE, 1, self.key(method), limit[0], limit[1], -1 if max_wait is None else max_wait
+
+
+class AsyncRedisRateLimiter(_RedisRateLimits):
+    """
+    Token bucket лимиты запросов по методам API, общие для всех процессов с одним client_id (redis.asyncio.Redis)
+    """
+
+    async def acquire(self, method: str, max_wait: Optional[float] = None) -> float:
+        """
+        :param max_wait: максимальное ожидание для этого вызова (например, остаток deadline)
+        :return: время ожидания, секунды
+        :raises RateLimitExceeded: если ждать нельзя или пришлось бы дольше max_wait
+        """
+        limit = self.limit(method)
+        if limit is None:
+            return 0.0
+        wait = self._result(method, await self._redis.eval(*self._args(method, limit, max_wait)))
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class RedisRateLimiter(_RedisRateLimits):
+    """
+    Синхронный вариант AsyncRedisRateLimiter для SberQR (redis.Redis)
+    """
+
+    def acquire_sync(self, method: str, max_wait: Optional[float] = None) -> float:
+        limit = self.limit(method)
+        if limit is None:
+            return 0.0
+        wait = self._result(method, self._redis.eval(*self._args(method, limit, max_wait)))
+        if wait:
+            time.sleep(wait)
+        return wait
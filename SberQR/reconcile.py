@@ -0,0 +1,300 @@
+import asyncio
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .models import RegistryOperation, RegistryQuantity, parse_datetime
+from .registry import RegistryReader, RegistryWindow
+from .types import SUCCESS_RESPONSE_CODE, OperationType
+
+logger = getLogger(__name__)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS operations (
+    id_qr TEXT,
+    order_id TEXT NOT NULL,
+    partner_order_number TEXT,
+    order_state TEXT,
+    operation_id TEXT NOT NULL,
+    operation_type TEXT,
+    operation_date_time TEXT,
+    operation_sum INTEGER,
+    operation_currency TEXT,
+    auth_code TEXT,
+    rrn TEXT,
+    response_code TEXT,
+    PRIMARY KEY (order_id, operation_id)
+);
+CREATE INDEX IF NOT EXISTS operations_operation_id ON operations (operation_id);
+CREATE INDEX IF NOT EXISTS operations_partner_order_number ON operations (partner_order_number);
+CREATE INDEX IF NOT EXISTS operations_date_time ON operations (operation_date_time);
+CREATE TABLE IF NOT EXISTS windows (
+    id_qr TEXT NOT NULL,
+    start_period TEXT NOT NULL,
+    end_period TEXT NOT NULL,
+    ingested_at TEXT NOT NULL,
+    PRIMARY KEY (id_qr, start_period, end_period)
+);
+'''
+
+_COLUMNS = RegistryOperation._fields
+
+_PAID = OperationType.PAY.value
+_RETURNS = (OperationType.REFUND.value, OperationType.REVERSE.value)
+
+# суммы успешных оплат и возвратов по заказам
+_ORDER_TOTALS = '''
+SELECT order_id, partner_order_number,
+       SUM(CASE WHEN operation_type = ? THEN operation_sum ELSE 0 END) AS paid,
+       SUM(CASE WHEN operation_type IN (?, ?) THEN operation_sum ELSE 0 END) AS returned
+FROM operations WHERE response_code = ? GROUP BY order_id
+'''
+_ORDER_TOTALS_PARAMS = (_PAID, *_RETURNS, SUCCESS_RESPONSE_CODE)
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _as_timezone(value: datetime, reference: datetime) -> datetime:
+    # value в UTC -> в часовом поясе reference (без пояса, если reference без него)
+    return value.replace(tzinfo=None) if reference.tzinfo is None else value.astimezone(reference.tzinfo)
+
+
+def _subtract(start: datetime, end: datetime, covered: Iterable[RegistryWindow]) -> List[RegistryWindow]:
+    """
+    Части интервала [start, end), не покрытые интервалами covered
+    """
+    gaps = []
+    for covered_start, covered_end in sorted(covered):
+        if covered_end <= start:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > start:
+            gaps.append(RegistryWindow(start, covered_start))
+        start = max(start, covered_end)
+        if start >= end:
+            return gaps
+    gaps.append(RegistryWindow(start, end))
+    return gaps
+
+
+def _to_row(operation: RegistryOperation) -> tuple:
+    # время хранится в UTC, чтобы строки сравнивались в хронологическом порядке
+    date_time = operation.operation_date_time
+    return operation._replace(operation_date_time=_as_utc(date_time).isoformat() if date_time else None)
+
+
+def _from_row(row: tuple) -> RegistryOperation:
+    operation = RegistryOperation(*row)
+    return operation._replace(operation_date_time=parse_datetime(operation.operation_date_time))
+
+
+class ReconciliationStore:
+    """
+    Локальное хранилище операций реестра (SQLite) для сверки.
+
+    Операции индексируются по order_id, operation_id, partner_order_number и времени операции.
+    Выгруженные интервалы реестра запоминаются, поэтому sync() запрашивает у банка только еще не выгруженные
+    части периода, независимо от границ и длины окон предыдущих синхронизаций.
+    """
+
+    def __init__(self, path: str = ':memory:'):
+        """
+        :param path: путь к файлу базы данных SQLite
+        """
+        # sync() записывает операции из пула потоков
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        # чтения тоже под блокировкой; RLock - unmatched() вызывает _select(), уже удерживая ее
+        self._lock = threading.RLock()
+        self._db.executescript(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def ingest(self, operations: Iterable[RegistryOperation], window: Optional[RegistryWindow] = None,
+               id_qr: Optional[str] = None) -> int:
+        """
+        Сохраняет операции (повторно загруженные операции заменяются) и, если передано, отмечает окно выгруженным
+        в той же транзакции
+
+        :return: количество сохраненных операций
+        """
+        placeholders = ', '.join('?' * len(_COLUMNS))
+        with self._lock, self._db:
+            cursor = self._db.executemany(f'INSERT OR REPLACE INTO operations VALUES ({placeholders})',
+                                          (_to_row(operation) for operation in operations))
+            if window is not None:
+                self._db.execute('INSERT OR REPLACE INTO windows VALUES (?, ?, ?, ?)',
+                                 (id_qr or '', _as_utc(window.start).isoformat(), _as_utc(window.end).isoformat(),
+                                  datetime.utcnow().isoformat()))
+        return cursor.rowcount
+
+    def ingested_windows(self, id_qr: Optional[str] = None) -> Set[RegistryWindow]:
+        """
+        Выгруженные окна, время в UTC (время без часового пояса считается UTC)
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT start_period, end_period FROM windows WHERE id_qr = ?',
+                                    (id_qr or '',)).fetchall()
+        return {RegistryWindow(_as_utc(datetime.fromisoformat(start)), _as_utc(datetime.fromisoformat(end)))
+                for start, end in rows}
+
+    def pending_periods(self, start_period: datetime, end_period: datetime,
+                        id_qr: Optional[str] = None) -> List[RegistryWindow]:
+        """
+        Части периода, не покрытые выгруженными окнами, в часовом поясе start_period
+        """
+        gaps = _subtract(_as_utc(start_period), _as_utc(end_period), self.ingested_windows(id_qr))
+        return [RegistryWindow(_as_timezone(start, start_period), _as_timezone(end, start_period))
+                for start, end in gaps]
+
+    async def sync(self, client, start_period: datetime, end_period: datetime,
+                   window: timedelta = timedelta(hours=1), concurrency: int = 4) -> int:
+        """
+        Загружает из реестра клиента части периода, которые еще не были выгружены (pending_periods).
+        Операции записываются в базу в пуле потоков, не блокируя цикл событий
+
+        :param client: AsyncSberQR
+        :return: количество загруженных операций
+        """
+        id_qr = getattr(client, '_id_qr', None)
+        loop = asyncio.get_running_loop()
+        buffer: List[RegistryOperation] = []
+        total = 0
+
+        async def window_done(done: RegistryWindow):
+            nonlocal buffer, total
+            operations, buffer = buffer, []
+            now = datetime.now(timezone.utc) if done.end.tzinfo else datetime.utcnow()
+            # незавершенное окно загружается, но не отмечается, чтобы дополнить его при следующей синхронизации
+            total += await loop.run_in_executor(None, self.ingest, operations,
+                                                done if done.end <= now else None, id_qr)
+
+        for period in self.pending_periods(start_period, end_period, id_qr):
+            reader = RegistryReader(client, window, concurrency, on_window_done=window_done)
+            async for operation in reader.operations(period.start, period.end):
+                buffer.append(operation)
+        return total
+
+    def _select(self, where: str = '', params: tuple = ()) -> List[RegistryOperation]:
+        query = f'SELECT {", ".join(_COLUMNS)} FROM operations {where} ORDER BY operation_date_time'
+        with self._lock:
+            return [_from_row(row) for row in self._db.execute(query, params)]
+
+    def by_order_id(self, order_id: str) -> List[RegistryOperation]:
+        return self._select('WHERE order_id = ?', (order_id,))
+
+    def by_operation_id(self, operation_id: str) -> List[RegistryOperation]:
+        return self._select('WHERE operation_id = ?', (operation_id,))
+
+    def by_partner_order_number(self, partner_order_number: str) -> List[RegistryOperation]:
+        return self._select('WHERE partner_order_number = ?', (partner_order_number,))
+
+    def between(self, start: datetime, end: datetime) -> List[RegistryOperation]:
+        """
+        Операции с временем в интервале [start, end)
+        """
+        return self._select(*self._filter(start, end))
+
+    @staticmethod
+    def _filter(start: Optional[datetime] = None, end: Optional[datetime] = None, id_qr: Optional[str] = None,
+                response_code: Optional[str] = None) -> Tuple[str, tuple]:
+        conditions, params = [], []
+        if start is not None:
+            conditions.append('operation_date_time >= ?')
+            params.append(_as_utc(start).isoformat())
+        if end is not None:
+            conditions.append('operation_date_time < ?')
+            params.append(_as_utc(end).isoformat())
+        if id_qr is not None:
+            conditions.append('id_qr = ?')
+            params.append(id_qr)
+        if response_code is not None:
+            conditions.append('response_code = ?')
+            params.append(response_code)
+        return (f'WHERE {" AND ".join(conditions)}' if conditions else ''), tuple(params)
+
+    def columns(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                id_qr: Optional[str] = None, fields: Iterable[str] = _COLUMNS) -> Dict[str, List[Any]]:
+        """
+        Операции в виде колонок для SberQR.export (to_numpy, to_arrow, итоги) без построения RegistryOperation.
+        operation_date_time - секунды unix time, SQLite вычисляет их сам, без разбора datetime в Python
+
+        :param fields: имена колонок, по умолчанию все; для итогов достаточно export.TOTALS_FIELDS и колонки группировки
+        """
+        fields = [name for name in _COLUMNS if name in set(fields)]
+        where, params = self._filter(start, end, id_qr)
+        expressions = ', '.join("CAST(strftime('%s', operation_date_time) AS INTEGER)"
+                                if name == 'operation_date_time' else name for name in fields)
+        with self._lock:
+            rows = self._db.execute(f'SELECT {expressions} FROM operations {where} ORDER BY operation_date_time',
+                                    params).fetchall()
+        return dict(zip(fields, map(list, zip(*rows)))) or {name: [] for name in fields}
+
+    def quantity(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                 id_qr: Optional[str] = None, successful_only: bool = True) -> RegistryQuantity:
+        """
+        Количество операций по типам, как в ответе registry с RegistryType.QUANTITY, без запроса к банку
+
+        :param successful_only: считать только успешные операции (response_code '00'),
+            False - все операции периода, выгруженного sync()
+        """
+        where, params = self._filter(start, end, id_qr, SUCCESS_RESPONSE_CODE if successful_only else None)
+        with self._lock:
+            counts = dict(self._db.execute(f'SELECT operation_type, COUNT(*) FROM operations {where} '
+                                           f'GROUP BY operation_type', params))
+        return RegistryQuantity(sum(counts.values()), counts.get(_PAID, 0),
+                                counts.get(OperationType.REFUND.value, 0), counts.get(OperationType.REVERSE.value, 0))
+
+    def _with_order_numbers(self, order_numbers: Iterable[str]):
+        self._db.execute('CREATE TEMP TABLE IF NOT EXISTS known_orders (number TEXT PRIMARY KEY)')
+        self._db.execute('DELETE FROM known_orders')
+        self._db.executemany('INSERT OR IGNORE INTO known_orders VALUES (?)', ((n,) for n in order_numbers))
+
+    def unmatched(self, order_numbers: Iterable[str]) -> List[RegistryOperation]:
+        """
+        Операции реестра, номера заказов которых отсутствуют в order_numbers (в учетной системе партнера)
+        """
+        with self._lock, self._db:
+            self._with_order_numbers(order_numbers)
+            return self._select('WHERE partner_order_number IS NULL OR partner_order_number NOT IN '
+                                '(SELECT number FROM known_orders)')
+
+    def missing(self, order_numbers: Iterable[str]) -> List[str]:
+        """
+        Номера заказов из order_numbers, по которым в реестре нет операций
+        """
+        with self._lock, self._db:
+            self._with_order_numbers(order_numbers)
+            rows = self._db.execute('SELECT number FROM known_orders WHERE number NOT IN '
+                                    '(SELECT partner_order_number FROM operations '
+                                    'WHERE partner_order_number IS NOT NULL) ORDER BY number')
+            return [number for number, in rows]
+
+    def refunded(self) -> List[str]:
+        """
+        order_id заказов, возвращенных полностью (учитываются только успешные операции)
+        """
+        with self._lock:
+            rows = self._db.execute(f'SELECT order_id FROM ({_ORDER_TOTALS}) WHERE paid > 0 AND returned >= paid',
+                                    _ORDER_TOTALS_PARAMS).fetchall()
+        return [order_id for order_id, in rows]
+
+    def partially_refunded(self) -> List[str]:
+        """
+        order_id заказов, возвращенных частично (учитываются только успешные операции)
+        """
+        with self._lock:
+            rows = self._db.execute(f'SELECT order_id FROM ({_ORDER_TOTALS}) WHERE returned > 0 AND returned < paid',
+                                    _ORDER_TOTALS_PARAMS).fetchall()
+        return [order_id for order_id, in rows]
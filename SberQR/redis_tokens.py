@@ -0,0 +1,197 @@
+import asyncio
+import time
+from logging import getLogger
+from secrets import token_hex
+from typing import Dict, Iterable, Optional, Tuple
+
+from .scope import Scope
+
+logger = getLogger(__name__)
+
+# удаляет блокировку, только если она принадлежит вызывающему процессу
+_RELEASE_LOCK = '''
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+'''
+
+CachedToken = Tuple[Optional[str], int]
+
+
+def _decode(value) -> Optional[str]:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class _RedisTokenKeys:
+
+    def __init__(self, redis, client_id: str, lock_timeout: float = 10, wait_interval: float = 0.1):
+        """
+        :param redis: клиент Redis
+        :param client_id: client_id, токены разных client_id хранятся под разными ключами
+        :param lock_timeout: время жизни блокировки обновления, секунды; за это время токен должен быть получен
+        :param wait_interval: интервал проверки ключа процессами, ожидающими обновления токена
+        """
+        self._redis = redis
+        self._client_id = client_id
+        self.lock_timeout = lock_timeout
+        self.wait_interval = wait_interval
+        # время жизни, с которым токены сохранены в Redis
+        self._lifetimes: Dict[Scope, float] = {}
+
+    def key(self, scope: Scope) -> str:
+        return f'{self._client_id}token_{scope.value}'
+
+    def lock_key(self, scope: Scope) -> str:
+        return f'{self._client_id}token_{scope.value}:lock'
+
+    def lifetime_key(self, scope: Scope) -> str:
+        return f'{self._client_id}token_{scope.value}:expires_in'
+
+    def fresh(self, scope: Scope, ttl: int, margin: float) -> bool:
+        """
+        Токен не требует обновления: до истечения больше margin секунд, но не больше половины времени жизни
+        (как в TokenCache), иначе токен с коротким expires_in обновлялся бы при каждом обращении
+        """
+        lifetime = self._lifetimes.get(scope)
+        return ttl > (margin if lifetime is None else min(margin, lifetime / 2))
+
+    def _pipeline_tokens(self, pipe, scopes: Tuple[Scope, ...]):
+        keys = [self.key(scope) for scope in scopes]
+        pipe.mget(keys + [self.lifetime_key(scope) for scope in scopes])
+        for key in keys:
+            pipe.ttl(key)
+
+    def _parse_tokens(self, scopes: Tuple[Scope, ...], results) -> Dict[Scope, CachedToken]:
+        values, ttls = results[0], results[1:]
+        tokens, lifetimes = values[:len(scopes)], values[len(scopes):]
+        for scope, lifetime in zip(scopes, lifetimes):
+            if lifetime is not None:
+                self._lifetimes[scope] = float(_decode(lifetime))
+        return {scope: (_decode(token), ttl) for scope, token, ttl in zip(scopes, tokens, ttls)}
+
+    def _set_commands(self, pipe, scope: Scope, token: str, expires_in: int):
+        expires_in = max(1, int(expires_in))
+        self._lifetimes[scope] = expires_in
+        pipe.set(self.key(scope), token, ex=expires_in)
+        pipe.set(self.lifetime_key(scope), expires_in, ex=expires_in)
+
+    @staticmethod
+    def _valid(cached: CachedToken) -> bool:
+        return cached[0] is not None and cached[1] > 0
+
+
+class AsyncRedisTokenStore(_RedisTokenKeys):
+    """
+    Токены в Redis, общие для всех процессов с одним client_id.
+
+    Токены нескольких областей читаются одним запросом (MGET и TTL в одном pipeline).
+    Обновляет токен только процесс, получивший блокировку (SET NX с TTL), поэтому при одновременном
+    истечении токена у множества процессов выполняется один запрос tokens/v2/oauth. Пока токен обновляется,
+    остальные процессы используют текущий, если он еще не истек, иначе ждут появления нового токена в Redis.
+    """
+
+    async def get_many(self, scopes: Iterable[Scope]) -> Dict[Scope, CachedToken]:
+        """
+        :return: {scope: (token или None, оставшееся время жизни в секундах)}
+        """
+        scopes = tuple(scopes)
+        if not scopes:
+            return {}
+        async with self._redis.pipeline(transaction=False) as pipe:
+            self._pipeline_tokens(pipe, scopes)
+            results = await pipe.execute()
+        return self._parse_tokens(scopes, results)
+
+    async def get(self, scope: Scope) -> CachedToken:
+        return (await self.get_many((scope,)))[scope]
+
+    async def set(self, scope: Scope, token: str, expires_in: int):
+        async with self._redis.pipeline(transaction=True) as pipe:
+            self._set_commands(pipe, scope, token, expires_in)
+            await pipe.execute()
+
+    async def acquire_lock(self, scope: Scope) -> Optional[str]:
+        """
+        :return: значение блокировки для release_lock или None, если блокировку держит другой процесс
+        """
+        value = token_hex(16)
+        if await self._redis.set(self.lock_key(scope), value, nx=True, px=int(self.lock_timeout * 1000)):
+            return value
+        return None
+
+    async def release_lock(self, scope: Scope, value: str):
+        try:
+            await self._redis.eval(_RELEASE_LOCK, 1, self.lock_key(scope), value)
+        except Exception as e:
+            # блокировка будет снята по истечении lock_timeout
+            logger.warning('Unable to release token lock %s: %r', self.lock_key(scope), e)
+
+    async def wait(self, scope: Scope) -> Optional[CachedToken]:
+        """
+        Ожидает, пока процесс, получивший блокировку, сохранит новый токен
+
+        :return: (token, ttl) первого неистекшего токена или None, если токен не появился за lock_timeout
+        """
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(self.wait_interval)
+            cached = await self.get(scope)
+            if self._valid(cached):
+                return cached
+        return None
+
+
+class RedisTokenStore(_RedisTokenKeys):
+    """
+    Синхронный вариант AsyncRedisTokenStore
+    """
+
+    def get_many(self, scopes: Iterable[Scope]) -> Dict[Scope, CachedToken]:
+        """
+        :return: {scope: (token или None, оставшееся время жизни в секундах)}
+        """
+        scopes = tuple(scopes)
+        if not scopes:
+            return {}
+        with self._redis.pipeline(transaction=False) as pipe:
+            self._pipeline_tokens(pipe, scopes)
+            results = pipe.execute()
+        return self._parse_tokens(scopes, results)
+
+    def get(self, scope: Scope) -> CachedToken:
+        return self.get_many((scope,))[scope]
+
+    def set(self, scope: Scope, token: str, expires_in: int):
+        with self._redis.pipeline(transaction=True) as pipe:
+            self._set_commands(pipe, scope, token, expires_in)
+            pipe.execute()
+
+    def acquire_lock(self, scope: Scope) -> Optional[str]:
+        """
+        :return: значение блокировки для release_lock или None, если блокировку держит другой процесс
+        """
+        value = token_hex(16)
+        if self._redis.set(self.lock_key(scope), value, nx=True, px=int(self.lock_timeout * 1000)):
+            return value
+        return None
+
+    def release_lock(self, scope: Scope, value: str):
+        try:
+            self._redis.eval(_RELEASE_LOCK, 1, self.lock_key(scope), value)
+        except Exception as e:
+            logger.warning('Unable to release token lock %s: %r', self.lock_key(scope), e)
+
+    def wait(self, scope: Scope) -> Optional[CachedToken]:
+        """
+        Ожидает, пока процесс, получивший блокировку, сохранит новый токен
+
+        :return: (token, ttl) первого неистекшего токена или None, если токен не появился за lock_timeout
+        """
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            time.sleep(self.wait_interval)
+            cached = self.get(scope)
+            if self._valid(cached):
+                return cached
+        return None
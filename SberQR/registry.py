@@ -0,0 +1,101 @@
+import asyncio
+import inspect
+from datetime import datetime, timedelta
+from logging import getLogger
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from .models import RegistryOperation, iter_registry_operations
+from .types import RegistryType
+
+logger = getLogger(__name__)
+
+
+class RegistryWindow(NamedTuple):
+    start: datetime
+    end: datetime
+
+
+def split_period(start_period: datetime, end_period: datetime, window: timedelta) -> List[RegistryWindow]:
+    """
+    Разбивает период [start_period, end_period) на окна длиной window (последнее окно может быть короче)
+    """
+    if window <= timedelta(0):
+        raise ValueError('window must be positive')
+    windows = []
+    start = start_period
+    while start < end_period:
+        end = min(start + window, end_period)
+        windows.append(RegistryWindow(start, end))
+        start = end
+    return windows
+
+
+class RegistryReader:
+    """
+    Потоковое чтение реестра операций.
+
+    Период разбивается на окна длиной `window`, окна запрашиваются параллельно (не больше `concurrency`
+    одновременно), операции возвращаются асинхронным генератором по одной в порядке окон.
+    В памяти одновременно находятся ответы не более чем `concurrency` окон. Соседние окна имеют общую границу,
+    поэтому операция на границе, возвращенная банком в обоих окнах, отдается один раз (по operation_id).
+
+    Завершенные окна попадают в `completed` и передаются в `on_window_done`; при повторном чтении
+    окна из `completed` пропускаются, что позволяет продолжить прерванную выгрузку.
+    """
+
+    def __init__(self, client, window: timedelta = timedelta(hours=1), concurrency: int = 4,
+                 completed: Iterable[RegistryWindow] = (),
+                 on_window_done: Optional[Callable[[RegistryWindow], Any]] = None):
+        """
+        :param client: AsyncSberQR
+        :param window: длина окна
+        :param concurrency: максимальное количество одновременно запрашиваемых окон
+        :param completed: окна, выгруженные ранее
+        :param on_window_done: вызывается (функция или корутина) после возврата всех операций окна
+        """
+        self._client = client
+        self.window = window
+        self.concurrency = max(1, concurrency)
+        self.completed: Set[RegistryWindow] = set(completed)
+        self._on_window_done = on_window_done
+
+    def pending_windows(self, start_period: datetime, end_period: datetime) -> List[RegistryWindow]:
+        return [w for w in split_period(start_period, end_period, self.window) if w not in self.completed]
+
+    async def fetch_window(self, window: RegistryWindow) -> Dict[str, Any]:
+        return await self._client.registry(window.start, window.end, RegistryType.REGISTRY)
+
+    async def operations(self, start_period: datetime, end_period: datetime) -> AsyncIterator[RegistryOperation]:
+        """
+        Операции реестра за период по одной
+        """
+        windows = self.pending_windows(start_period, end_period)
+        id_qr = getattr(self._client, '_id_qr', None)
+        tasks = []
+        # operation_id операций предыдущего окна
+        previous: Set[str] = set()
+        try:
+            for i in range(len(windows)):
+                # держим запущенными запросы следующих окон, пока отдаем операции текущего
+                while len(tasks) < min(self.concurrency, len(windows) - i):
+                    tasks.append(asyncio.ensure_future(self.fetch_window(windows[i + len(tasks)])))
+                response = await tasks.pop(0)
+                current = set()
+                for operation in iter_registry_operations(response, id_qr):
+                    if operation.operation_id in previous:
+                        continue
+                    current.add(operation.operation_id)
+                    yield operation
+                del response
+                previous = current
+                await self._window_done(windows[i])
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _window_done(self, window: RegistryWindow):
+        self.completed.add(window)
+        if self._on_window_done is not None:
+            result = self._on_window_done(window)
+            if inspect.isawaitable(result):
+                await result
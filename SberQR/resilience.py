@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from .exceptions import CircuitOpenError
+
+
+class CircuitState(Enum):
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker одного метода API.
+
+    После `failure_threshold` ошибок подряд (сетевые ошибки, таймауты, ответы 5xx) breaker открывается
+    и вызовы сразу завершаются CircuitOpenError. Через `recovery_timeout` секунд пропускается
+    `half_open_max_calls` пробных вызовов: успешный закрывает breaker, неуспешный снова открывает.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> CircuitState:
+        if self._state is CircuitState.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def before_call(self):
+        """
+        :raises CircuitOpenError: если вызов не может быть выполнен
+        """
+        with self._lock:
+            state = self._current_state()
+            if state is CircuitState.CLOSED:
+                return
+            if state is CircuitState.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return
+            retry_after = max(0.0, self._opened_at + self.recovery_timeout - time.monotonic())
+        raise CircuitOpenError(f'Circuit for {self.name} is open', retry_after)
+
+    def on_success(self):
+        with self._lock:
+            self._state = CircuitState.CLOSED
+            self._failures = 0
+
+    def on_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state is CircuitState.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = CircuitState.OPEN
+                self._opened_at = time.monotonic()
+
+    def on_abort(self):
+        """
+        Вызов прерван без результата (например, отменен) - освобождает место пробного вызова
+        """
+        with self._lock:
+            if self._state is CircuitState.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            return {'state': state.value, 'failures': self._failures,
+                    'retry_after': max(0.0, self._opened_at + self.recovery_timeout - time.monotonic())
+                    if state is CircuitState.OPEN else 0.0}
+
+
+class AdaptiveLimiter:
+    """
+    Адаптивное ограничение количества одновременных запросов (AIMD).
+
+    Каждый успешный запрос увеличивает лимит на increase / limit (примерно +increase за "круг" запросов),
+    каждая ошибка перегрузки уменьшает лимит в `decrease` раз.
+    """
+
+    def __init__(self, initial_limit: int = 10, min_limit: int = 1, max_limit: int = 200,
+                 increase: float = 1.0, decrease: float = 0.5):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, int(self._limit))
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self):
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+
+    async def release(self, success: Optional[bool] = True):
+        """
+        :param success: False, если запрос завершился ошибкой перегрузки (таймаут, сетевая ошибка, 5xx),
+            None, если запрос прерван и лимит менять не нужно
+        """
+        if success:
+            self._limit = min(self.max_limit, self._limit + self.increase / self._limit)
+        elif success is not None:
+            self._limit = max(self.min_limit, self._limit * self.decrease)
+        condition = self._get_condition()
+        async with condition:
+            self._in_flight -= 1
+            condition.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'limit': self.limit, 'in_flight': self._in_flight}
@@ -0,0 +1,64 @@
+import random
+from http import HTTPStatus
+from typing import Iterable, Optional
+
+from .api import Methods
+from .exceptions import NetworkError, SberQrAPIError
+
+# Методы, повтор которых не приводит к повторному изменению данных.
+# creation повторяется с тем же RqUID, что и первая попытка.
+IDEMPOTENT_METHODS = frozenset({Methods.oauth, Methods.status, Methods.registry, Methods.creation})
+
+
+class RetryPolicy:
+    """
+    Повтор запросов с экспоненциальной задержкой и jitter.
+
+    Повторяются только методы из `methods` и только при сетевых ошибках, таймаутах
+    и ответах с кодом 429 или >= 500.
+    """
+
+    def __init__(self, attempts: int = 3, backoff: float = 0.2, max_backoff: float = 5.0,
+                 jitter: bool = True, methods: Iterable[str] = IDEMPOTENT_METHODS):
+        """
+        :param attempts: общее количество попыток, 1 - без повторов
+        :param backoff: задержка перед первым повтором, секунды
+        :param max_backoff: максимальная задержка между попытками, секунды
+        :param jitter: случайная задержка в диапазоне [0, backoff * 2 ** n] вместо фиксированной
+        :param methods: методы API, которые можно повторять
+        """
+        self.attempts = max(1, attempts)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.methods = frozenset(methods)
+
+    def delay(self, attempt: int) -> float:
+        """
+        Задержка перед повтором после неудачной попытки номер `attempt` (с нуля)
+        """
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def should_retry(self, method: str, error: BaseException, attempt: int) -> bool:
+        if attempt + 1 >= self.attempts or method not in self.methods:
+            return False
+        return is_retryable_error(error)
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    if isinstance(error, NetworkError):
+        return True
+    status_code: Optional[int] = getattr(error, 'status_code', None)
+    return isinstance(error, SberQrAPIError) and status_code is not None and (
+        status_code == HTTPStatus.TOO_MANY_REQUESTS or status_code >= HTTPStatus.INTERNAL_SERVER_ERROR)
+
+
+def is_throttled(error: BaseException) -> bool:
+    """
+    Ответ 429: API работает, но ограничивает частоту запросов
+    """
+    return isinstance(error, SberQrAPIError) and error.status_code == HTTPStatus.TOO_MANY_REQUESTS
+
+
+NO_RETRY = RetryPolicy(attempts=1)
@@ -8,3 +8,7 @@ class Scope(Enum):
     cancel = 'https://api.sberbank.ru/qr/order.cancel'
     registry = 'auth://qr/order.registry'
     notify = 'auth://qr/order.notify'
+
+
+# Области, используемые методами API (notify используется только банком)
+API_SCOPES = (Scope.create, Scope.status, Scope.revoke, Scope.cancel, Scope.registry)
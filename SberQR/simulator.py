@@ -0,0 +1,423 @@
+import asyncio
+import json
+import random
+import socket
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from logging import getLogger
+from secrets import token_hex
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+from .api import Methods
+from .models import parse_datetime
+from .payload import normalize_keys
+from .ratelimit import RateLimiter
+from .scope import Scope
+from .types import CancelType, OperationType, OrderState, RegistryType
+
+logger = getLogger(__name__)
+
+Latency = Union[float, Tuple[float, float]]
+
+# области токена, необходимые методам
+_METHOD_SCOPES = {
+    Methods.creation: Scope.create,
+    Methods.status: Scope.status,
+    Methods.revocation: Scope.revoke,
+    Methods.cancel: Scope.cancel,
+    Methods.registry: Scope.registry,
+}
+
+_SUCCESS = '000000'
+# rate_limit - общий лимит всех методов
+_ALL_METHODS = '*'
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _format(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _gateway_error(status: int, message: str) -> Tuple[int, Dict[str, Any]]:
+    # ошибки шлюза API возвращаются в формате IBM API Connect
+    return status, {'httpCode': str(status), 'httpMessage': message, 'moreInformation': message}
+
+
+class SimulatedOrder:
+
+    def __init__(self, order_id: str, order_number: str, id_qr: str, amount: int, currency: str,
+                 created_at: datetime, expires_at: datetime):
+        self.order_id = order_id
+        self.order_number = order_number
+        self.id_qr = id_qr
+        self.amount = amount
+        self.currency = currency
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.state = OrderState.CREATED
+        self.operations: List[Dict[str, Any]] = []
+
+    def returned_sum(self) -> int:
+        return sum(operation['operationSum'] for operation in self.operations
+                   if operation['operationType'] != OperationType.PAY.value)
+
+
+class SberQRSimulator:
+    """
+    Локальный сервер (aiohttp), реализующий методы API SberPay QR: oauth, creation, status, revocation,
+    cancel и registry. Заказы проходят состояния CREATED -> PAID -> REVERSED/REFUNDED,
+    CREATED -> REVOKED/EXPIRED. Задержка ответа, ошибки и ограничение частоты запросов настраиваются.
+    С http2=True сервер (hypercorn) принимает HTTP/1.1 и HTTP/2 без TLS (h2c prior knowledge).
+
+    Пример::
+
+        async with SberQRSimulator(latency=(0.05, 0.2), pay_after=1) as simulator:
+            sber_qr = AsyncSberQR(..., base_url=simulator.base_url)
+    """
+
+    def __init__(self, latency: Latency = 0.0, method_latency: Optional[Dict[str, Latency]] = None,
+                 error_rate: float = 0.0, error_statuses: Sequence[int] = (500, 502, 503),
+                 rate_limit: Optional[float] = None, token_ttl: int = 1800,
+                 order_ttl: timedelta = timedelta(minutes=20), pay_after: Optional[float] = None,
+                 seed: Optional[int] = None, http2: bool = False):
+        """
+        :param latency: задержка ответа, секунды, или интервал (min, max) для равномерно распределенной задержки
+        :param method_latency: задержка для отдельных методов, например {Methods.registry: 2}
+        :param error_rate: доля запросов, на которые возвращается ошибка из error_statuses
+        :param error_statuses: HTTP коды случайных ошибок
+        :param rate_limit: максимальное количество запросов в секунду, сверх него возвращается 429
+        :param token_ttl: expires_in выдаваемых токенов, секунды
+        :param order_ttl: время жизни неоплаченного заказа
+        :param pay_after: через сколько секунд после создания заказ считается оплаченным (None - только через pay())
+        :param seed: seed генератора случайных чисел для воспроизводимых задержек и ошибок
+        :param http2: сервер на hypercorn с поддержкой HTTP/2 вместо aiohttp, клиенту нужен
+            HTTPXTransport(prior_knowledge=True)
+        """
+        self.latency = latency
+        self.method_latency = dict(method_latency or {})
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.token_ttl = token_ttl
+        self.order_ttl = order_ttl
+        self.pay_after = pay_after
+        self.orders: Dict[str, SimulatedOrder] = {}
+        # количество запросов по методам
+        self.requests: Counter = Counter()
+        # адреса клиентских соединений: сколько соединений открыли клиенты
+        self.peers: Set[Tuple[str, int]] = set()
+        self._random = random.Random(seed)
+        self._limiter = RateLimiter(default=rate_limit) if rate_limit else None
+        # token -> (scope, expires_at)
+        self._tokens: Dict[str, Tuple[str, datetime]] = {}
+        # method -> [status, ...] ошибки, которые вернут следующие запросы метода
+        self._planned_errors: Dict[str, List[int]] = {}
+        self.http2 = http2
+        self._runner: Optional[web.AppRunner] = None
+        self._shutdown: Optional[asyncio.Event] = None
+        self._server: Optional[asyncio.Future] = None
+        self.base_url: Optional[str] = None
+
+    def _routes(self) -> Dict[str, Any]:
+        return {Methods.oauth: self.oauth, Methods.creation: self.creation, Methods.status: self.status,
+                Methods.revocation: self.revocation, Methods.cancel: self.cancel, Methods.registry: self.registry}
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        for method, handler in self._routes().items():
+            app.router.add_post(f'/{method}', self._handler(method, handler))
+        return app
+
+    def asgi_app(self):
+        """
+        ASGI приложение с теми же методами для серверов с HTTP/2
+        """
+        routes = {f'/{method}': (method, handler) for method, handler in self._routes().items()}
+
+        async def app(scope, receive, send):
+            if scope['type'] == 'lifespan':
+                while True:
+                    message = await receive()
+                    await send({'type': f'{message["type"]}.complete'})
+                    if message['type'] == 'lifespan.shutdown':
+                        return
+            body, more_body = b'', True
+            while more_body:
+                message = await receive()
+                body += message.get('body', b'')
+                more_body = message.get('more_body', False)
+            route = routes.get(scope['path'])
+            if route is None:
+                status, data = _gateway_error(404, 'Not Found')
+            elif scope['method'] != 'POST':
+                status, data = _gateway_error(405, 'Method Not Allowed')
+            else:
+                headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                           for name, value in scope['headers']}
+                if scope.get('client'):
+                    self.peers.add(tuple(scope['client']))
+                status, data = await self._process(*route, headers.get('authorization', ''), body)
+            raw = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            await send({'type': 'http.response.start', 'status': status,
+                        'headers': [(b'content-type', b'application/json'),
+                                    (b'content-length', str(len(raw)).encode())]})
+            # ответ на HEAD (warmup) без тела
+            await send({'type': 'http.response.body', 'body': raw if scope['method'] != 'HEAD' else b''})
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Запускает сервер
+
+        :param port: порт, 0 - любой свободный
+        :return: base_url для клиента
+        """
+        if self.http2:
+            return await self._start_http2(host, port)
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f'http://{host}:{port}'
+        return self.base_url
+
+    async def _start_http2(self, host: str, port: int) -> str:
+        try:
+            from hypercorn.asyncio import serve
+            from hypercorn.config import Config
+        except ImportError as e:
+            raise ImportError('SberQRSimulator(http2=True) requires hypercorn: pip install SberQR[simulator]') from e
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host, port))
+        sock.listen(1024)
+        host, port = sock.getsockname()[:2]
+        config = Config()
+        # сокет уже слушает порт: соединения ждут в очереди, пока сервер запускается
+        config.bind = [f'fd://{sock.detach()}']
+        config.accesslog = None
+        config.errorlog = logger
+        # по умолчанию hypercorn закрывает соединение после 1000 запросов
+        config.keep_alive_max_requests = 2 ** 31
+        self._shutdown = asyncio.Event()
+        self._server = asyncio.ensure_future(serve(self.asgi_app(), config, shutdown_trigger=self._shutdown.wait))
+        self.base_url = f'http://{host}:{port}'
+        return self.base_url
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._server is not None:
+            self._shutdown.set()
+            await self._server
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    def fail_next(self, method: str, status: int = 503, count: int = 1):
+        """
+        Следующие count запросов метода завершатся ошибкой status
+        """
+        self._planned_errors.setdefault(method, []).extend([status] * count)
+
+    def pay(self, order_id: str) -> Dict[str, Any]:
+        """
+        Оплата заказа покупателем
+
+        :return: операция оплаты
+        :raises KeyError: если заказа нет
+        :raises ValueError: если заказ нельзя оплатить
+        """
+        order = self.orders[order_id]
+        self._expire(order)
+        if order.state != OrderState.CREATED:
+            raise ValueError(f'Order {order_id} is {order.state.value} and cannot be paid')
+        return self._pay(order)
+
+    def _pay(self, order: SimulatedOrder) -> Dict[str, Any]:
+        operation = self._operation(OperationType.PAY.value, order.amount, order.currency)
+        order.operations.append(operation)
+        order.state = OrderState.PAID
+        return operation
+
+    def _handler(self, method: str, handler):
+        async def handle(request: web.Request) -> web.Response:
+            peer = request.transport.get_extra_info('peername') if request.transport is not None else None
+            if peer:
+                self.peers.add(tuple(peer[:2]))
+            status, data = await self._process(method, handler, request.headers.get('Authorization', ''),
+                                               await request.read())
+            return web.json_response(data, status=status)
+        return handle
+
+    async def _process(self, method: str, handler, authorization: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """
+        Обработка запроса независимо от сервера: HTTP код и JSON ответа
+        """
+        self.requests[method] += 1
+        await self._sleep(method)
+        if self._limiter is not None and not self._limiter.try_acquire(_ALL_METHODS):
+            return _gateway_error(429, 'Too Many Requests')
+        planned = self._planned_errors.get(method)
+        if planned:
+            return _gateway_error(planned.pop(0), 'Simulated error')
+        if self.error_rate and self._random.random() < self.error_rate:
+            return _gateway_error(self._random.choice(self.error_statuses), 'Simulated error')
+        if method != Methods.oauth:
+            error = self._check_token(authorization, _METHOD_SCOPES[method])
+            if error is not None:
+                return error
+            try:
+                data = json.loads(body)
+            except ValueError:
+                return _gateway_error(400, 'Invalid JSON')
+            if not isinstance(data, dict):
+                return _gateway_error(400, 'Request body must be a JSON object')
+            data = normalize_keys(data)
+        else:
+            data = dict(parse_qsl(body.decode('utf-8')))
+        try:
+            return 200, handler(data)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            return _gateway_error(400, f'Invalid request: {e!r}')
+
+    async def _sleep(self, method: str):
+        latency = self.method_latency.get(method, self.latency)
+        if isinstance(latency, tuple):
+            latency = self._random.uniform(*latency)
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+    def _check_token(self, authorization: str, scope: Scope) -> Optional[Tuple[int, Dict[str, Any]]]:
+        token = authorization[len('Bearer '):] if authorization.startswith('Bearer ') else None
+        item = self._tokens.get(token)
+        if item is None or item[1] <= _now():
+            return _gateway_error(401, 'Unauthorized')
+        if item[0] != scope.value:
+            return _gateway_error(403, 'Forbidden')
+        return None
+
+    def _expire(self, order: SimulatedOrder):
+        if order.state != OrderState.CREATED:
+            return
+        if self.pay_after is not None and _now() >= order.created_at + timedelta(seconds=self.pay_after):
+            self._pay(order)
+        elif _now() >= order.expires_at:
+            order.state = OrderState.EXPIRED
+
+    def _operation(self, operation_type: str, amount: int, currency: str) -> Dict[str, Any]:
+        return {'operationId': token_hex(16).upper(), 'operationDateTime': _format(_now()),
+                'rrn': str(self._random.randrange(10 ** 11, 10 ** 12)), 'operationType': operation_type,
+                'operationSum': amount, 'operationCurrency': currency,
+                'authCode': str(self._random.randrange(10 ** 5, 10 ** 6)), 'responseCode': '00',
+                'responseDesc': 'Успешно'}
+
+    @staticmethod
+    def _result(data: Dict[str, Any], error_code: str = _SUCCESS, error_description: str = '',
+                **fields) -> Dict[str, Any]:
+        return {'rqUid': data.get('rq_uid'), 'rqTm': _format(_now()), **fields,
+                'errorCode': error_code, 'errorDescription': error_description}
+
+    def oauth(self, data: Dict[str, str]) -> Dict[str, Any]:
+        if data.get('grant_type') != 'client_credentials':
+            raise ValueError('grant_type must be client_credentials')
+        token = token_hex(16)
+        self._tokens[token] = (data['scope'], _now() + timedelta(seconds=self.token_ttl))
+        return {'access_token': token, 'token_type': 'Bearer', 'expires_in': self.token_ttl,
+                'scope': data['scope'], 'session_state': token_hex(8)}
+
+    def creation(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        order_id = token_hex(16)
+        created_at = _now()
+        order = SimulatedOrder(order_id, data['order_number'], data['id_qr'], int(data['order_sum']),
+                               data.get('currency', '643'), created_at, created_at + self.order_ttl)
+        self.orders[order_id] = order
+        return self._result(data, orderNumber=order.order_number, orderId=order_id,
+                            orderState=order.state.value,
+                            orderFormUrl=f'https://sberbank.ru/qr/?uuid={order_id}')
+
+    def status(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        order = self.orders.get(data['order_id'])
+        if order is None:
+            return self._result(data, 'GW0003', 'Order not found', orderId=data['order_id'])
+        self._expire(order)
+        return self._result(data, tid=data.get('tid'), idQR=order.id_qr,
+                            orderId=order.order_id, orderState=order.state.value,
+                            orderOperationParams=list(order.operations))
+
+    def revocation(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        order = self.orders.get(data['order_id'])
+        if order is None:
+            return self._result(data, 'GW0003', 'Order not found', orderId=data['order_id'])
+        self._expire(order)
+        if order.state != OrderState.CREATED:
+            return self._result(data, 'GW0004', f'Order is {order.state.value}', orderId=order.order_id,
+                                orderState=order.state.value)
+        order.state = OrderState.REVOKED
+        return self._result(data, orderId=order.order_id, orderState=order.state.value)
+
+    def cancel(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        order = self.orders.get(data['order_id'])
+        if order is None:
+            return self._result(data, 'GW0003', 'Order not found', orderId=data['order_id'])
+        self._expire(order)
+        payment = next((operation for operation in order.operations
+                        if operation['operationId'] == data.get('operation_id')
+                        and operation['operationType'] == OperationType.PAY.value), None)
+        if order.state != OrderState.PAID or payment is None or payment['authCode'] != data.get('auth_code'):
+            return self._result(data, 'GW0005', 'Operation cannot be cancelled', orderId=order.order_id,
+                                orderStatus=order.state.value)
+        amount = int(data['cancel_operation_sum'])
+        operation_type = CancelType(data['operation_type'])
+        remaining = order.amount - order.returned_sum()
+        if amount <= 0 or amount > remaining or (operation_type == CancelType.REVERSE and amount != remaining):
+            return self._result(data, 'GW0006', 'Invalid cancel_operation_sum', orderId=order.order_id,
+                                orderStatus=order.state.value)
+        operation = self._operation(operation_type.value, amount, order.currency)
+        order.operations.append(operation)
+        if amount == remaining:
+            order.state = OrderState.REVERSED if operation_type == CancelType.REVERSE else OrderState.REFUNDED
+        return self._result(data, orderId=order.order_id, orderStatus=order.state.value,
+                            operationId=operation['operationId'], operationDateTime=operation['operationDateTime'],
+                            operationType=operation['operationType'], authCode=operation['authCode'],
+                            rrn=operation['rrn'])
+
+    def registry(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        start, end = parse_datetime(data['start_period']), parse_datetime(data['end_period'])
+        orders = []
+        for order in self.orders.values():
+            self._expire(order)
+            operations = [operation for operation in order.operations
+                          if start <= parse_datetime(operation['operationDateTime']) < end]
+            if operations and order.id_qr == data['id_qr']:
+                orders.append((order, operations))
+
+        if data.get('registry_type') == RegistryType.QUANTITY.value:
+            totals: Counter = Counter()
+            for _, operations in orders:
+                for operation in operations:
+                    totals[operation['operationType']] += 1
+            return self._result(data, idQR=data['id_qr'], registryData={'quantityData': {
+                'totalCount': sum(totals.values()), 'paymentCount': totals[OperationType.PAY.value],
+                'refundCount': totals[OperationType.REFUND.value],
+                'reverseCount': totals[OperationType.REVERSE.value]}})
+
+        order_params = [{'orderId': order.order_id, 'partnerOrderNumber': order.order_number,
+                         'orderState': order.state.value, 'amount': order.amount, 'currency': order.currency,
+                         'orderCreateDate': _format(order.created_at),
+                         'orderOperationParams': {'orderOperationParam': operations}}
+                        for order, operations in orders]
+        return self._result(data, idQR=data['id_qr'],
+                            registryData={'orderParams': {'orderParam': order_params}})
@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from .types import TERMINAL_ORDER_STATES
+
+StatusResponse = Dict[str, Any]
+# (номер invalidate() всех заказов, номер invalidate() заказа)
+Generation = Tuple[int, int]
+
+
+class StatusCache:
+    """
+    Ответы status по заказам.
+
+    Одновременные запросы статуса одного заказа выполняются одним запросом к API. С ttl ответ переиспользуется
+    ttl секунд (для заказа в конечном состоянии - terminal_ttl секунд). Кэшируются только ответы с состоянием
+    заказа; revoke и cancel клиента сбрасывают запись заказа. Ответ из кэша - общий объект, не изменяйте его.
+    Потокобезопасен, один экземпляр можно передать нескольким клиентам одного терминала.
+    """
+
+    def __init__(self, ttl: float = 0.0, terminal_ttl: float = 0.0, max_size: int = 10000,
+                 terminal_states: Iterable[str] = TERMINAL_ORDER_STATES):
+        """
+        :param ttl: время жизни ответа для заказа в промежуточном состоянии (CREATED), секунды; 0 - без кэша
+        :param terminal_ttl: время жизни ответа для заказа в конечном состоянии (PAID, REVOKED...), секунды
+        :param max_size: максимальное количество заказов в кэше
+        :param terminal_states: конечные состояния заказа
+        """
+        self.ttl = ttl
+        self.terminal_ttl = terminal_ttl
+        self.max_size = max_size
+        self.terminal_states = frozenset(terminal_states)
+        # hits - ответы из кэша, misses - запросы к API, coalesced - ожидания уже выполняющегося запроса
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        # order_id -> (partner_order_number, response, expires_at)
+        self._entries: 'OrderedDict[str, Tuple[str, StatusResponse, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        # поколение ответов заказа: invalidate увеличивает его, ответ запроса, начатого в предыдущем поколении,
+        # не кэшируется, и новые вызовы не ждут такой запрос. Поколение заказа хранится, пока есть запросы
+        self._epoch = 0
+        self._generations: Dict[str, int] = {}
+        self._inflight: Dict[str, int] = {}
+        self._pending: Dict[Tuple[str, str], Tuple[asyncio.Future, Generation]] = {}
+        self._pending_sync: Dict[Tuple[str, str], Tuple[Future, Generation]] = {}
+
+    def get(self, order_id: str, partner_order_number: str) -> Optional[StatusResponse]:
+        """
+        Ответ из кэша, если он не истек
+        """
+        with self._lock:
+            item = self._entries.get(order_id)
+            if item is None or item[0] != partner_order_number:
+                return None
+            if item[2] <= time.monotonic():
+                del self._entries[order_id]
+                return None
+            self._entries.move_to_end(order_id)
+            self.hits += 1
+            return item[1]
+
+    def put(self, order_id: str, partner_order_number: str, response: StatusResponse):
+        with self._lock:
+            self._put(order_id, partner_order_number, response)
+
+    def _put(self, order_id: str, partner_order_number: str, response: StatusResponse):
+        if not isinstance(response, dict):
+            return
+        state = response.get('orderState') or response.get('order_state')
+        if not state:
+            # ошибка (заказ не найден и т.п.) не кэшируется
+            return
+        ttl = self.terminal_ttl if state in self.terminal_states else self.ttl
+        if ttl <= 0:
+            return
+        self._entries[order_id] = (partner_order_number, response, time.monotonic() + ttl)
+        self._entries.move_to_end(order_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, order_id: Optional[str] = None):
+        """
+        Сбрасывает ответ заказа (None - все ответы). Ответы запросов, выполняющихся в момент вызова,
+        не кэшируются
+        """
+        with self._lock:
+            if order_id is None:
+                self._entries.clear()
+                self._epoch += 1
+            else:
+                self._entries.pop(order_id, None)
+                if order_id in self._inflight:
+                    self._generations[order_id] = self._generations.get(order_id, 0) + 1
+
+    def _generation(self, order_id: str) -> Generation:
+        return self._epoch, self._generations.get(order_id, 0)
+
+    def _begin(self, order_id: str) -> Generation:
+        self._inflight[order_id] = self._inflight.get(order_id, 0) + 1
+        return self._generation(order_id)
+
+    def _finish(self, key: Tuple[str, str], generation: Generation, response: Optional[StatusResponse],
+                pending: Dict[Tuple[str, str], Tuple[Any, Generation]]):
+        order_id = key[0]
+        with self._lock:
+            if response is not None and generation == self._generation(order_id):
+                self._put(*key, response)
+            item = pending.get(key)
+            if item is not None and item[1] == generation:
+                del pending[key]
+            self._inflight[order_id] -= 1
+            if not self._inflight[order_id]:
+                del self._inflight[order_id]
+                self._generations.pop(order_id, None)
+
+    async def fetch(self, order_id: str, partner_order_number: str,
+                    factory: Callable[[], Awaitable[StatusResponse]]) -> StatusResponse:
+        """
+        Ответ из кэша или результат factory; одновременные вызовы для одного заказа ждут один вызов factory
+        """
+        response = self.get(order_id, partner_order_number)
+        if response is not None:
+            return response
+
+        key = (order_id, partner_order_number)
+        future = None
+        with self._lock:
+            item = self._pending.get(key)
+            if item is not None and item[1] == self._generation(order_id) and not item[0].done():
+                future = item[0]
+                self.coalesced += 1
+            else:
+                generation = self._begin(order_id)
+                self.misses += 1
+        if future is None:
+            future = asyncio.ensure_future(self._fetch(key, generation, factory))
+            if not future.done():
+                self._pending[key] = (future, generation)
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(future)
+
+    async def _fetch(self, key: Tuple[str, str], generation: Generation,
+                     factory: Callable[[], Awaitable[StatusResponse]]):
+        response = None
+        try:
+            response = await factory()
+            return response
+        finally:
+            self._finish(key, generation, response, self._pending)
+
+    def fetch_sync(self, order_id: str, partner_order_number: str,
+                   factory: Callable[[], StatusResponse]) -> StatusResponse:
+        """
+        Потокобезопасный вариант fetch для SberQR
+        """
+        response = self.get(order_id, partner_order_number)
+        if response is not None:
+            return response
+
+        key = (order_id, partner_order_number)
+        with self._lock:
+            item = self._pending_sync.get(key)
+            owner = item is None or item[1] != self._generation(order_id)
+            if owner:
+                generation = self._begin(order_id)
+                future = Future()
+                self._pending_sync[key] = (future, generation)
+                self.misses += 1
+            else:
+                future = item[0]
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            response = factory()
+        except BaseException as e:
+            self._finish(key, generation, None, self._pending_sync)
+            future.set_exception(e)
+            raise
+        self._finish(key, generation, response, self._pending_sync)
+        future.set_result(response)
+        return response
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        """
+        Доля вызовов status без запроса к API
+        """
+        total = self.hits + self.misses + self.coalesced
+        return (self.hits + self.coalesced) / total if total else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced, 'hit_rate': self.hit_rate,
+                'size': len(self._entries)}
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+from logging import getLogger
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from .scope import Scope
+
+logger = getLogger(__name__)
+
+TokenFactory = Callable[[], Tuple[str, float]]
+AsyncTokenFactory = Callable[[], Awaitable[Tuple[str, float]]]
+
+
+class TokenCache:
+    """
+    Кэш токенов в памяти процесса, один токен на Scope
+
+    Токен считается устаревшим за ``refresh_margin`` секунд (но не более половины срока жизни)
+    до истечения ``expires_in``, поэтому он обновляется раньше, чем банк начнет его отклонять.
+    Одновременные промахи по одной области объединяются в один запрос токена
+    """
+
+    def __init__(self, refresh_margin: float = 60):
+        """
+        :param refresh_margin: за сколько секунд до истечения токен обновляется
+        """
+        self.refresh_margin = refresh_margin
+        # область -> (токен, время истечения, время обновления)
+        self._tokens: Dict[Scope, Tuple[str, float, float]] = {}
+        self._pending: Dict[Scope, asyncio.Future] = {}
+        self._locks: Dict[Scope, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, scope: Scope) -> Optional[str]:
+        """
+        Возвращает токен, если он не истек и не требует обновления
+        :param scope: Область токена
+        :return: токен или None
+        """
+        item = self._tokens.get(scope)
+        if item is None:
+            return None
+        token, _, refresh_at = item
+        if time.monotonic() >= refresh_at:
+            return None
+        return token
+
+    def set(self, scope: Scope, token: str, expires_in: float):
+        expires_in = float(expires_in)
+        now = time.monotonic()
+        # короткоживущие токены обновляются не позже половины срока жизни
+        margin = min(self.refresh_margin, expires_in / 2)
+        self._tokens[scope] = (token, now + expires_in, now + expires_in - margin)
+
+    def ttl(self, scope: Scope) -> float:
+        """
+        Секунд до истечения токена области `scope` (0, если токена нет)
+        """
+        item = self._tokens.get(scope)
+        if item is None:
+            return 0.0
+        return max(0.0, item[1] - time.monotonic())
+
+    def refresh_in(self, scope: Scope) -> float:
+        """
+        Секунд до обновления токена области `scope` (0, если токена нет)
+        """
+        item = self._tokens.get(scope)
+        if item is None:
+            return 0.0
+        return max(0.0, item[2] - time.monotonic())
+
+    def invalidate(self, scope: Optional[Scope] = None):
+        if scope is None:
+            self._tokens.clear()
+        else:
+            self._tokens.pop(scope, None)
+
+    async def fetch(self, scope: Scope, factory: AsyncTokenFactory) -> str:
+        """
+        Возвращает токен из кэша или получает новый через `factory`.
+        Для одной области одновременно выполняется не более одного вызова `factory`
+
+        :param scope: Область токена
+        :param factory: корутинная функция, возвращающая ``(token, expires_in)``
+        """
+        token = self.get(scope)
+        if token is not None:
+            return token
+
+        future = self._pending.get(scope)
+        if future is None or future.done():
+            future = asyncio.ensure_future(self._fetch(scope, factory))
+            self._pending[scope] = future
+        # shield: отмена одного ожидающего не должна отменять общий для всех запрос токена
+        return await asyncio.shield(future)
+
+    async def _fetch(self, scope: Scope, factory: AsyncTokenFactory) -> str:
+        try:
+            token, expires_in = await factory()
+            self.set(scope, token, expires_in)
+            return token
+        finally:
+            self._pending.pop(scope, None)
+
+    def fetch_sync(self, scope: Scope, factory: TokenFactory) -> str:
+        """
+        Потокобезопасный аналог :meth:`fetch` для синхронного клиента
+        """
+        token = self.get(scope)
+        if token is not None:
+            return token
+
+        with self._lock:
+            lock = self._locks.setdefault(scope, threading.Lock())
+        with lock:
+            # пока ждали блокировку, токен мог обновить другой поток
+            token = self.get(scope)
+            if token is not None:
+                return token
+            token, expires_in = factory()
+            self.set(scope, token, expires_in)
+            return token
@@ -0,0 +1,261 @@
+"""
+Транспорты запросов к API.
+
+Запрос строится и ответ разбирается без ввода-вывода (api.prepare_request, api.parse_response), транспорт только
+отправляет bytes и возвращает RawResponse. По умолчанию AsyncSberQR работает через aiohttp, SberQR - через requests;
+HTTPXTransport и HTTPXSyncTransport используют HTTP/2: все одновременные запросы клиента мультиплексируются
+в нескольких соединениях, TLS рукопожатие с клиентским сертификатом выполняется один раз на соединение.
+
+    pip install SberQR[http2]
+"""
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, Dict, NamedTuple, Optional
+
+from .api import DEFAULT_CONNECT_TIMEOUT, DEFAULT_TOTAL_TIMEOUT, PreparedRequest, parse_content_type, \
+    parse_response, prepare_request
+from .codec import JSONCodec
+from .exceptions import NetworkError, RequestTimeoutError
+
+if TYPE_CHECKING:
+    import ssl
+
+    import httpx
+
+
+class RawResponse(NamedTuple):
+    status_code: int
+    # без параметров: 'application/json'
+    content_type: str
+    body: bytes
+
+
+class TimeoutBounds(NamedTuple):
+    # секунды на установку соединения
+    connect: float
+    # секунды на каждую операцию чтения/записи
+    read: float
+    # секунды на весь запрос, None - без ограничения
+    total: Optional[float]
+
+
+def timeout_bounds(timeout: Any, deadline: Optional[float] = None) -> TimeoutBounds:
+    """
+    Приводит timeout клиента к TimeoutBounds и ограничивает его оставшимся до deadline временем.
+    Значения timeout означают то же, что и без транспорта: число - секунды на весь запрос,
+    пара (connect, read) - таймауты соединения и чтения без ограничения общего времени (как в requests)
+
+    :param timeout: None, секунды, пара (connect, read) или объект с атрибутами total/connect (aiohttp.ClientTimeout)
+    :raises RequestTimeoutError: если deadline уже наступил
+    """
+    if timeout is None:
+        connect, read, total = DEFAULT_CONNECT_TIMEOUT, DEFAULT_TOTAL_TIMEOUT, DEFAULT_TOTAL_TIMEOUT
+    elif isinstance(timeout, (int, float)):
+        connect, read, total = DEFAULT_CONNECT_TIMEOUT, timeout, timeout
+    elif isinstance(timeout, tuple):
+        (connect, read), total = timeout, None
+    else:
+        connect = getattr(timeout, 'connect', None) or DEFAULT_CONNECT_TIMEOUT
+        total = getattr(timeout, 'total', None)
+        read = getattr(timeout, 'sock_read', None) or total or DEFAULT_TOTAL_TIMEOUT
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise RequestTimeoutError('Request deadline exceeded')
+        connect, read = min(connect, remaining), min(read, remaining)
+        total = remaining if total is None else min(total, remaining)
+    if total is not None:
+        connect, read = min(connect, total), min(read, total)
+    return TimeoutBounds(connect, read, total)
+
+
+class AsyncTransport:
+    """
+    Транспорт AsyncSberQR. Экземпляр можно передать нескольким клиентам с одним сертификатом,
+    тогда они используют общие соединения; закрывает его создавший
+    """
+
+    async def send(self, request: PreparedRequest, timeout: TimeoutBounds) -> RawResponse:
+        """
+        :param timeout: таймауты соединения и чтения; total, если задан, ограничивает весь запрос
+        :raises RequestTimeoutError: по таймауту
+        :raises NetworkError: при ошибке соединения
+        """
+        raise NotImplementedError
+
+    async def open_connection(self, url: str, timeout: TimeoutBounds):
+        """
+        Открывает соединение заранее (warmup)
+        """
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+
+class SyncTransport:
+    """
+    Транспорт SberQR, должен быть потокобезопасным
+    """
+
+    def send(self, request: PreparedRequest, timeout: TimeoutBounds) -> RawResponse:
+        """
+        Параметры и исключения как у AsyncTransport.send
+        """
+        raise NotImplementedError
+
+    def open_connection(self, url: str, timeout: TimeoutBounds):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+async def send_request(transport: AsyncTransport, method: str, headers: Dict[str, str], data, codec: JSONCodec,
+                       timeout=None, deadline: Optional[float] = None, base_url: Optional[str] = None):
+    """
+    make_request через транспорт
+    """
+    bounds = timeout_bounds(timeout, deadline)
+    response = await transport.send(prepare_request(method, headers, data, codec, base_url), bounds)
+    return parse_response(method, response.content_type, response.status_code, response.body, codec)
+
+
+def send_request_sync(transport: SyncTransport, method: str, headers: Dict[str, str], data, codec: JSONCodec,
+                      timeout=None, deadline: Optional[float] = None, base_url: Optional[str] = None):
+    bounds = timeout_bounds(timeout, deadline)
+    response = transport.send(prepare_request(method, headers, data, codec, base_url), bounds)
+    return parse_response(method, response.content_type, response.status_code, response.body, codec)
+
+
+def _import_httpx():
+    try:
+        import httpx
+    except ImportError as e:
+        raise ImportError('HTTPXTransport requires httpx: pip install SberQR[http2]') from e
+    return httpx
+
+
+def _httpx_options(ssl_context: Optional['ssl.SSLContext'], http2: bool, max_connections: Optional[int],
+                   max_keepalive_connections: Optional[int], keepalive_expiry: float,
+                   prior_knowledge: bool) -> Dict[str, Any]:
+    httpx = _import_httpx()
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError as e:
+            raise ImportError('HTTP/2 requires h2: pip install SberQR[http2]') from e
+    return dict(verify=ssl_context if ssl_context is not None else True, http2=http2,
+                # без TLS (симулятор) HTTP/2 возможен только с prior knowledge: соединение сразу начинается с HTTP/2
+                http1=not (http2 and prior_knowledge),
+                limits=httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_keepalive_connections,
+                                    keepalive_expiry=keepalive_expiry),
+                trust_env=False)
+
+
+def _httpx_timeout(httpx, timeout: TimeoutBounds) -> 'httpx.Timeout':
+    # read ограничивает каждую фазу (чтение, запись, ожидание соединения из пула), время всего запроса httpx
+    # не ограничивает
+    return httpx.Timeout(timeout.read, connect=timeout.connect)
+
+
+def _raw_response(response: 'httpx.Response') -> RawResponse:
+    return RawResponse(response.status_code, parse_content_type(response.headers.get('content-type')),
+                       response.content)
+
+
+class HTTPXTransport(AsyncTransport):
+    """
+    Транспорт на httpx.AsyncClient с HTTP/2. Одно соединение обслуживает множество одновременных запросов,
+    поэтому max_connections может быть намного меньше количества одновременных вызовов
+    """
+
+    def __init__(self, ssl_context: Optional['ssl.SSLContext'] = None, http2: bool = True,
+                 max_connections: Optional[int] = 10, max_keepalive_connections: Optional[int] = None,
+                 keepalive_expiry: float = 60, prior_knowledge: bool = False):
+        """
+        :param ssl_context: SSL контекст с клиентским сертификатом (create_ssl_context), None - проверка по certifi
+        :param http2: использовать HTTP/2, если сервер его поддерживает (ALPN)
+        :param max_connections: максимальное количество соединений, None - без ограничения
+        :param max_keepalive_connections: сколько соединений держать открытыми, по умолчанию max_connections
+        :param keepalive_expiry: через сколько секунд закрывается неиспользуемое соединение
+        :param prior_knowledge: HTTP/2 без TLS (h2c), например для SberQRSimulator(http2=True)
+        """
+        self._httpx = httpx = _import_httpx()
+        self._client = httpx.AsyncClient(**_httpx_options(ssl_context, http2, max_connections,
+                                                          max_keepalive_connections, keepalive_expiry,
+                                                          prior_knowledge))
+
+    async def send(self, request: PreparedRequest, timeout: TimeoutBounds) -> RawResponse:
+        httpx = self._httpx
+        post = self._client.post(request.url, headers=request.headers, content=request.body,
+                                 timeout=_httpx_timeout(httpx, timeout))
+        try:
+            response = await (post if timeout.total is None else asyncio.wait_for(post, timeout.total))
+        except (httpx.TimeoutException, asyncio.TimeoutError) as e:
+            raise RequestTimeoutError(f'Request to {request.url} timed out') from e
+        except httpx.HTTPError as e:
+            raise NetworkError(f'Request to {request.url} failed: {e!r}') from e
+        return _raw_response(response)
+
+    async def open_connection(self, url: str, timeout: TimeoutBounds):
+        httpx = self._httpx
+        try:
+            await self._client.head(url, timeout=_httpx_timeout(httpx, timeout))
+        except httpx.HTTPError as e:
+            raise NetworkError(f'Unable to open connection to {url}: {e!r}') from e
+
+    async def close(self):
+        await self._client.aclose()
+
+
+class HTTPXSyncTransport(SyncTransport):
+    """
+    Транспорт на httpx.Client с HTTP/2 для SberQR: потоки клиента используют общие соединения.
+    Синхронный httpx не позволяет прервать запрос по истечении total: ограничены только соединение
+    и каждая операция чтения (TimeoutBounds.read), поэтому медленный ответ может занять больше total
+    """
+
+    def __init__(self, ssl_context: Optional['ssl.SSLContext'] = None, http2: bool = True,
+                 max_connections: Optional[int] = 10, max_keepalive_connections: Optional[int] = None,
+                 keepalive_expiry: float = 60, prior_knowledge: bool = False):
+        """
+        Параметры как у HTTPXTransport
+        """
+        self._httpx = httpx = _import_httpx()
+        self._client = httpx.Client(**_httpx_options(ssl_context, http2, max_connections,
+                                                     max_keepalive_connections, keepalive_expiry,
+                                                     prior_knowledge))
+
+    def send(self, request: PreparedRequest, timeout: TimeoutBounds) -> RawResponse:
+        httpx = self._httpx
+        try:
+            response = self._client.post(request.url, headers=request.headers, content=request.body,
+                                         timeout=_httpx_timeout(httpx, timeout))
+        except httpx.TimeoutException as e:
+            raise RequestTimeoutError(f'Request to {request.url} timed out') from e
+        except httpx.HTTPError as e:
+            raise NetworkError(f'Request to {request.url} failed: {e!r}') from e
+        return _raw_response(response)
+
+    def open_connection(self, url: str, timeout: TimeoutBounds):
+        httpx = self._httpx
+        try:
+            self._client.head(url, timeout=_httpx_timeout(httpx, timeout))
+        except httpx.HTTPError as e:
+            raise NetworkError(f'Unable to open connection to {url}: {e!r}') from e
+
+    def close(self):
+        self._client.close()
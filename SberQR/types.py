@@ -9,3 +9,30 @@ class CancelType(Enum):
 class RegistryType(Enum):
     REGISTRY = 'REGISTRY'
     QUANTITY = 'QUANTITY'
+
+
+class OrderState(Enum):
+    CREATED = 'CREATED'
+    PAID = 'PAID'
+    REVOKED = 'REVOKED'
+    REVERSED = 'REVERSED'
+    REFUNDED = 'REFUNDED'
+    DECLINED = 'DECLINED'
+    EXPIRED = 'EXPIRED'
+
+
+# Состояния заказа, после которых статус больше не меняется без действий со стороны партнера
+TERMINAL_ORDER_STATES = frozenset(state.value for state in (
+    OrderState.PAID, OrderState.REVOKED, OrderState.REVERSED,
+    OrderState.REFUNDED, OrderState.DECLINED, OrderState.EXPIRED
+))
+
+
+class OperationType(Enum):
+    PAY = 'PAY'
+    REFUND = 'REFUND'
+    REVERSE = 'REVERSE'
+
+
+# responseCode успешной операции в реестре; операции с другим кодом (отклоненные) не меняют суммы заказа
+SUCCESS_RESPONSE_CODE = '00'
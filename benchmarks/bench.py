@@ -0,0 +1,456 @@
+"""
+Бенчмарки накладных расходов AsyncSberQR и SberQR.
+
+Клиенты работают с локальным SberQRSimulator без задержек, поэтому измеряется стоимость самой библиотеки:
+получение токена из кэша, построение тела запроса, кодирование JSON, отправка запроса и разбор ответа.
+
+    python benchmarks/bench.py --output benchmarks/results/current.json
+    python benchmarks/bench.py --compare benchmarks/results/baseline.json --threshold 0.15
+    python benchmarks/bench.py --import-only --import-budget 50
+    python benchmarks/bench.py --transports --methods creation status --concurrency 10 100 500
+    python benchmarks/bench.py --import-only --export --export-rows 500000
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import SberQR  # noqa: E402
+from SberQR import AsyncSberQR, SberQR as SyncSberQR  # noqa: E402
+from SberQR.models import CreationRequest, Position, RegistryOperation, StatusResult  # noqa: E402
+from SberQR.retry import NO_RETRY  # noqa: E402
+from SberQR.scope import Scope  # noqa: E402
+from SberQR.simulator import SberQRSimulator  # noqa: E402
+from SberQR.transport import HTTPXTransport  # noqa: E402
+from SberQR.types import SUCCESS_RESPONSE_CODE, CancelType, OperationType  # noqa: E402
+
+METHODS = ('creation', 'status', 'revoke', 'cancel', 'registry')
+# сценарий импорта -> (код, модули, которые не должны загружаться)
+IMPORTS = {
+    'package': ('import SberQR', ('aiohttp', 'requests', 'urllib3', 'redis', 'qrcode', 'httpx')),
+    'async': ('from SberQR import AsyncSberQR', ('requests', 'urllib3', 'redis', 'qrcode', 'httpx')),
+    'sync': ('from SberQR import SberQR', ('aiohttp', 'redis', 'qrcode', 'httpx')),
+}
+_IMPORT_PROBE = """
+import sys, time
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+print(elapsed * 1000, ','.join(name for name in {forbidden!r} if name in sys.modules))
+"""
+POSITION = Position('Товар', 1, 100, 'Описание товара')
+CREDENTIALS = ('00000105', '1000301234', '24601234', 'client', 'secret', None, None, None, None)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    last = len(samples) - 1
+    return {f'p{q}': samples[round(last * q / 100)] * 1000 for q in (50, 90, 99)}
+
+
+def micro(name: str, func: Callable[[], Any], number: int) -> float:
+    """
+    Среднее время вызова func, наносекунды
+    """
+    func()
+    started = time.perf_counter_ns()
+    for _ in range(number):
+        func()
+    result = (time.perf_counter_ns() - started) / number
+    print(f'  {name:<32} {result:>10.0f} ns/op')
+    return result
+
+
+class SimulatorThread:
+    """
+    Симулятор в отдельном потоке со своим циклом событий, чтобы он не конкурировал с клиентом за цикл
+    """
+
+    def __init__(self, http2: bool = False):
+        self.simulator = SberQRSimulator(http2=http2)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def __enter__(self) -> 'SimulatorThread':
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.simulator.start(), self.loop).result()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        asyncio.run_coroutine_threadsafe(self.simulator.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+    def call(self, func: Callable, *args):
+        # состояние симулятора меняется только в его потоке
+        async def run():
+            return func(*args)
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result()
+
+
+def seed_orders(simulator: SimulatorThread, count: int, paid: bool) -> List[Dict[str, Any]]:
+    orders = []
+    for i in range(count):
+        order = simulator.call(simulator.simulator.creation,
+                               {'order_number': f'seed-{i}', 'id_qr': CREDENTIALS[1], 'order_sum': 100})
+        operation = simulator.call(simulator.simulator.pay, order['orderId']) if paid else None
+        orders.append({'order': order, 'operation': operation})
+    return orders
+
+
+def calls(method: str, simulator: SimulatorThread, count: int) -> Callable[[Any, int], Any]:
+    """
+    Функция (client, i) -> вызов метода для i-го запроса
+    """
+    if method == 'creation':
+        return lambda client, i: client.creation('Оплата заказа', 100, str(i), [POSITION])
+    if method == 'status':
+        # разные заказы: одновременные запросы статуса одного заказа объединяются в один
+        orders = seed_orders(simulator, count, paid=True)
+        return lambda client, i: client.status(orders[i]['order']['orderId'], f'seed-{i}')
+    if method == 'revoke':
+        orders = seed_orders(simulator, count, paid=False)
+        return lambda client, i: client.revoke(orders[i]['order']['orderId'])
+    if method == 'cancel':
+        orders = seed_orders(simulator, count, paid=True)
+        return lambda client, i: client.cancel(orders[i]['order']['orderId'], orders[i]['operation']['operationId'],
+                                               100, orders[i]['operation']['authCode'], CancelType.REVERSE)
+    if method == 'registry':
+        start = datetime.utcnow() - timedelta(hours=1)
+        return lambda client, i: client.registry(start, start + timedelta(hours=2))
+    raise ValueError(method)
+
+
+def summary(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    return {'throughput': len(latencies) / elapsed, **percentiles(latencies)}
+
+
+async def run_async(client: AsyncSberQR, call: Callable[[Any, int], Awaitable], count: int,
+                    concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    indexes = iter(range(count))
+
+    async def worker():
+        for i in indexes:
+            started = time.perf_counter()
+            await call(client, i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summary(latencies, time.perf_counter() - started)
+
+
+def run_sync(client: SyncSberQR, call: Callable[[Any, int], Any], count: int, threads: int) -> Dict[str, float]:
+    latencies: List[float] = []
+
+    def timed(i: int):
+        started = time.perf_counter()
+        call(client, i)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(timed, range(count)))
+    return summary(latencies, time.perf_counter() - started)
+
+
+def print_result(key: str, result: Dict[str, float]):
+    connections = f'  {result["connections"]} conn' if 'connections' in result else ''
+    print(f'  {key:<32} {result["throughput"]:>8.0f} rps  p50 {result["p50"]:6.2f} ms  '
+          f'p90 {result["p90"]:6.2f} ms  p99 {result["p99"]:6.2f} ms{connections}')
+
+
+def drive(coroutine):
+    """
+    Выполняет корутину, которая завершается без ожидания, без накладных расходов цикла событий
+    """
+    try:
+        coroutine.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError('Coroutine suspended')
+
+
+async def bench_micro(number: int) -> Dict[str, float]:
+    print('micro')
+    client = AsyncSberQR(*CREDENTIALS)
+    client._tokens.set(Scope.status, 'token', 1800)
+    await client.get_session()
+    codec = client.codec
+    request = CreationRequest('0' * 32, '2024-01-01T00:00:00Z', '00000105', '1', '2024-01-01T00:00:00Z',
+                              [POSITION], '1000301234', 100, '643', 'Оплата заказа')
+    payload = request.to_payload()
+    encoded = codec.dumps(payload)
+    headers = {'Authorization': 'Bearer token', 'RqUID': '0' * 32}
+    status = {'rqUid': '0' * 32, 'rqTm': '2024-01-01T00:00:00Z', 'orderId': '0' * 32, 'orderState': 'PAID',
+              'orderOperationParams': [{'operationId': '0' * 32, 'operationDateTime': '2024-01-01T00:00:00Z',
+                                        'rrn': '000000000000', 'operationType': 'PAY', 'operationSum': 100,
+                                        'operationCurrency': '643', 'authCode': '123456', 'responseCode': '00'}],
+              'errorCode': '000000', 'errorDescription': ''}
+
+    results = {
+        'token_cache_hit': micro('token (cache hit)', lambda: drive(client.token(Scope.status)), number),
+        'creation_payload_model': micro('CreationRequest.to_payload', request.to_payload, number),
+        'status_result_parse': micro('StatusResult.from_response', lambda: StatusResult.from_response(status),
+                                     number),
+        'headers_merge': micro('request headers merge', lambda: {**headers, **{
+            'Accept': 'application/json', 'x-ibm-client-id': client._client_id}}, number),
+        'json_dumps': micro(f'json dumps ({codec.name})', lambda: codec.dumps(payload), number),
+        'json_loads': micro(f'json loads ({codec.name})', lambda: codec.loads(encoded), number),
+        'get_session': micro('get_session', lambda: drive(client.get_session()), number),
+    }
+    await client.close()
+    return results
+
+
+def bench_import(runs: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Время импорта в новом интерпретаторе (медиана runs запусков, мс) и лишние загруженные библиотеки
+    """
+    print('import')
+    results = {}
+    for name, (code, forbidden) in IMPORTS.items():
+        samples, loaded = [], ''
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', _IMPORT_PROBE.format(code=code, forbidden=forbidden)],
+                                    cwd=str(ROOT), check=True, capture_output=True, text=True).stdout.split()
+            samples.append(float(output[0]))
+            loaded = output[1] if len(output) > 1 else ''
+        results[name] = {'ms': statistics.median(samples), 'loaded': loaded.split(',') if loaded else []}
+        extra = f'  loads {loaded}' if loaded else ''
+        print(f'  {code:<32} {results[name]["ms"]:>8.1f} ms{extra}')
+    return results
+
+
+def bench_calls(args, simulator: SimulatorThread) -> Dict[str, Dict[str, float]]:
+    results = {}
+    base_url = simulator.simulator.base_url
+    methods = args.methods
+
+    async def async_calls():
+        for concurrency in args.concurrency:
+            client = AsyncSberQR(*CREDENTIALS, base_url=base_url, retry=NO_RETRY,
+                                 connections_limit=max(concurrency, 10))
+            await client.warmup(refresh=False)
+            for method in methods:
+                count = args.requests // 10 if method == 'registry' else args.requests
+                key = f'async/{method}/{concurrency}'
+                results[key] = await run_async(client, calls(method, simulator, count), count, concurrency)
+                print_result(key, results[key])
+            await client.close()
+
+    print('async')
+    asyncio.run(async_calls())
+
+    print('sync')
+    for threads in args.threads:
+        client = SyncSberQR(*CREDENTIALS, base_url=base_url, retry=NO_RETRY, pool_maxsize=max(threads, 10))
+        client.warmup(refresh=False)
+        for method in methods:
+            count = args.requests // 10 if method == 'registry' else args.requests
+            key = f'sync/{method}/{threads}'
+            results[key] = run_sync(client, calls(method, simulator, count), count, threads)
+            print_result(key, results[key])
+        client.close()
+    return results
+
+
+def bench_transports(args) -> Dict[str, Dict[str, float]]:
+    """
+    AsyncSberQR через aiohttp (HTTP/1.1, соединение на каждый одновременный запрос) и через httpx с HTTP/2
+    (мультиплексирование в args.h2_connections соединениях) на локальном симуляторе с HTTP/2 (hypercorn, h2c).
+    connections - количество соединений, открытых клиентом
+    """
+    results = {}
+    transports = {
+        'aiohttp': lambda concurrency: None,
+        'httpx-h2': lambda concurrency: HTTPXTransport(prior_knowledge=True, max_connections=args.h2_connections),
+    }
+
+    async def transport_calls(simulator: SimulatorThread, name: str):
+        for concurrency in args.concurrency:
+            transport = transports[name](concurrency)
+            client = AsyncSberQR(*CREDENTIALS, base_url=simulator.simulator.base_url, retry=NO_RETRY,
+                                 connections_limit=max(concurrency, 10), transport=transport)
+            await client.warmup(refresh=False)
+            for method in args.methods:
+                count = args.requests // 10 if method == 'registry' else args.requests
+                key = f'transport/{name}/{method}/{concurrency}'
+                call = calls(method, simulator, count)
+                peers = simulator.simulator.peers
+                simulator.call(peers.clear)
+                results[key] = await run_async(client, call, count, concurrency)
+                results[key]['connections'] = simulator.call(len, peers)
+                print_result(key, results[key])
+            await client.close()
+            if transport is not None:
+                await transport.close()
+
+    print('transports')
+    for name in transports:
+        with SimulatorThread(http2=True) as simulator:
+            asyncio.run(transport_calls(simulator, name))
+    return results
+
+
+def registry_operations(rows: int) -> List[RegistryOperation]:
+    """
+    Операции реестра 20 терминалов: оплаты, возвраты и отклоненные операции
+    """
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    types = (OperationType.PAY.value, OperationType.PAY.value, OperationType.REFUND.value,
+             OperationType.REVERSE.value)
+    return [RegistryOperation(f'{i % 20:010d}', f'order-{i}', str(i), 'PAID', f'operation-{i}', types[i % 4],
+                              start + timedelta(seconds=i), 100 + i % 1000, '643', f'{i % 1000000:06d}',
+                              f'{i:012d}', SUCCESS_RESPONSE_CODE if i % 7 else '05')
+            for i in range(rows)]
+
+
+def timed_ms(name: str, func: Callable[[], Any]) -> float:
+    started = time.perf_counter()
+    func()
+    result = (time.perf_counter() - started) * 1000
+    print(f'  {name:<32} {result:>10.1f} ms')
+    return result
+
+
+def bench_export(rows: int) -> Dict[str, float]:
+    """
+    Итоги по терминалам для rows операций: цикл Python по RegistryOperation, SberQR.export по операциям,
+    по массиву NumPy и по колонкам ReconciliationStore, а также to_numpy и чтение колонок из SQLite
+    """
+    from SberQR import export
+    from SberQR.reconcile import ReconciliationStore
+
+    print(f'export ({rows} operations)')
+    operations = registry_operations(rows)
+    # импорт numpy не входит в измерения
+    export.totals_by_terminal(operations[:1])
+    pay, returns = OperationType.PAY.value, (OperationType.REFUND.value, OperationType.REVERSE.value)
+
+    def loop_totals():
+        totals = defaultdict(lambda: [0, 0])
+        for operation in operations:
+            if operation.response_code != SUCCESS_RESPONSE_CODE:
+                continue
+            if operation.operation_type == pay:
+                totals[operation.id_qr][0] += operation.operation_sum
+            elif operation.operation_type in returns:
+                totals[operation.id_qr][1] += operation.operation_sum
+        return totals
+
+    results = {'loop_totals': timed_ms('dict loop totals', loop_totals),
+               'totals_operations': timed_ms('totals_by_terminal(operations)',
+                                             lambda: export.totals_by_terminal(operations)),
+               'to_numpy': timed_ms('to_numpy(operations)', lambda: export.to_numpy(operations))}
+    array = export.to_numpy(operations)
+    results['totals_array'] = timed_ms('totals_by_terminal(array)', lambda: export.totals_by_terminal(array))
+    with tempfile.TemporaryDirectory() as directory, ReconciliationStore(str(Path(directory, 'bench.db'))) as store:
+        store.ingest(operations)
+        fields = ('id_qr', *export.TOTALS_FIELDS)
+        results['store_columns'] = timed_ms('store.columns()', store.columns)
+        results['totals_store'] = timed_ms('totals_by_terminal(store.columns)',
+                                           lambda: export.totals_by_terminal(store.columns(fields=fields)))
+        columns = store.columns()
+        results['to_numpy_columns'] = timed_ms('to_numpy(store.columns())', lambda: export.to_numpy(columns))
+    return results
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Регрессии: рост времени микробенчмарков и p99, падение пропускной способности больше threshold
+    """
+    regressions = []
+    for name, result in current.get('import', {}).items():
+        before = baseline.get('import', {}).get(name)
+        if result['loaded']:
+            regressions.append(f'import {name}: loads {", ".join(result["loaded"])}')
+        if before and result['ms'] > before['ms'] * (1 + threshold):
+            regressions.append(f'import {name}: {before["ms"]:.1f} -> {result["ms"]:.1f} ms')
+    for name, value in current.get('micro', {}).items():
+        before = baseline.get('micro', {}).get(name)
+        if before and value > before * (1 + threshold):
+            regressions.append(f'{name}: {before:.0f} -> {value:.0f} ns/op')
+    for name, value in current.get('export', {}).items():
+        before = baseline.get('export', {}).get(name)
+        if before and value > before * (1 + threshold):
+            regressions.append(f'export {name}: {before:.1f} -> {value:.1f} ms')
+    for key, result in [*current.get('calls', {}).items(), *current.get('transports', {}).items()]:
+        before = baseline.get('calls', {}).get(key) or baseline.get('transports', {}).get(key)
+        if not before:
+            continue
+        if result['throughput'] < before['throughput'] * (1 - threshold):
+            regressions.append(f'{key}: {before["throughput"]:.0f} -> {result["throughput"]:.0f} rps')
+        if result['p99'] > before['p99'] * (1 + threshold):
+            regressions.append(f'{key}: p99 {before["p99"]:.2f} -> {result["p99"]:.2f} ms')
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='запросов на метод и уровень параллельности')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 100],
+                        help='количество одновременных запросов AsyncSberQR')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8], help='количество потоков SberQR')
+    parser.add_argument('--methods', nargs='+', choices=METHODS, default=list(METHODS))
+    parser.add_argument('--micro', type=int, default=100000, help='итераций микробенчмарков')
+    parser.add_argument('--import-runs', type=int, default=5, help='запусков интерпретатора на сценарий импорта')
+    parser.add_argument('--import-only', action='store_true', help='измерить только время импорта')
+    parser.add_argument('--import-budget', type=float,
+                        help='допустимое время import SberQR, мс; превышение - ненулевой код возврата')
+    parser.add_argument('--transports', action='store_true',
+                        help='сравнить aiohttp и httpx с HTTP/2 (нужны httpx[http2] и hypercorn)')
+    parser.add_argument('--h2-connections', type=int, default=2, help='соединений HTTP/2 в сравнении транспортов')
+    parser.add_argument('--export', action='store_true',
+                        help='измерить выгрузку и итоги реестра SberQR.export (нужен numpy)')
+    parser.add_argument('--export-rows', type=int, default=200000, help='операций реестра в бенчмарке выгрузки')
+    parser.add_argument('--output', type=Path, help='файл JSON для сохранения результатов')
+    parser.add_argument('--compare', type=Path, help='файл JSON с результатами предыдущего запуска')
+    parser.add_argument('--threshold', type=float, default=0.1, help='допустимое ухудшение, доля')
+    args = parser.parse_args(argv)
+
+    results = {'meta': {'version': SberQR.__version__, 'python': platform.python_version(),
+                        'platform': platform.platform(), 'date': datetime.utcnow().isoformat(timespec='seconds'),
+                        'requests': args.requests},
+               'import': bench_import(args.import_runs)}
+    failed = False
+    if args.import_budget is not None and results['import']['package']['ms'] > args.import_budget:
+        print(f'BUDGET import SberQR: {results["import"]["package"]["ms"]:.1f} ms > {args.import_budget:.1f} ms')
+        failed = True
+    if not args.import_only:
+        results['micro'] = asyncio.run(bench_micro(args.micro))
+        with SimulatorThread() as simulator:
+            results['calls'] = bench_calls(args, simulator)
+        if args.transports:
+            results['transports'] = bench_transports(args)
+    if args.export:
+        results['export'] = bench_export(args.export_rows)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
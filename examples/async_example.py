@@ -6,7 +6,6 @@ import logging
 import os
 from typing import List, Dict, Union
 
-import qrcode
 from redis.asyncio import Redis
 
 # import aioredis
@@ -47,8 +46,9 @@ async def main_func(order_sum, order_number, positions: Union[List, Dict]):
         order_number=order_number,
         positions=positions)
     logger.info(f'{data}')
-    # Сохраним QR в файл qr.png
-    qrcode.make(data['order_form_url']).save("qr.png")
+    # Сохраним QR в файл qr.png (рендеринг выполняется вне цикла событий и кэшируется)
+    with open("qr.png", "wb") as file:
+        file.write(await sber_qr.qr(data))
     await check_paid(data['order_id'], order_number)
 
 
@@ -5,8 +5,22 @@ from setuptools import setup
 if sys.version_info < (3, 7):
     raise RuntimeError('Your Python version {0} is not supported, please install '
                        'Python 3.7+'.format('.'.join(map(str, sys.version_info[:3]))))
-requirements = ["aiohttp>=3.8.4", "certifi>=2023.11.17", "ujson>=5.9.0", "pytz>=2022.1", "qrcode[pil]>=7.3.1",
-                "redis>=4.2.0rc1", "urllib3~=2.0.3"]
+requirements = []
+# клиенты и дополнительные возможности устанавливаются отдельно: pip install SberQR[async], SberQR[sync,redis,qr]
+extras = {'async': ['aiohttp>=3.8.4', 'certifi>=2023.11.17'],
+          'sync': ['requests>=2.31.0', 'urllib3>=2.1.0'],
+          'qr': ['qrcode[pil]>=7.3.1'],
+          'redis': ['redis>=4.2.0rc1'],
+          'ujson': ['ujson>=5.9.0'],
+          'http2': ['httpx[http2]>=0.24.0'],
+          # SberQRSimulator(http2=True)
+          'simulator': ['aiohttp>=3.8.4', 'hypercorn>=0.14.0'],
+          'numpy': ['numpy>=1.21.0'],
+          'arrow': ['pyarrow>=10.0.0'],
+          'orjson': ['orjson>=3.8.0'],
+          'prometheus': ['prometheus_client>=0.16.0'],
+          'opentelemetry': ['opentelemetry-api>=1.15.0']}
+extras['all'] = sorted({requirement for requirements in extras.values() for requirement in requirements})
 
 setup(
     name='SberQR',
@@ -19,6 +33,7 @@ setup(
     license="MIT",
     packages=['SberQR'],
     install_requires=requirements,
+    extras_require=extras,
     classifiers=[
         'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
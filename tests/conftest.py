@@ -0,0 +1,19 @@
+import pytest
+
+from SberQR import SberQR
+from SberQR.retry import NO_RETRY
+
+from .helpers import CREDENTIALS, SimulatorThread
+
+
+@pytest.fixture
+def simulator_thread():
+    with SimulatorThread() as simulator:
+        yield simulator
+
+
+@pytest.fixture
+def sync_client(simulator_thread):
+    client = SberQR(*CREDENTIALS, base_url=simulator_thread.base_url, retry=NO_RETRY)
+    yield client
+    client.close()
@@ -0,0 +1,82 @@
+import asyncio
+import functools
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict
+
+from SberQR import AsyncSberQR
+from SberQR.retry import NO_RETRY
+from SberQR.simulator import SberQRSimulator
+
+# member_id, id_qr, tid, client_id, client_secret, сертификаты не нужны: симулятор работает без TLS
+CREDENTIALS = ('00000105', '1000301234', '24601234', 'client', 'secret', None, None, None, None)
+ID_QR = CREDENTIALS[1]
+
+
+def async_test(func: Callable):
+    """
+    Запускает тест-корутину в новом цикле событий
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return asyncio.run(func(*args, **kwargs))
+    return wrapper
+
+
+@asynccontextmanager
+async def simulated(simulator_options: dict = None, **client_options):
+    """
+    SberQRSimulator и подключенный к нему AsyncSberQR без повторов запросов
+    """
+    async with SberQRSimulator(**(simulator_options or {})) as simulator:
+        client = AsyncSberQR(*CREDENTIALS, base_url=simulator.base_url,
+                             **{'retry': NO_RETRY, **client_options})
+        try:
+            yield simulator, client
+        finally:
+            await client.close()
+
+
+class SimulatorThread:
+    """
+    Симулятор в отдельном потоке со своим циклом событий для синхронного клиента
+    """
+
+    def __init__(self, **options):
+        self.simulator = SberQRSimulator(**options)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return self.simulator.base_url
+
+    def __enter__(self) -> 'SimulatorThread':
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.simulator.start(), self.loop).result()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        asyncio.run_coroutine_threadsafe(self.simulator.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    def call(self, func: Callable, *args) -> Any:
+        # состояние симулятора меняется только в его потоке
+        async def run():
+            return func(*args)
+        return asyncio.run_coroutine_threadsafe(run(), self.loop).result()
+
+
+def declined_payment(simulator: SberQRSimulator, order_id: str) -> Dict[str, Any]:
+    """
+    Неуспешная попытка оплаты: симулятор проводит только успешные операции, отказ добавляется в заказ вручную
+    """
+    operation = {'operationId': f'DECLINED-{order_id}',
+                 'operationDateTime': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                 'rrn': '000000000000', 'operationType': 'PAY', 'operationSum': 100, 'operationCurrency': '643',
+                 'authCode': '', 'responseCode': '05', 'responseDesc': 'Отказ'}
+    simulator.orders[order_id].operations.append(operation)
+    return operation
@@ -0,0 +1,127 @@
+import asyncio
+import itertools
+
+from SberQR.api import Methods
+from SberQR.batch import BatchResult, run_batch
+from SberQR.exceptions import SberQrAPIError
+from SberQR.models import Position
+
+from .helpers import async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+
+
+@async_test
+async def test_item_errors_are_returned_not_raised():
+    async with simulated() as (simulator, client):
+        simulator.fail_next(Methods.creation, 400, 3)
+        specs = [('Оплата заказа', 100, f'number-{i}', POSITION) for i in range(20)]
+        results = [result async for result in client.create_many(specs, concurrency=5)]
+
+        assert sorted(result.index for result in results) == list(range(20))
+        assert all(result.spec is specs[result.index] for result in results)
+        failed = [result for result in results if not result.ok]
+        assert len(failed) == 3 and all(isinstance(result.error, SberQrAPIError) for result in failed)
+        assert all(result.result['orderId'] in simulator.orders for result in results if result.ok)
+        # токен получен один раз перед пакетом
+        assert simulator.requests[Methods.oauth] == 1
+
+        # ответ на отмену несуществующего заказа - ответ API с errorCode, а не исключение
+        revoked = [result async for result in client.revoke_many(
+            [result.result['orderId'] for result in results if result.ok] + ['unknown'])]
+        assert all(result.ok for result in revoked)
+        assert simulator.requests[Methods.revocation] == 18
+
+
+@async_test
+async def test_concurrency_bound_and_lazy_specs():
+    running = 0
+    peak = 0
+
+    async def call(value):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if value % 5 == 0:
+            raise ValueError(value)
+        return value * 2
+
+    # бесконечная последовательность: элементы читаются по мере освобождения мест
+    batch = run_batch(call, itertools.count(), concurrency=4)
+    results = []
+    async for result in batch:
+        results.append(result)
+        if len(results) == 20:
+            break
+    await batch.aclose()
+
+    assert peak == 4
+    assert all(result.result == result.spec * 2 for result in results if result.ok)
+    assert all(isinstance(result.error, ValueError) for result in results if result.spec % 5 == 0)
+
+
+@async_test
+async def test_early_break_closes_specs_and_cancels_calls():
+    closed = asyncio.Event()
+    started = []
+
+    async def specs():
+        try:
+            for i in itertools.count():
+                yield i
+        finally:
+            closed.set()
+
+    async def call(value):
+        started.append(value)
+        await asyncio.sleep(0 if value == 0 else 10)
+        return value
+
+    batch = run_batch(call, specs(), concurrency=3)
+    async for result in batch:
+        assert result == BatchResult(0, 0, 0, None)
+        break
+    await batch.aclose()
+
+    assert closed.is_set()
+    # задачи, не завершенные к выходу из пакета, отменены
+    pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    await asyncio.sleep(0)
+    assert all(task.done() for task in pending)
+    assert started[:3] == [0, 1, 2]
+
+
+@async_test
+async def test_cancelled_consumer_closes_specs():
+    closed = asyncio.Event()
+
+    async def specs():
+        try:
+            for i in itertools.count():
+                yield i
+        finally:
+            closed.set()
+
+    async def call(value):
+        await asyncio.sleep(10)
+
+    async def consume():
+        async for _ in run_batch(call, specs()):
+            pass
+
+    task = asyncio.ensure_future(consume())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    assert closed.is_set()
+
+
+@async_test
+async def test_prepare_failure_does_not_stop_batch():
+    async def prepare():
+        raise RuntimeError('token')
+
+    results = [result async for result in run_batch(asyncio.sleep, [0, 0], prepare=prepare)]
+    assert [result.ok for result in results] == [True, True]
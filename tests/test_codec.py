@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from SberQR import SberQR
+from SberQR.api import Methods
+from SberQR.codec import JSONCodec, get_codec
+from SberQR.models import Position
+from SberQR.retry import NO_RETRY
+
+from .helpers import CREDENTIALS, async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+PAYLOAD = {'orderNumber': 'number-1', 'description': 'Оплата заказа №1', 'orderSum': 100,
+           'positions': [{'positionName': 'Товар', 'positionCount': 1, 'positionPrice': None}]}
+
+
+class CountingCodec(JSONCodec):
+    __slots__ = ('encoded', 'decoded')
+
+    def __init__(self):
+        codec = get_codec('json')
+
+        def dumps(obj):
+            self.encoded += 1
+            return codec.dumps(obj)
+
+        def loads(data):
+            self.decoded += 1
+            return codec.loads(data)
+
+        super().__init__('counting', dumps, loads)
+        self.encoded = 0
+        self.decoded = 0
+
+
+@pytest.mark.parametrize('name', ['orjson', 'ujson', 'json'])
+def test_codecs_round_trip_to_bytes(name):
+    pytest.importorskip(name)
+    codec = get_codec(name)
+    data = codec.dumps(PAYLOAD)
+
+    assert isinstance(data, bytes)
+    assert json.loads(data.decode('utf-8')) == PAYLOAD
+    assert codec.loads(data) == PAYLOAD
+    # кириллица не экранируется
+    assert 'Оплата'.encode('utf-8') in data
+
+
+def test_default_codec_is_fastest_installed():
+    expected = 'json'
+    for name in ('ujson', 'orjson'):
+        try:
+            __import__(name)
+            expected = name
+        except ImportError:
+            pass
+    assert get_codec() is get_codec()
+    assert get_codec().name == expected
+    codec = get_codec('json')
+    assert get_codec(codec) is codec
+
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(ValueError):
+        get_codec('simplejson')
+
+
+@async_test
+async def test_async_client_uses_configured_codec():
+    codec = CountingCodec()
+    async with simulated(json_codec=codec) as (simulator, client):
+        response = await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+        assert response['orderNumber'] == 'number-1'
+        await client.status(response['orderId'], 'number-1')
+
+    assert codec.encoded == simulator.requests[Methods.creation] + simulator.requests[Methods.status] == 2
+    assert codec.decoded >= 2
+
+
+def test_sync_client_uses_configured_codec(simulator_thread):
+    codec = CountingCodec()
+    client = SberQR(*CREDENTIALS, base_url=simulator_thread.base_url, retry=NO_RETRY, json_codec=codec)
+    try:
+        response = client.creation('Оплата заказа', 100, 'number-1', POSITION)
+    finally:
+        client.close()
+
+    assert response['orderNumber'] == 'number-1'
+    assert codec.encoded == 1 and codec.decoded >= 1
@@ -0,0 +1,137 @@
+import csv
+import io
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from SberQR.export import (COLUMNS, TOTALS_FIELDS, Totals, quantity, to_arrow, to_columns, to_numpy, totals_by_day,
+                           totals_by_operation_type, totals_by_terminal, write_csv, write_csv_async, write_parquet)
+from SberQR.models import Position, RegistryOperation, RegistryQuantity
+from SberQR.reconcile import ReconciliationStore
+from SberQR.types import CancelType
+
+from .helpers import ID_QR, async_test, declined_payment, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+OTHER_QR = '1000309999'
+MSK = timezone(timedelta(hours=3))
+
+
+def operation(number: int, operation_type: str, operation_sum: int, date_time: datetime = None,
+              id_qr: str = ID_QR, response_code: str = '00') -> RegistryOperation:
+    return RegistryOperation(id_qr, f'order-{number}', f'number-{number}', None, f'operation-{number}',
+                             operation_type, date_time, operation_sum, '643', '123456', '000000000000',
+                             response_code)
+
+
+# 1 января 22:30 UTC - уже 2 января по Москве
+OPERATIONS = [
+    operation(1, 'PAY', 1000, datetime(2024, 1, 1, 10, tzinfo=timezone.utc)),
+    operation(2, 'REFUND', 300, datetime(2024, 1, 1, 22, 30, tzinfo=timezone.utc)),
+    operation(3, 'PAY', 500, datetime(2024, 1, 2, 1, tzinfo=MSK), response_code='05'),
+    operation(4, 'PAY', 700, datetime(2024, 1, 2, 12), id_qr=OTHER_QR),
+    operation(5, 'REVERSE', 700, datetime(2024, 1, 2, 12, 5), id_qr=OTHER_QR),
+    operation(6, 'PAY', 200, None),
+]
+
+
+def sources():
+    numpy = pytest.importorskip('numpy')
+    columns = to_columns(OPERATIONS)
+    array = to_numpy(OPERATIONS)
+    assert isinstance(array, numpy.ndarray) and len(array) == len(OPERATIONS)
+    store = ReconciliationStore()
+    store.ingest(OPERATIONS)
+    try:
+        stored = store.columns()
+    finally:
+        store.close()
+    return {'operations': OPERATIONS, 'columns': columns, 'numpy': array, 'store': stored}
+
+
+def test_totals_exclude_declined_payments():
+    for name, data in sources().items():
+        assert totals_by_terminal(data) == {ID_QR: Totals(3, 1200, 300, 900), OTHER_QR: Totals(2, 700, 700, 0)}, name
+        assert totals_by_terminal(data, successful_only=False)[ID_QR] == Totals(4, 1700, 300, 1400), name
+
+        assert totals_by_operation_type(data) == {'PAY': Totals(3, 1900, 0, 1900), 'REFUND': Totals(1, 0, 300, -300),
+                                                  'REVERSE': Totals(1, 0, 700, -700)}, name
+        assert totals_by_operation_type(data, successful_only=False)['PAY'].count == 4, name
+
+        assert quantity(data) == RegistryQuantity(5, 3, 1, 1), name
+        assert quantity(data, successful_only=False) == RegistryQuantity(6, 4, 1, 1), name
+
+
+def test_totals_by_day_use_utc_offset():
+    for name, data in sources().items():
+        assert totals_by_day(data) == {
+            date(2024, 1, 1): Totals(2, 1000, 300, 700), date(2024, 1, 2): Totals(2, 700, 700, 0),
+            None: Totals(1, 200, 0, 200)}, name
+        # отклоненная оплата 1 января 22:00 UTC учитывается только с successful_only=False
+        assert totals_by_day(data, utc_offset=timedelta(hours=3), successful_only=False) == {
+            date(2024, 1, 1): Totals(1, 1000, 0, 1000), date(2024, 1, 2): Totals(4, 1200, 1000, 200),
+            None: Totals(1, 200, 0, 200)}, name
+
+
+def test_totals_of_store_columns_subset():
+    pytest.importorskip('numpy')
+    with ReconciliationStore() as store:
+        store.ingest(OPERATIONS)
+        assert totals_by_terminal(store.columns(fields=('id_qr', *TOTALS_FIELDS))) == totals_by_terminal(OPERATIONS)
+        assert quantity(store.columns(fields=TOTALS_FIELDS)) == quantity(OPERATIONS)
+
+
+def test_csv_writes_utc_time():
+    file = io.StringIO(newline='')
+    assert write_csv(OPERATIONS, file) == len(OPERATIONS)
+    rows = list(csv.DictReader(io.StringIO(file.getvalue())))
+
+    assert list(rows[0]) == list(COLUMNS)
+    assert [row['operation_date_time'] for row in rows] == [
+        '2024-01-01T10:00:00Z', '2024-01-01T22:30:00Z', '2024-01-01T22:00:00Z', '2024-01-02T12:00:00Z',
+        '2024-01-02T12:05:00Z', '']
+    assert rows[2]['response_code'] == '05'
+
+    # колонки ReconciliationStore со временем в unix time дают тот же файл
+    with ReconciliationStore() as store:
+        store.ingest(OPERATIONS)
+        stored = io.StringIO(newline='')
+        write_csv(store.columns(), stored)
+    assert sorted(stored.getvalue().splitlines()) == sorted(file.getvalue().splitlines())
+
+
+def test_parquet_round_trip(tmp_path):
+    pytest.importorskip('pyarrow')
+    from pyarrow import parquet
+
+    path = str(tmp_path / 'registry.parquet')
+    assert write_parquet(iter(OPERATIONS), path, batch_size=4) == len(OPERATIONS)
+    table = parquet.read_table(path)
+
+    assert table.column_names == list(COLUMNS)
+    assert table.to_pylist() == to_arrow(OPERATIONS).to_pylist()
+    assert table.column('operation_date_time').null_count == 1
+    assert totals_by_terminal(table.to_pydict()) == totals_by_terminal(OPERATIONS)
+
+
+@async_test
+async def test_registry_export_from_simulator():
+    pytest.importorskip('numpy')
+    async with simulated() as (simulator, client):
+        paid = (await client.creation('Оплата заказа', 100, 'number-1', POSITION))['orderId']
+        payment = simulator.pay(paid)
+        await client.cancel(paid, payment['operationId'], 40, payment['authCode'], CancelType.REFUND)
+        declined = (await client.creation('Оплата заказа', 100, 'number-2', POSITION))['orderId']
+        declined_payment(simulator, declined)
+
+        now = datetime.utcnow()
+        file = io.StringIO(newline='')
+        operations = client.registry_operations(now - timedelta(hours=1), now + timedelta(minutes=1))
+        assert await write_csv_async(operations, file) == 3
+
+        operations = [operation async for operation in
+                      client.registry_operations(now - timedelta(hours=1), now + timedelta(minutes=1))]
+
+    assert totals_by_terminal(operations) == {ID_QR: Totals(2, 100, 40, 60)}
+    assert totals_by_terminal(operations, successful_only=False) == {ID_QR: Totals(3, 200, 40, 160)}
+    assert quantity(operations) == RegistryQuantity(2, 1, 1, 0)
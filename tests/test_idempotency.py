@@ -0,0 +1,95 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import fakeredis
+import pytest
+from fakeredis import aioredis
+
+from SberQR import AsyncSberQR, SberQR
+from SberQR.api import Methods
+from SberQR.exceptions import IdempotencyConflict, SberQrAPIError
+from SberQR.idempotency import AsyncIdempotencyCache, IdempotencyCache
+from SberQR.models import Position
+from SberQR.retry import NO_RETRY
+
+from .helpers import CREDENTIALS, ID_QR, async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+
+
+@async_test
+async def test_concurrent_and_repeated_creation_send_one_request():
+    async with simulated(idempotency=AsyncIdempotencyCache()) as (simulator, client):
+        responses = await asyncio.gather(*(client.creation('Оплата заказа', 100, 'number-1', POSITION)
+                                           for _ in range(10)))
+        repeated = await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+
+        assert len({response['orderId'] for response in [*responses, repeated]}) == 1
+        assert simulator.requests[Methods.creation] == 1
+        assert len(simulator.orders) == 1
+
+
+@async_test
+async def test_retry_after_failure_reuses_rq_uid():
+    cache = AsyncIdempotencyCache()
+    async with simulated(idempotency=cache) as (simulator, client):
+        simulator.fail_next(Methods.creation, 503)
+        with pytest.raises(SberQrAPIError):
+            await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+        rq_uid = cache.get(f'{ID_QR}:number-1').rq_uid
+
+        response = await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+        assert response['rqUid'] == rq_uid
+        assert simulator.requests[Methods.creation] == 2 and len(simulator.orders) == 1
+
+
+@async_test
+async def test_same_order_number_with_other_parameters_is_rejected():
+    async with simulated(idempotency=AsyncIdempotencyCache()) as (simulator, client):
+        await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+        with pytest.raises(IdempotencyConflict):
+            await client.creation('Оплата заказа', 200, 'number-1', POSITION)
+        # другой номер заказа с теми же параметрами - новый заказ
+        await client.creation('Оплата заказа', 100, 'number-2', POSITION)
+        assert simulator.requests[Methods.creation] == 2
+
+
+@async_test
+async def test_processes_share_created_orders_through_redis():
+    server = fakeredis.FakeServer()
+
+    def idempotency():
+        return AsyncIdempotencyCache(redis=aioredis.FakeRedis(server=server), wait_interval=0.01)
+
+    async with simulated({'method_latency': {Methods.creation: 0.05}},
+                         idempotency=idempotency()) as (simulator, client):
+        other = AsyncSberQR(*CREDENTIALS, base_url=simulator.base_url, retry=NO_RETRY, idempotency=idempotency())
+        try:
+            # второй процесс ждет результата первого вместо повторного создания заказа
+            first, second = await asyncio.gather(
+                client.creation('Оплата заказа', 100, 'number-1', POSITION),
+                other.creation('Оплата заказа', 100, 'number-1', POSITION))
+            with pytest.raises(IdempotencyConflict):
+                await other.creation('Другое описание', 100, 'number-1', POSITION)
+        finally:
+            await other.close()
+
+        assert first['orderId'] == second['orderId']
+        assert simulator.requests[Methods.creation] == 1
+
+
+def test_sync_cache_deduplicates_threads_and_processes(simulator_thread):
+    server = fakeredis.FakeServer()
+    clients = [SberQR(*CREDENTIALS, base_url=simulator_thread.base_url, retry=NO_RETRY,
+                      idempotency=IdempotencyCache(redis=fakeredis.FakeRedis(server=server), wait_interval=0.01))
+               for _ in range(2)]
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            responses = list(executor.map(
+                lambda i: clients[i % 2].creation('Оплата заказа', 100, 'number-1', POSITION), range(8)))
+    finally:
+        for client in clients:
+            client.close()
+
+    assert len({response['orderId'] for response in responses}) == 1
+    assert simulator_thread.simulator.requests[Methods.creation] == 1
@@ -0,0 +1,39 @@
+import subprocess
+import sys
+
+import pytest
+
+
+def run(code: str) -> str:
+    """
+    Выполняет код в новом интерпретаторе: импорты текущего процесса тестов не влияют на результат
+    """
+    return subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout.strip()
+
+
+def test_package_import_loads_no_client_stack():
+    loaded = run('import sys, SberQR; print(sorted(name for name in ("aiohttp", "requests", "urllib3", "redis") '
+                 'if name in sys.modules))')
+    assert loaded == '[]'
+
+
+@pytest.mark.parametrize('first_import', [
+    'import SberQR.AsyncSberQR',
+    'from SberQR.AsyncSberQR import create_ssl_context',
+    'import SberQR.pool',
+    'from SberQR import AsyncSberQRPool',
+])
+def test_submodule_import_keeps_client_class(first_import):
+    # подмодуль AsyncSberQR совпадает по имени с классом
+    output = run(f'{first_import}\n'
+                 'import SberQR\n'
+                 'from SberQR import AsyncSberQR\n'
+                 'print(isinstance(AsyncSberQR, type), SberQR.AsyncSberQR is AsyncSberQR)')
+    assert output == 'True True'
+
+
+def test_clients_are_loaded_on_first_access():
+    output = run('import sys, SberQR\n'
+                 'print(SberQR.SberQR.__name__, "aiohttp" in sys.modules)\n'
+                 'print(SberQR.AsyncSberQR.__name__, "aiohttp" in sys.modules)')
+    assert output.splitlines() == ['SberQR False', 'AsyncSberQR True']
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from SberQR.api import Methods
+from SberQR.exceptions import NetworkError, SberQrAPIError
+from SberQR.journal import (APPLIED, NOT_APPLIED, NOT_CHECKED, UNKNOWN, Journal, read_journal, recover,
+                            recover_sync)
+from SberQR.models import Position
+from SberQR.scope import Scope
+from SberQR.types import CancelType
+
+from .helpers import async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+
+
+@pytest.fixture
+def journal_path(tmp_path):
+    return str(tmp_path / 'journal.jsonl')
+
+
+async def create(client, number: str):
+    return (await client.creation('Оплата заказа', 100, number, POSITION))['orderId']
+
+
+@async_test
+async def test_completed_requests_leave_no_pending_entries(journal_path):
+    journal = Journal(journal_path, fsync=False)
+    async with simulated(journal=journal) as (simulator, client):
+        order_id = await create(client, 'number-1')
+        await client.revoke(order_id, 'number-1')
+        simulator.fail_next(Methods.revocation, 400)
+        with pytest.raises(SberQrAPIError):
+            await client.revoke(order_id, 'number-1')
+    journal.close()
+
+    entries = read_journal(journal_path)
+    assert [(entry.method, entry.outcome) for entry in entries] == [
+        (Methods.creation, 'ok'), (Methods.revocation, 'ok'), (Methods.revocation, 'error')]
+    assert entries[1].params == {'order_id': order_id, 'partner_order_number': 'number-1'}
+    assert Journal(journal_path).pending() == []
+
+
+@async_test
+async def test_lost_response_is_recovered_by_status(journal_path):
+    journal = Journal(journal_path, fsync=False)
+    async with simulated({'method_latency': {Methods.revocation: 0.2}}, journal=journal,
+                         timeout=0.05) as (simulator, client):
+        order_id = await create(client, 'number-1')
+        await client.token(Scope.revoke)
+        with pytest.raises(NetworkError):
+            await client.revoke(order_id, 'number-1')
+        # банк применил отмену, но ответ до клиента не дошел
+        await asyncio.sleep(0.3)
+        [entry] = journal.pending()
+        assert entry.method == Methods.revocation
+
+        [result] = await recover(client, journal)
+        assert result.state == APPLIED and result.status['orderState'] == 'REVOKED'
+        assert journal.pending() == []
+    journal.close()
+    assert read_journal(journal_path)[-1].outcome == 'recovered'
+
+
+@async_test
+async def test_recovery_states(journal_path):
+    journal = Journal(journal_path, fsync=False)
+    async with simulated() as (simulator, client):
+        created = await create(client, 'number-1')
+        paid = await create(client, 'number-2')
+        payment = simulator.pay(paid)
+        refunded = await create(client, 'number-3')
+        refund_payment = simulator.pay(refunded)
+        await client.cancel(refunded, refund_payment['operationId'], 40, refund_payment['authCode'],
+                            CancelType.REFUND)
+
+        # записи begin процесса, завершившегося до получения ответов
+        journal.begin('revoke-not-applied', Methods.revocation,
+                      {'order_id': created, 'partner_order_number': 'number-1'})
+        journal.begin('cancel-not-applied', Methods.cancel,
+                      {'order_id': paid, 'operation_id': payment['operationId'], 'cancel_operation_sum': 100,
+                       'operation_type': CancelType.REVERSE.value, 'partner_order_number': 'number-2'})
+        journal.begin('cancel-applied', Methods.cancel,
+                      {'order_id': refunded, 'cancel_operation_sum': 40, 'operation_type': CancelType.REFUND.value,
+                       'partner_order_number': 'number-3'})
+        journal.begin('creation', Methods.creation, {'order_number': 'number-4'})
+        journal.begin('revoke-without-number', Methods.revocation, {'order_id': created})
+
+        results = {result.entry.rq_uid: result.state for result in await recover(client, journal)}
+
+    assert results == {'revoke-not-applied': NOT_APPLIED, 'cancel-not-applied': NOT_APPLIED,
+                       'cancel-applied': APPLIED, 'creation': UNKNOWN, 'revoke-without-number': NOT_CHECKED}
+    assert sorted(entry.rq_uid for entry in journal.pending()) == ['creation', 'revoke-without-number']
+    journal.close()
+
+
+@async_test
+async def test_failed_status_leaves_entry_pending(journal_path):
+    journal = Journal(journal_path, fsync=False)
+    async with simulated() as (simulator, client):
+        order_id = await create(client, 'number-1')
+        journal.begin('revoke', Methods.revocation, {'order_id': order_id, 'partner_order_number': 'number-1'})
+        simulator.fail_next(Methods.status, 503)
+
+        [result] = await recover(client, journal)
+        assert result.state == UNKNOWN and result.status is None
+        assert [entry.rq_uid for entry in journal.pending()] == ['revoke']
+
+        [result] = await recover(client, journal)
+        assert result.state == NOT_APPLIED
+    journal.close()
+
+
+def test_sync_recovery(journal_path, simulator_thread, sync_client):
+    order_id = sync_client.creation('Оплата заказа', 100, 'number-1', POSITION)['orderId']
+    journal = Journal(journal_path, fsync=False)
+    journal.begin('revoke', Methods.revocation, {'order_id': order_id, 'partner_order_number': 'number-1'})
+    sync_client.revoke(order_id)
+
+    [result] = recover_sync(sync_client, journal)
+    journal.close()
+    assert result.state == APPLIED
+
+
+def test_journal_survives_truncated_line(journal_path):
+    journal = Journal(journal_path, fsync=False)
+    journal.begin('first', Methods.revocation, {'order_id': '1'})
+    journal.begin('second', Methods.revocation, {'order_id': '2'})
+    journal.end('first', {'orderState': 'REVOKED'})
+    journal.close()
+    with open(journal_path, 'a', encoding='utf-8') as file:
+        file.write('{"event": "begin", "rq_uid": "third"')
+
+    journal = Journal(journal_path, fsync=False)
+    assert [entry.rq_uid for entry in journal.pending()] == ['second']
+    journal.begin('fourth', Methods.revocation, {'order_id': '4'})
+    journal.compact()
+    journal.close()
+    assert [entry.rq_uid for entry in read_journal(journal_path)] == ['second', 'fourth']
@@ -0,0 +1,101 @@
+import pytest
+
+from SberQR.api import Methods
+from SberQR.exceptions import SberQrAPIError
+from SberQR.metrics import Metrics, PrometheusInstrumentation, combine
+from SberQR.models import Position
+from SberQR.ratelimit import RateLimiter
+from SberQR.retry import RetryPolicy
+from SberQR.scope import Scope
+
+from .helpers import async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+RETRY = RetryPolicy(attempts=3, backoff=0.001, jitter=False)
+
+
+@async_test
+async def test_metrics_record_latency_statuses_retries_and_tokens():
+    metrics = Metrics()
+    async with simulated({'method_latency': {Methods.status: 0.03}},
+                         instrumentation=metrics, retry=RETRY) as (simulator, client):
+        order_id = (await client.creation('Оплата заказа', 100, 'number-1', POSITION))['orderId']
+        await client.creation('Оплата заказа', 100, 'number-2', POSITION)
+        simulator.fail_next(Methods.status, 503, count=2)
+        await client.status(order_id, 'number-1')
+        simulator.fail_next(Methods.revocation, 400)
+        with pytest.raises(SberQrAPIError):
+            await client.revoke(order_id)
+
+    snapshot = metrics.snapshot()
+    status = snapshot['methods'][Methods.status]
+    assert status['count'] == 3
+    assert status['statuses'] == {'503': 2, '2xx': 1}
+    assert status['errors'] == {'SberQrAPIError': 2}
+    assert status['retries'] == 2
+    assert status['p99'] == 0.05 and metrics.quantile(Methods.status, 0.99) == 0.05
+    assert snapshot['methods'][Methods.revocation]['statuses'] == {'400': 1}
+    assert snapshot['methods'][Methods.revocation]['retries'] == 0
+    assert metrics.quantile(Methods.registry, 0.99) is None
+
+    # первые обращения к областям create, status и revoke - промахи, повторная creation - попадание;
+    # повторы запроса status используют уже полученный токен
+    assert snapshot['tokens']['misses'] == 3 and snapshot['tokens']['hits'] == 1
+    assert snapshot['pool']['in_use'] == 0 and snapshot['pool']['max_in_use'] >= 1
+
+
+@async_test
+async def test_metrics_record_rate_limit_wait():
+    metrics = Metrics()
+    limiter = RateLimiter({Methods.creation: (20, 1)})
+    async with simulated(instrumentation=metrics, rate_limiter=limiter) as (_, client):
+        for i in range(3):
+            await client.creation('Оплата заказа', 100, f'number-{i}', POSITION)
+
+    rate_limit = metrics.snapshot()['rate_limit'][Methods.creation]
+    assert rate_limit['count'] == 3 and rate_limit['rejected'] == 0
+    # корзина на один запрос: второй и третий ждут около 0.05 с
+    assert rate_limit['wait_sum'] >= 0.05
+
+
+@async_test
+async def test_prometheus_and_hooks_are_combined():
+    prometheus_client = pytest.importorskip('prometheus_client')
+    registry = prometheus_client.CollectorRegistry()
+    prometheus = PrometheusInstrumentation(registry=registry)
+    calls = []
+
+    def on_request_end(method, attempt, duration, error):
+        calls.append((method, attempt, error))
+        raise RuntimeError('hook failure does not break the request')
+
+    async with simulated(instrumentation=combine(prometheus, None),
+                         on_request_end=on_request_end) as (simulator, client):
+        response = await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+        assert response['orderNumber'] == 'number-1'
+
+    assert registry.get_sample_value('sberqr_requests_total', {'method': Methods.creation, 'status': '2xx'}) == 1
+    assert registry.get_sample_value('sberqr_token_lookups_total', {'result': 'miss'}) == 1
+    assert calls == [(Methods.oauth, 0, None), (Methods.creation, 0, None)]
+
+
+@async_test
+async def test_opentelemetry_span_per_attempt():
+    sdk = pytest.importorskip('opentelemetry.sdk.trace')
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    from SberQR.metrics import OpenTelemetryInstrumentation
+
+    exporter = InMemorySpanExporter()
+    provider = sdk.TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    instrumentation = OpenTelemetryInstrumentation(tracer=provider.get_tracer('tests'))
+    async with simulated(instrumentation=instrumentation, retry=RETRY) as (simulator, client):
+        await client.token(Scope.status)
+        simulator.fail_next(Methods.oauth, 502)
+        await client.token(Scope.create)
+
+    spans = exporter.get_finished_spans()
+    assert [(span.name, span.attributes['sberqr.attempt'], span.attributes['sberqr.status']) for span in spans] == [
+        (f'SberQR {Methods.oauth}', 0, '2xx'), (f'SberQR {Methods.oauth}', 0, '502'),
+        (f'SberQR {Methods.oauth}', 1, '2xx')]
@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from SberQR.models import (CancelRequest, CancelResult, CreationRequest, CreationResult, Position, RevokeRequest,
+                           RevokeResult, StatusRequest, StatusResult)
+from SberQR.types import CancelType
+
+from .helpers import async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+RQ_TM = '2024-01-01T00:00:00Z'
+
+
+def test_creation_payload_wire_keys():
+    request = CreationRequest('uid', RQ_TM, '00000105', 'number-1', RQ_TM,
+                              [POSITION, {'position_name': 'Услуга', 'position_count': 2, 'position_sum': 50,
+                                          'position_description': 'Словарь'}],
+                              '1000301234', 200, '643', 'Оплата заказа')
+    assert request.to_payload() == {
+        'rq_uid': 'uid', 'rq_tm': RQ_TM, 'member_id': '00000105', 'order_number': 'number-1',
+        'order_create_date': RQ_TM,
+        'order_params_type': [
+            {'position_name': 'Товар', 'position_count': 1, 'position_sum': 100, 'position_description': 'Описание'},
+            {'position_name': 'Услуга', 'position_count': 2, 'position_sum': 50, 'position_description': 'Словарь'}],
+        'id_qr': '1000301234', 'order_sum': 200, 'currency': '643', 'description': 'Оплата заказа'}
+    assert request._replace(sbp_member_id='100000000111').to_payload()['sbp_member_id'] == '100000000111'
+
+
+def test_status_revoke_cancel_payload_wire_keys():
+    assert StatusRequest('uid', RQ_TM, 'order', '24601234', 'number-1').to_payload() == {
+        'rq_uid': 'uid', 'rq_tm': RQ_TM, 'order_id': 'order', 'tid': '24601234', 'partner_order_number': 'number-1'}
+    # необязательный номер заказа партнера не передается
+    assert 'partner_order_number' not in StatusRequest('uid', RQ_TM, 'order', '24601234', None).to_payload()
+    assert RevokeRequest('uid', RQ_TM, 'order').to_payload() == {'rq_uid': 'uid', 'rq_tm': RQ_TM, 'order_id': 'order'}
+
+    request = CancelRequest('uid', RQ_TM, 'order', CancelType.REFUND.value, 'operation', '123456', '1000301234',
+                            '24601234', 40, '643')
+    assert request.to_payload() == {
+        'rq_uid': 'uid', 'rq_tm': RQ_TM, 'order_id': 'order', 'operation_type': 'REFUND',
+        'operation_id': 'operation', 'auth_code': '123456', 'id_qr': '1000301234', 'tid': '24601234',
+        'cancel_operation_sum': 40, 'operation_currency': '643'}
+    assert request._replace(sbp_payer_id='payer').to_payload()['sbp_payer_id'] == 'payer'
+
+
+def test_results_are_validated_on_parse():
+    status = StatusResult.from_response({
+        'rqUid': 'uid', 'orderId': 'order', 'orderState': 'PAID', 'errorCode': '000000',
+        'orderOperationParams': {'orderOperationParam': {
+            'operationId': 'operation', 'operationType': 'PAY', 'operationDateTime': '2024-01-01T03:00:00+03:00',
+            'operationSum': '100', 'operationCurrency': '643', 'authCode': '123456', 'rrn': '1',
+            'responseCode': '00'}}})
+    [operation] = status.operations
+    assert (status.order_id, status.order_state, status.error_code) == ('order', 'PAID', '000000')
+    assert operation.operation_sum == 100
+    assert operation.operation_date_time == datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    # ошибка схемы видна при разборе, а не при обращении к полю
+    with pytest.raises(ValueError, match='order_state'):
+        StatusResult.from_response({'orderId': 'order', 'errorCode': 'GW0003'})
+    with pytest.raises(ValueError, match='operation_id'):
+        StatusResult.from_response({'orderId': 'order', 'orderState': 'PAID', 'orderOperationParams': [{}]})
+    with pytest.raises(ValueError, match='order_form_url'):
+        CreationResult.from_response({'orderId': 'order'})
+    with pytest.raises(ValueError, match='order_id'):
+        CancelResult.from_response({'orderStatus': 'PAID'})
+    assert RevokeResult.from_response({'orderId': 'order', 'orderState': 'REVOKED'}).order_state == 'REVOKED'
+
+
+@async_test
+async def test_typed_status_and_cancel():
+    async with simulated() as (simulator, client):
+        order = CreationResult.from_response(await client.creation('Оплата заказа', 100, 'number-1', POSITION))
+        assert order.order_state == 'CREATED' and order.order_form_url
+        payment = simulator.pay(order.order_id)
+
+        result = await client.cancel_result(order.order_id, payment['operationId'], 40, payment['authCode'],
+                                            CancelType.REFUND)
+        assert (result.order_id, result.operation_type) == (order.order_id, 'REFUND')
+        assert result.operation_date_time.tzinfo is not None
+
+        status = await client.status_result(order.order_id, 'number-1')
+        assert status.order_state == 'PAID'
+        assert [(operation.operation_type, operation.operation_sum) for operation in status.operations] == [
+            ('PAY', 100), ('REFUND', 40)]
+        with pytest.raises(ValueError):
+            await client.status_result('unknown', 'number-x')
+
+
+def test_sync_typed_status_and_cancel(simulator_thread, sync_client):
+    order_id = sync_client.creation('Оплата заказа', 100, 'number-1', POSITION)['orderId']
+    payment = simulator_thread.simulator.pay(order_id)
+
+    result = sync_client.cancel_result(order_id, payment['operationId'], 100, payment['authCode'])
+    assert (result.order_status, result.operation_type) == ('REVERSED', 'REVERSE')
+    assert sync_client.status_result(order_id, 'number-1').order_state == 'REVERSED'
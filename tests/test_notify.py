@@ -0,0 +1,131 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from SberQR.models import Position
+from SberQR.notify import Notification, NotificationReceiver
+
+from .helpers import async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+NOTIFICATION = {'orderId': 'order-1', 'orderState': 'PAID', 'operationId': 'operation-1', 'operationType': 'PAY',
+                'operationSum': 100, 'partnerOrderNumber': 'number-1'}
+
+
+async def post(receiver: NotificationReceiver, *bodies):
+    statuses = []
+    async with TestClient(TestServer(receiver.app())) as http:
+        for body in bodies:
+            if isinstance(body, str):
+                response = await http.post(receiver.path, data=body, headers={'Content-Type': 'application/json'})
+            else:
+                response = await http.post(receiver.path, json=body)
+            statuses.append(response.status)
+    return statuses
+
+
+@async_test
+async def test_duplicate_notification_is_processed_once():
+    receiver = NotificationReceiver()
+    received = []
+    receiver.on_notification(received.append)
+
+    assert await post(receiver, NOTIFICATION, NOTIFICATION) == [200, 200]
+    assert len(received) == 1
+    notification = received[0]
+    assert notification.key == ('order-1', 'operation-1', 'PAID')
+    assert notification.operation_sum == 100 and notification.source == 'notify'
+
+
+@async_test
+async def test_failed_notification_is_processed_on_redelivery():
+    receiver = NotificationReceiver()
+    received = []
+
+    @receiver.on_notification
+    async def handler(notification):
+        if not received:
+            received.append(None)
+            raise RuntimeError('database is unavailable')
+        received.append(notification)
+
+    assert await post(receiver, NOTIFICATION, NOTIFICATION, NOTIFICATION) == [500, 200, 200]
+    assert len(received) == 2 and received[1].order_id == 'order-1'
+
+
+@async_test
+async def test_invalid_notification_is_rejected():
+    receiver = NotificationReceiver()
+    received = []
+    receiver.on_notification(received.append)
+
+    assert await post(receiver, 'not json', {'orderId': 'order-1'}, [NOTIFICATION]) == [400, 400, 400]
+    assert received == []
+
+
+@async_test
+async def test_concurrent_duplicates_wait_for_first_delivery():
+    receiver = NotificationReceiver()
+    received = []
+
+    @receiver.on_notification
+    async def handler(notification):
+        await asyncio.sleep(0.05)
+        received.append(notification)
+
+    notification = Notification.parse(NOTIFICATION)
+    results = await asyncio.gather(*(receiver.dispatch(notification) for _ in range(3)))
+
+    assert sorted(results) == [False, False, True]
+    assert len(received) == 1
+
+
+@async_test
+async def test_expected_order_is_reported_by_status_polling():
+    async with simulated() as (simulator, client):
+        response = await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+        order_id = response['orderId']
+        receiver = NotificationReceiver(client, fallback_delay=0.01, fallback_max_interval=0.05)
+        received = []
+        paid = asyncio.Event()
+
+        @receiver.on_notification
+        def handler(notification):
+            received.append(notification)
+            if notification.order_state == 'PAID':
+                paid.set()
+
+        try:
+            receiver.expect(order_id, 'number-1')
+            await asyncio.sleep(0.05)
+            operation = simulator.pay(order_id)
+            await asyncio.wait_for(paid.wait(), 2)
+        finally:
+            await receiver.close()
+
+    notification = received[-1]
+    assert notification.source == 'poll'
+    assert notification.order_id == order_id and notification.partner_order_number == 'number-1'
+    assert notification.operation_id == operation['operationId']
+    assert notification.operation_type == 'PAY' and notification.operation_sum == 100
+
+
+@async_test
+async def test_terminal_notification_stops_status_polling():
+    async with simulated() as (simulator, client):
+        response = await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+        order_id = response['orderId']
+        receiver = NotificationReceiver(client, fallback_delay=0.05)
+        received = []
+        receiver.on_notification(received.append)
+        try:
+            receiver.expect(order_id, 'number-1')
+            simulator.pay(order_id)
+            assert await receiver.dispatch(Notification.parse({**NOTIFICATION, 'orderId': order_id}))
+            requests = simulator.requests.copy()
+            await asyncio.sleep(0.2)
+        finally:
+            await receiver.close()
+
+    assert simulator.requests == requests
+    assert [notification.source for notification in received] == ['notify']
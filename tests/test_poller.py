@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from SberQR.api import Methods
+from SberQR.models import Position
+from SberQR.poller import StatusPoller
+
+from .helpers import async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+
+
+async def create_orders(client, count: int):
+    orders = []
+    for i in range(count):
+        response = await client.creation('Оплата заказа', 100, f'order-{i}', POSITION)
+        orders.append((response['orderId'], f'order-{i}'))
+    return orders
+
+
+@async_test
+async def test_paid_orders_are_reported_once_and_removed():
+    async with simulated() as (simulator, client):
+        orders = await create_orders(client, 5)
+        poller = StatusPoller(client, initial_interval=0.01, max_interval=0.05)
+        async with poller:
+            poller.add_many(orders)
+            for order_id, _ in orders:
+                simulator.pay(order_id)
+            results = [result async for result in poller.results()]
+
+        assert sorted(result.order_id for result in results) == sorted(order_id for order_id, _ in orders)
+        assert all(result.final and result.order_state == 'PAID' and result.error is None for result in results)
+        assert len(poller) == 0
+
+
+@async_test
+async def test_state_changes_are_emitted_until_terminal_state():
+    async with simulated() as (simulator, client):
+        [(order_id, number)] = await create_orders(client, 1)
+        poller = StatusPoller(client, initial_interval=0.01, backoff=1.0)
+        states = []
+        poller.on_result(lambda result: states.append((result.order_state, result.final)))
+        async with poller:
+            poller.add(order_id, number)
+            await asyncio.sleep(0.1)
+            simulator.pay(order_id)
+            await asyncio.wait_for(poller.wait(), 2)
+
+        assert states == [('CREATED', False), ('PAID', True)]
+
+
+@async_test
+async def test_polling_stops_after_max_age():
+    async with simulated() as (_, client):
+        [(order_id, number)] = await create_orders(client, 1)
+        poller = StatusPoller(client, initial_interval=0.01, backoff=1.0, max_age=0.1)
+        async with poller:
+            poller.add(order_id, number)
+            results = [result async for result in poller.results()]
+
+        assert results[-1].final and results[-1].order_state == 'CREATED'
+        assert order_id not in poller
+
+
+@async_test
+async def test_interval_backs_off():
+    async with simulated() as (simulator, client):
+        [(order_id, number)] = await create_orders(client, 1)
+        poller = StatusPoller(client, initial_interval=0.05, backoff=2.0, max_interval=1.0, max_age=None)
+        async with poller:
+            poller.add(order_id, number)
+            await asyncio.sleep(0.5)
+        # 0.05 + 0.1 + 0.2 = 0.35, следующий опрос через 0.4 с
+        assert simulator.requests[Methods.status] == 3
+
+
+@async_test
+async def test_errors_are_reported_and_polling_continues():
+    async with simulated() as (simulator, client):
+        [(order_id, number)] = await create_orders(client, 1)
+        simulator.fail_next(Methods.status, 503)
+        simulator.pay(order_id)
+        poller = StatusPoller(client, initial_interval=0.01, backoff=1.0)
+        async with poller:
+            poller.add(order_id, number)
+            results = [result async for result in poller.results()]
+
+        assert results[0].error is not None and not results[0].final
+        assert results[-1].order_state == 'PAID' and results[-1].final
+
+
+@async_test
+async def test_rate_limits_status_requests():
+    async with simulated() as (simulator, client):
+        orders = await create_orders(client, 10)
+        poller = StatusPoller(client, initial_interval=0, backoff=1.0, rate=20, max_age=None)
+        started = time.monotonic()
+        async with poller:
+            poller.add_many(orders)
+            await asyncio.sleep(0.5)
+        elapsed = time.monotonic() - started
+        # корзина на 20 запросов и 20 запросов в секунду
+        assert 20 <= simulator.requests[Methods.status] <= 20 * elapsed + 20
+
+
+@async_test
+async def test_discard_stops_polling():
+    async with simulated() as (simulator, client):
+        [(order_id, number)] = await create_orders(client, 1)
+        poller = StatusPoller(client, initial_interval=0.05)
+        async with poller:
+            poller.add(order_id, number)
+            poller.discard(order_id)
+            await asyncio.sleep(0.1)
+        assert simulator.requests[Methods.status] == 0
@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from SberQR.api import Methods
+from SberQR.models import Position
+from SberQR.pool import AsyncSberQRPool
+from SberQR.pool_sync import SberQRPool
+from SberQR.retry import NO_RETRY
+from SberQR.simulator import SberQRSimulator
+
+from .helpers import CREDENTIALS, async_test
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+
+
+def terminal(pool, id_qr: str, client_id: str = 'client', **kwargs):
+    member_id, _, tid, _, client_secret, *certificates = CREDENTIALS
+    return pool.client(member_id, id_qr, tid, client_id, client_secret, *certificates, **kwargs)
+
+
+@async_test
+async def test_terminals_share_session_tokens_and_connections():
+    async with SberQRSimulator() as simulator:
+        pool = AsyncSberQRPool(base_url=simulator.base_url, retry=NO_RETRY)
+        clients = [terminal(pool, f'100030123{i}') for i in range(5)]
+        try:
+            for i, client in enumerate(clients):
+                await client.creation('Оплата заказа', 100, f'number-{i}', POSITION)
+            # последовательные запросы разных терминалов используют одно соединение
+            assert len(simulator.peers) == 1
+            await asyncio.gather(*(client.creation('Оплата заказа', 100, f'number-{i}', POSITION)
+                                   for i, client in enumerate(clients)))
+
+            assert len({id(await client.get_session()) for client in clients}) == 1
+            assert simulator.requests[Methods.oauth] == 1
+            assert simulator.requests[Methods.creation] == 10
+            assert pool.stats()['certificates'] == 1 and pool.stats()['client_ids'] == 1
+
+            # закрытие клиента не закрывает общую сессию
+            await clients[0].close()
+            await clients[1].creation('Оплата заказа', 100, 'number-x', POSITION)
+        finally:
+            await pool.close()
+
+
+@async_test
+async def test_client_ids_have_separate_tokens_and_shared_rate_limits():
+    async with SberQRSimulator() as simulator:
+        pool = AsyncSberQRPool(base_url=simulator.base_url, retry=NO_RETRY, rate_limits={Methods.creation: 100})
+        first, second = terminal(pool, '1000301231'), terminal(pool, '1000301232')
+        other = terminal(pool, '1000301233', client_id='other')
+        try:
+            await asyncio.gather(*(client.creation('Оплата заказа', 100, 'number-1', POSITION)
+                                   for client in (first, second, other)))
+
+            assert simulator.requests[Methods.oauth] == 2
+            assert pool.stats()['client_ids'] == 2
+            assert first.rate_limiter is second.rate_limiter
+            assert other.rate_limiter is not first.rate_limiter
+        finally:
+            await pool.close()
+
+
+@async_test
+async def test_client_closes_own_httpx_transport():
+    pytest.importorskip('httpx')
+    async with SberQRSimulator() as simulator:
+        pool = AsyncSberQRPool(base_url=simulator.base_url, retry=NO_RETRY, transport='httpx')
+        first, second = terminal(pool, '1000301231'), terminal(pool, '1000301232')
+        try:
+            await first.creation('Оплата заказа', 100, 'number-1', POSITION)
+            await first.close()
+            # транспорт создан клиентом и закрывается вместе с ним, транспорт другого клиента не затронут
+            assert first.transport._client.is_closed
+            await second.creation('Оплата заказа', 100, 'number-2', POSITION)
+        finally:
+            await second.close()
+            await pool.close()
+        assert second.transport._client.is_closed
+
+
+def test_sync_terminals_share_session_and_tokens(simulator_thread):
+    pool = SberQRPool(base_url=simulator_thread.base_url, retry=NO_RETRY)
+    clients = [terminal(pool, f'100030123{i}') for i in range(3)]
+    try:
+        orders = [client.creation('Оплата заказа', 100, f'number-{i}', POSITION)['orderId']
+                  for i, client in enumerate(clients)]
+        clients[0].close()
+        assert clients[1].status(orders[1], 'number-1')['orderState'] == 'CREATED'
+
+        assert len({id(client.get_session()) for client in clients}) == 1
+        assert simulator_thread.simulator.requests[Methods.oauth] == 2
+        assert len(simulator_thread.simulator.peers) == 1
+    finally:
+        pool.close()
+
+
+
+def test_sync_client_closes_own_httpx_transport(simulator_thread):
+    pytest.importorskip('httpx')
+    pool = SberQRPool(base_url=simulator_thread.base_url, retry=NO_RETRY, transport='httpx')
+    client = terminal(pool, '1000301231')
+    try:
+        client.creation('Оплата заказа', 100, 'number-1', POSITION)
+    finally:
+        client.close()
+        pool.close()
+    assert client.transport._client.is_closed
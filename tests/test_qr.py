@@ -0,0 +1,123 @@
+import asyncio
+import io
+import time
+
+import pytest
+
+from SberQR import qr
+from SberQR.models import Position
+from SberQR.qr import QRFormat, QRRenderer, order_form_url, render_qr
+
+from .helpers import async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+URL = 'https://sberbank.ru/qr/?uuid=0123456789abcdef'
+
+pytest.importorskip('qrcode')
+
+
+@pytest.fixture
+def render_calls(monkeypatch):
+    """
+    Счетчик рендерингов: render_qr с задержкой, чтобы запросы успели совпасть по времени
+    """
+    calls = []
+
+    def slow_render(*key):
+        calls.append(key)
+        time.sleep(0.05)
+        return render_qr(*key)
+
+    monkeypatch.setattr(qr, 'render_qr', slow_render)
+    return calls
+
+
+def test_output_formats():
+    from PIL import Image
+
+    png = render_qr(URL, QRFormat.PNG, box_size=4, border=2)
+    assert png.startswith(b'\x89PNG')
+    width, height = Image.open(io.BytesIO(png)).size
+    # размер - целое число модулей вместе с рамкой
+    assert width == height and width % 4 == 0
+    modules = width // 4 - 2 * 2
+
+    svg = render_qr(URL, 'svg')
+    assert isinstance(svg, bytes) and b'<svg' in svg
+
+    text = render_qr(URL, QRFormat.TEXT, border=1)
+    lines = text.splitlines()
+    assert isinstance(text, str) and set(text) <= {' ', '▀', '▄', '█', '\n'}
+    # две строки матрицы (с рамкой в 1 модуль) в одной строке текста
+    assert len(lines) == (modules + 2 + 1) // 2 and all(len(line) == len(lines[0]) for line in lines)
+
+    with pytest.raises(ValueError):
+        render_qr(URL, 'gif')
+
+
+def test_order_form_url_from_response():
+    assert order_form_url({'orderFormUrl': URL}) == URL
+    assert order_form_url({'order_form_url': URL}) == URL
+    with pytest.raises(ValueError):
+        order_form_url({'orderId': '1'})
+
+
+def test_lru_cache_hit_and_eviction(render_calls):
+    renderer = QRRenderer(cache_size=2)
+    first = renderer.render(URL + '1')
+    renderer.render(URL + '2')
+    assert renderer.render({'orderFormUrl': URL + '1'}) is first
+    # другой формат - другой ключ кэша; URL 2 используется раньше всех и вытесняется
+    renderer.render(URL + '1', 'svg')
+    renderer.render(URL + '2')
+
+    assert (renderer.hits, renderer.misses) == (1, 4)
+    assert [key[:2] for key in render_calls] == [(URL + '1', 'png'), (URL + '2', 'png'), (URL + '1', 'svg'),
+                                                  (URL + '2', 'png')]
+
+    renderer.clear()
+    renderer.render(URL + '2')
+    assert renderer.misses == 5
+
+    uncached = QRRenderer(cache_size=0)
+    uncached.render(URL)
+    uncached.render(URL)
+    assert (uncached.hits, uncached.misses) == (0, 2)
+
+
+@async_test
+async def test_concurrent_render_async_renders_once(render_calls):
+    renderer = QRRenderer()
+    images = await asyncio.gather(*(renderer.render_async(URL, 'text') for _ in range(10)))
+
+    assert len(render_calls) == 1 and renderer.misses == 1
+    assert all(image == images[0] for image in images)
+    assert await renderer.render_async(URL, 'text') == images[0]
+    assert renderer.hits == 1
+
+
+@async_test
+async def test_failed_render_is_not_cached(monkeypatch):
+    renderer = QRRenderer()
+    monkeypatch.setattr(qr, 'render_qr', lambda *key: 1 / 0)
+    results = await asyncio.gather(*(renderer.render_async(URL) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ZeroDivisionError) for result in results)
+
+    monkeypatch.undo()
+    assert (await renderer.render_async(URL)).startswith(b'\x89PNG')
+    assert renderer.misses == 2
+
+
+@async_test
+async def test_client_qr_uses_creation_response():
+    async with simulated(qr_renderer=QRRenderer()) as (simulator, client):
+        response = await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+        svg = await client.qr(response, QRFormat.SVG)
+        assert b'<svg' in svg
+        assert await client.qr(response['orderFormUrl'], 'svg') is svg
+        assert client.qr_renderer.hits == 1
+
+
+def test_sync_client_qr(sync_client):
+    response = sync_client.creation('Оплата заказа', 100, 'number-1', POSITION)
+    assert sync_client.qr(response, 'text') is sync_client.qr(response, 'text')
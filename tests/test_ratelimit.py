@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+from fakeredis import aioredis
+
+from SberQR import AsyncSberQR, SberQR
+from SberQR.api import Methods
+from SberQR.exceptions import RateLimitExceeded, SberQrAPIError
+from SberQR.models import Position
+from SberQR.ratelimit import AsyncRedisRateLimiter, RateLimiter, RedisRateLimiter
+from SberQR.retry import NO_RETRY
+
+from .helpers import CREDENTIALS, async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+CLIENT_ID = CREDENTIALS[3]
+
+
+async def create(client, count: int, prefix: str = 'number'):
+    return await asyncio.gather(*(client.creation('Оплата заказа', 100, f'{prefix}-{i}', POSITION)
+                                  for i in range(count)), return_exceptions=True)
+
+
+@async_test
+async def test_client_limit_prevents_throttling():
+    async with simulated({'rate_limit': 20}) as (simulator, client):
+        results = await create(client, 30)
+        throttled = [result for result in results if isinstance(result, SberQrAPIError)]
+        assert throttled and all(error.status_code == 429 for error in throttled)
+
+    async with simulated({'rate_limit': 20}, rate_limiter=RateLimiter({Methods.creation: (15, 15)})) as (_, client):
+        started = time.monotonic()
+        results = await create(client, 25)
+        assert all(isinstance(result, dict) for result in results)
+        # 15 запросов из корзины, остальные 10 со скоростью 15 в секунду
+        assert time.monotonic() - started >= 10 / 15 - 0.05
+
+
+@async_test
+async def test_non_blocking_limit_rejects_without_request():
+    limiter = RateLimiter({Methods.creation: (1, 1)}, block=False)
+    async with simulated(rate_limiter=limiter) as (simulator, client):
+        await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+        with pytest.raises(RateLimitExceeded) as e:
+            await client.creation('Оплата заказа', 100, 'number-2', POSITION)
+
+        assert 0 < e.value.retry_after <= 1
+        assert simulator.requests[Methods.creation] == 1
+        # лимит задан только для creation
+        assert limiter.limit(Methods.status) is None
+
+
+def test_max_wait_and_try_acquire():
+    limiter = RateLimiter(default=(10, 2), max_wait=0.05)
+    assert limiter.try_acquire(Methods.status) and limiter.try_acquire(Methods.status)
+    assert not limiter.try_acquire(Methods.status)
+    # ожидание 0.1 с больше max_wait
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire_sync(Methods.status)
+    time.sleep(0.1)
+    assert limiter.acquire_sync(Methods.status) == 0
+    with pytest.raises(ValueError):
+        RateLimiter({Methods.status: 0})
+
+
+@async_test
+async def test_redis_limit_is_shared_by_processes():
+    server = fakeredis.FakeServer()
+
+    def limiter():
+        return AsyncRedisRateLimiter(aioredis.FakeRedis(server=server), CLIENT_ID, {Methods.creation: (10, 5)})
+
+    async with simulated(rate_limiter=limiter()) as (simulator, client):
+        other = AsyncSberQR(*CREDENTIALS, base_url=simulator.base_url, retry=NO_RETRY, rate_limiter=limiter())
+        try:
+            started = time.monotonic()
+            await asyncio.gather(create(client, 5, 'first'), create(other, 5, 'second'))
+            elapsed = time.monotonic() - started
+        finally:
+            await other.close()
+
+        assert simulator.requests[Methods.creation] == 10
+        # 5 запросов из общей корзины, остальные 5 со скоростью 10 в секунду
+        assert elapsed >= 0.45
+
+
+def test_sync_client_waits_for_redis_limit(simulator_thread):
+    limiter = RedisRateLimiter(fakeredis.FakeRedis(), CLIENT_ID, {Methods.creation: (20, 1)}, max_wait=1)
+    client = SberQR(*CREDENTIALS, base_url=simulator_thread.base_url, retry=NO_RETRY, rate_limiter=limiter)
+    try:
+        started = time.monotonic()
+        for i in range(4):
+            client.creation('Оплата заказа', 100, f'number-{i}', POSITION)
+        elapsed = time.monotonic() - started
+    finally:
+        client.close()
+
+    assert elapsed >= 3 / 20 - 0.01
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+from SberQR.api import Methods
+from SberQR.export import TOTALS_FIELDS
+from SberQR.models import Position, RegistryQuantity
+from SberQR.reconcile import ReconciliationStore
+from SberQR.registry import RegistryWindow
+from SberQR.types import CancelType
+
+from .helpers import ID_QR, async_test, declined_payment, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+
+
+async def paid_order(simulator, client, number: str, amount: int = 100):
+    order_id = (await client.creation('Оплата заказа', amount, number, POSITION))['orderId']
+    return order_id, simulator.pay(order_id)
+
+
+async def registry_orders(simulator, client):
+    """
+    Заказы A (возвращен полностью), B (возвращен частично), C (оплата отклонена), D (оплачен)
+    """
+    a, payment = await paid_order(simulator, client, 'number-a')
+    await client.cancel(a, payment['operationId'], 100, payment['authCode'], CancelType.REFUND)
+    b, payment = await paid_order(simulator, client, 'number-b')
+    await client.cancel(b, payment['operationId'], 40, payment['authCode'], CancelType.REFUND)
+    c = (await client.creation('Оплата заказа', 100, 'number-c', POSITION))['orderId']
+    declined_payment(simulator, c)
+    d, _ = await paid_order(simulator, client, 'number-d')
+    return a, b, c, d
+
+
+@async_test
+async def test_sync_loads_registry_and_reconciles_successful_operations():
+    async with simulated() as (simulator, client):
+        a, b, c, d = await registry_orders(simulator, client)
+        now = datetime.utcnow()
+        with ReconciliationStore() as store:
+            assert await store.sync(client, now - timedelta(hours=2), now + timedelta(minutes=1)) == 6
+
+            assert store.refunded() == [a]
+            assert store.partially_refunded() == [b]
+            [declined] = store.by_partner_order_number('number-c')
+            assert declined.order_id == c and declined.response_code == '05'
+            assert [operation.id_qr for operation in store.by_order_id(d)] == [ID_QR]
+
+            assert store.quantity() == RegistryQuantity(5, 3, 2, 0)
+            assert store.quantity(successful_only=False) == RegistryQuantity(6, 4, 2, 0)
+            assert store.missing(['number-a', 'number-x']) == ['number-x']
+            assert [operation.order_id for operation in store.unmatched(['number-a', 'number-b', 'number-c'])] == [d]
+
+            columns = store.columns(fields=TOTALS_FIELDS)
+            assert list(columns) == ['operation_type', 'operation_sum', 'response_code']
+            assert sorted(columns['response_code']) == ['00'] * 5 + ['05']
+
+
+@async_test
+async def test_sync_requests_only_pending_periods():
+    async with simulated() as (simulator, client):
+        await paid_order(simulator, client, 'number-a')
+        now = datetime.utcnow().replace(microsecond=0)
+        start, end = now - timedelta(hours=3), now + timedelta(minutes=1)
+        with ReconciliationStore() as store:
+            store.ingest([], RegistryWindow(start, now - timedelta(hours=1)), ID_QR)
+            assert store.pending_periods(start, end, ID_QR) == [RegistryWindow(now - timedelta(hours=1), end)]
+
+            assert await store.sync(client, start, end, window=timedelta(minutes=30)) == 1
+            # окно, выгруженное до наступления его конца, загружается повторно
+            assert store.pending_periods(start, end, ID_QR) == [RegistryWindow(now, end)]
+            assert simulator.requests[Methods.registry] == 3
+
+            await store.sync(client, start, end, window=timedelta(minutes=30))
+            assert simulator.requests[Methods.registry] == 4
+            assert len(store.by_partner_order_number('number-a')) == 1
+
+
+def test_pending_periods_keep_timezone_of_request():
+    start = datetime(2024, 1, 1, 3, tzinfo=timezone(timedelta(hours=3)))
+    with ReconciliationStore() as store:
+        store.ingest([], RegistryWindow(datetime(2024, 1, 1, 1), datetime(2024, 1, 1, 2)), ID_QR)
+        assert store.pending_periods(start, start + timedelta(hours=3), ID_QR) == [
+            RegistryWindow(start, start + timedelta(hours=1)),
+            RegistryWindow(start + timedelta(hours=2), start + timedelta(hours=3))]
@@ -0,0 +1,92 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fakeredis
+from fakeredis import aioredis
+
+from SberQR import AsyncSberQR, SberQR
+from SberQR.api import Methods
+from SberQR.redis_tokens import AsyncRedisTokenStore
+from SberQR.retry import NO_RETRY
+from SberQR.scope import Scope
+
+from .helpers import CREDENTIALS, async_test, simulated
+
+CLIENT_ID = CREDENTIALS[3]
+
+
+@async_test
+async def test_processes_share_one_token_request():
+    server = fakeredis.FakeServer()
+    async with simulated(redis=aioredis.FakeRedis(server=server)) as (simulator, client):
+        # отдельные клиенты со своим кэшем в памяти - как разные процессы
+        others = [AsyncSberQR(*CREDENTIALS, base_url=simulator.base_url, retry=NO_RETRY,
+                              redis=aioredis.FakeRedis(server=server)) for _ in range(4)]
+        try:
+            tokens = await asyncio.gather(*(process.token(Scope.create)
+                                            for process in [client, *others] for _ in range(5)))
+        finally:
+            for process in others:
+                await process.close()
+
+        assert len(set(tokens)) == 1
+        assert simulator.requests[Methods.oauth] == 1
+
+        redis = aioredis.FakeRedis(server=server, decode_responses=True)
+        assert await redis.get(f'{CLIENT_ID}token_{Scope.create.value}') == tokens[0]
+        assert 1780 <= await redis.ttl(f'{CLIENT_ID}token_{Scope.create.value}') <= 1790
+        assert await redis.get(f'{CLIENT_ID}token_{Scope.create.value}:lock') is None
+
+
+@async_test
+async def test_token_from_redis_is_used_without_oauth_request():
+    redis = aioredis.FakeRedis()
+    store = AsyncRedisTokenStore(redis, CLIENT_ID)
+    await store.set(Scope.status, 'stored-token', 1790)
+    async with simulated(redis=redis) as (simulator, client):
+        assert await client.token(Scope.status) == 'stored-token'
+        assert simulator.requests[Methods.oauth] == 0
+
+
+@async_test
+async def test_waiter_requests_token_when_lock_holder_does_not_refresh_it():
+    redis = aioredis.FakeRedis()
+    store = AsyncRedisTokenStore(redis, CLIENT_ID)
+    # блокировку держит процесс, который не сохранит токен
+    assert await store.acquire_lock(Scope.status) is not None
+    async with simulated(redis=redis, redis_lock_timeout=0.3) as (simulator, client):
+        started = time.monotonic()
+        token = await client.token(Scope.status)
+
+        assert time.monotonic() - started >= 0.3
+        assert simulator.requests[Methods.oauth] == 1
+        assert (await store.get(Scope.status))[0] == token
+
+
+@async_test
+async def test_expiring_token_is_used_while_another_process_refreshes_it():
+    redis = aioredis.FakeRedis()
+    store = AsyncRedisTokenStore(redis, CLIENT_ID)
+    await store.set(Scope.status, 'expiring-token', 1790)
+    # до истечения меньше refresh margin, токен требует обновления
+    await redis.expire(store.key(Scope.status), 5)
+    await store.acquire_lock(Scope.status)
+    async with simulated(redis=redis) as (simulator, client):
+        assert await client.token(Scope.status) == 'expiring-token'
+        assert simulator.requests[Methods.oauth] == 0
+
+
+def test_sync_processes_share_one_token_request(simulator_thread):
+    server = fakeredis.FakeServer()
+    clients = [SberQR(*CREDENTIALS, base_url=simulator_thread.base_url, retry=NO_RETRY,
+                      redis=fakeredis.FakeRedis(server=server)) for _ in range(4)]
+    try:
+        with ThreadPoolExecutor(8) as executor:
+            tokens = list(executor.map(lambda i: clients[i % 4].token(Scope.create), range(16)))
+    finally:
+        for client in clients:
+            client.close()
+
+    assert len(set(tokens)) == 1
+    assert simulator_thread.simulator.requests[Methods.oauth] == 1
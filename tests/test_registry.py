@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from SberQR.api import Methods
+from SberQR.models import Position
+from SberQR.registry import RegistryReader, RegistryWindow, split_period
+
+from .helpers import async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+START = datetime(2024, 1, 1)
+HOUR = timedelta(hours=1)
+
+
+async def paid_at(simulator, client, number: str, paid: datetime) -> str:
+    """
+    Оплаченный заказ с операцией оплаты в заданное время (UTC)
+    """
+    order_id = (await client.creation('Оплата заказа', 100, number, POSITION))['orderId']
+    operation = simulator.pay(order_id)
+    operation['operationDateTime'] = paid.strftime('%Y-%m-%dT%H:%M:%SZ')
+    return operation['operationId']
+
+
+class InclusiveReader(RegistryReader):
+    """
+    Банк, возвращающий операции на конце окна: операция на границе попадает в оба соседних окна
+    """
+
+    async def fetch_window(self, window: RegistryWindow):
+        return await self._client.registry(window.start, window.end + timedelta(seconds=1))
+
+
+def test_split_period():
+    assert split_period(START, START + timedelta(minutes=150), HOUR) == [
+        RegistryWindow(START, START + HOUR), RegistryWindow(START + HOUR, START + 2 * HOUR),
+        RegistryWindow(START + 2 * HOUR, START + timedelta(minutes=150))]
+    assert split_period(START, START, HOUR) == []
+    with pytest.raises(ValueError):
+        split_period(START, START + HOUR, timedelta(0))
+
+
+@async_test
+async def test_operations_are_read_by_windows_in_order():
+    async with simulated({'method_latency': {Methods.registry: 0.02}}) as (simulator, client):
+        expected = [await paid_at(simulator, client, f'number-{hour}', START + hour * HOUR + timedelta(minutes=30))
+                    for hour in range(6)]
+        # операция вне периода
+        await paid_at(simulator, client, 'number-x', START + 6 * HOUR)
+
+        done = []
+        running = 0
+        peak = 0
+        reader = RegistryReader(client, HOUR, concurrency=2, on_window_done=done.append)
+        fetch_window = reader.fetch_window
+
+        async def counting_fetch(window):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                return await fetch_window(window)
+            finally:
+                running -= 1
+
+        reader.fetch_window = counting_fetch
+        operations = [operation async for operation in reader.operations(START, START + 6 * HOUR)]
+
+    assert [operation.operation_id for operation in operations] == expected
+    assert done == split_period(START, START + 6 * HOUR, HOUR) and reader.completed == set(done)
+    assert simulator.requests[Methods.registry] == 6
+    assert peak == 2
+
+
+@async_test
+async def test_interrupted_read_resumes_from_completed_windows():
+    async with simulated() as (simulator, client):
+        expected = [await paid_at(simulator, client, f'number-{hour}', START + hour * HOUR + timedelta(minutes=10))
+                    for hour in range(4)]
+
+        reader = RegistryReader(client, HOUR, concurrency=1)
+        read = []
+        operations = reader.operations(START, START + 4 * HOUR)
+        async for operation in operations:
+            read.append(operation.operation_id)
+            if len(read) == 2:
+                break
+        await operations.aclose()
+        # второе окно не завершено: его операция будет прочитана повторно
+        assert reader.completed == {RegistryWindow(START, START + HOUR)}
+
+        requests = simulator.requests[Methods.registry]
+        resumed = RegistryReader(client, HOUR, completed=reader.completed)
+        assert resumed.pending_windows(START, START + 4 * HOUR)[0] == RegistryWindow(START + HOUR, START + 2 * HOUR)
+        rest = [operation.operation_id async for operation in resumed.operations(START, START + 4 * HOUR)]
+
+    assert rest == expected[1:]
+    assert simulator.requests[Methods.registry] - requests == 3
+
+
+@async_test
+async def test_boundary_operation_is_returned_once():
+    async with simulated() as (simulator, client):
+        boundary = await paid_at(simulator, client, 'number-1', START + HOUR)
+        inside = await paid_at(simulator, client, 'number-2', START + timedelta(minutes=90))
+
+        reader = InclusiveReader(client, HOUR)
+        operations = [operation.operation_id async for operation in reader.operations(START, START + 2 * HOUR)]
+
+    # операция на границе окон возвращается банком дважды, читателем - один раз
+    assert operations == [boundary, inside]
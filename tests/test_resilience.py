@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from SberQR.api import Methods
+from SberQR.exceptions import CircuitOpenError, SberQrAPIError
+from SberQR.models import Position
+from SberQR.resilience import AdaptiveLimiter, CircuitState
+
+from .helpers import async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+
+
+async def failing_calls(client, order_id: str, count: int, exception=SberQrAPIError):
+    for _ in range(count):
+        with pytest.raises(exception):
+            await client.status(order_id, 'number-1')
+
+
+@async_test
+async def test_breaker_opens_after_consecutive_failures_and_recovers():
+    async with simulated(breaker_failure_threshold=3, breaker_recovery_timeout=0.1) as (simulator, client):
+        order_id = (await client.creation('Оплата заказа', 100, 'number-1', POSITION))['orderId']
+        simulator.fail_next(Methods.status, 503, count=3)
+        await failing_calls(client, order_id, 3)
+        breaker = client.get_breaker(Methods.status)
+        assert breaker.state is CircuitState.OPEN
+
+        # открытый breaker не пропускает запросы к API
+        with pytest.raises(CircuitOpenError) as e:
+            await client.status(order_id, 'number-1')
+        assert 0 < e.value.retry_after <= 0.1
+        assert simulator.requests[Methods.status] == 3
+        # breaker другого метода не затронут
+        await client.creation('Оплата заказа', 100, 'number-2', POSITION)
+
+        await asyncio.sleep(0.1)
+        assert breaker.state is CircuitState.HALF_OPEN
+        response = await client.status(order_id, 'number-1')
+        assert response['orderState'] == 'CREATED'
+        assert breaker.state is CircuitState.CLOSED
+        assert client.health()[Methods.status]['state'] == 'closed'
+
+
+@async_test
+async def test_failed_probe_reopens_breaker():
+    async with simulated(breaker_failure_threshold=2, breaker_recovery_timeout=0.05) as (simulator, client):
+        order_id = (await client.creation('Оплата заказа', 100, 'number-1', POSITION))['orderId']
+        simulator.fail_next(Methods.status, 500, count=3)
+        await failing_calls(client, order_id, 2)
+        await asyncio.sleep(0.05)
+
+        await failing_calls(client, order_id, 1)
+        assert client.get_breaker(Methods.status).state is CircuitState.OPEN
+        await failing_calls(client, order_id, 1, CircuitOpenError)
+        assert simulator.requests[Methods.status] == 3
+
+
+@async_test
+async def test_client_errors_and_throttling_do_not_open_breaker():
+    async with simulated(breaker_failure_threshold=2) as (simulator, client):
+        order_id = (await client.creation('Оплата заказа', 100, 'number-1', POSITION))['orderId']
+        simulator.fail_next(Methods.status, 400, count=2)
+        simulator.fail_next(Methods.status, 429, count=2)
+        await failing_calls(client, order_id, 4)
+
+        assert client.get_breaker(Methods.status).state is CircuitState.CLOSED
+        assert (await client.status(order_id, 'number-1'))['orderState'] == 'CREATED'
+
+
+@async_test
+async def test_breaker_can_be_disabled():
+    async with simulated(breaker_failure_threshold=None) as (simulator, client):
+        order_id = (await client.creation('Оплата заказа', 100, 'number-1', POSITION))['orderId']
+        simulator.fail_next(Methods.status, 503, count=10)
+        await failing_calls(client, order_id, 10)
+
+        assert client.get_breaker(Methods.status) is None
+        assert simulator.requests[Methods.status] == 10
+
+
+@async_test
+async def test_adaptive_limiter_bounds_concurrency_and_backs_off():
+    limiter = AdaptiveLimiter(initial_limit=4, min_limit=1, max_limit=8)
+    async with simulated({'method_latency': {Methods.status: 0.02}},
+                         concurrency_limiter=limiter) as (simulator, client):
+        order_id = (await client.creation('Оплата заказа', 100, 'number-1', POSITION))['orderId']
+        peak = 0
+        calls = asyncio.gather(*(client.status(order_id, 'number-1') for _ in range(20)))
+        while not calls.done():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.001)
+        await calls
+        assert 0 < peak <= 4
+        assert limiter.in_flight == 0
+        assert limiter.limit >= 4
+
+        limit = limiter.limit
+        simulator.fail_next(Methods.status, 503)
+        with pytest.raises(SberQrAPIError):
+            await client.status(order_id, 'number-1')
+        assert limiter.limit == max(1, int(limit * 0.5))
@@ -0,0 +1,152 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from SberQR import SberQR
+from SberQR.api import Methods
+from SberQR.api_sync import make_request
+from SberQR.exceptions import RequestTimeoutError, SberQrAPIError
+from SberQR.models import Position
+from SberQR.retry import RetryPolicy
+from SberQR.types import CancelType
+
+from .helpers import CREDENTIALS, async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+RETRY = RetryPolicy(attempts=3, backoff=0.01, jitter=False)
+
+
+def record_attempts(client):
+    """
+    Заголовки и тела всех попыток запроса
+    """
+    attempts = []
+    send = client._send
+
+    async def recording_send(method, headers, data, *args):
+        attempts.append((method, headers, data))
+        return await send(method, headers, data, *args)
+
+    client._send = recording_send
+    return attempts
+
+
+@async_test
+async def test_retried_creation_keeps_rq_uid():
+    async with simulated(retry=RETRY) as (simulator, client):
+        attempts = record_attempts(client)
+        simulator.fail_next(Methods.creation, 503, 2)
+        response = await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+
+        creation = [(headers['RqUID'], data['rq_uid']) for method, headers, data in attempts
+                    if method == Methods.creation]
+        assert len(creation) == 3 and simulator.requests[Methods.creation] == 3
+        assert len(set(creation)) == 1 and creation[0][0] == creation[0][1] == response['rqUid']
+        assert len(simulator.orders) == 1
+
+        # ошибка запроса не повторяется
+        simulator.fail_next(Methods.creation, 400)
+        with pytest.raises(SberQrAPIError):
+            await client.creation('Оплата заказа', 100, 'number-2', POSITION)
+        assert simulator.requests[Methods.creation] == 4
+
+
+@async_test
+async def test_revoke_and_cancel_are_not_retried():
+    async with simulated(retry=RETRY) as (simulator, client):
+        order_id = (await client.creation('Оплата заказа', 100, 'number-1', POSITION))['orderId']
+        simulator.fail_next(Methods.revocation, 503)
+        with pytest.raises(SberQrAPIError) as e:
+            await client.revoke(order_id, 'number-1')
+        assert e.value.status_code == 503 and simulator.requests[Methods.revocation] == 1
+
+        paid = (await client.creation('Оплата заказа', 100, 'number-2', POSITION))['orderId']
+        payment = simulator.pay(paid)
+        simulator.fail_next(Methods.cancel, 502)
+        with pytest.raises(SberQrAPIError):
+            await client.cancel(paid, payment['operationId'], 100, payment['authCode'], CancelType.REVERSE)
+        assert simulator.requests[Methods.cancel] == 1
+
+        # status повторяется при той же ошибке
+        simulator.fail_next(Methods.status, 503)
+        assert (await client.status(order_id, 'number-1'))['orderState'] == 'CREATED'
+        assert simulator.requests[Methods.status] == 2
+
+
+@async_test
+async def test_deadline_stops_retries():
+    retry = RetryPolicy(attempts=10, backoff=0.1, jitter=False)
+    async with simulated(retry=retry, deadline=0.25) as (simulator, client):
+        order_id = (await client.creation('Оплата заказа', 100, 'number-1', POSITION))['orderId']
+        simulator.fail_next(Methods.status, 503, 10)
+        started = time.monotonic()
+        with pytest.raises(SberQrAPIError):
+            await client.status(order_id, 'number-1')
+        # после повтора через 0.1 с следующая задержка 0.2 с выходит за deadline
+        assert simulator.requests[Methods.status] == 2
+        assert time.monotonic() - started < 0.25
+
+        # deadline ограничивает и саму попытку
+        simulator.method_latency[Methods.status] = 1
+        started = time.monotonic()
+        with pytest.raises(RequestTimeoutError):
+            await client.status(order_id, 'number-1')
+        assert time.monotonic() - started < 0.4
+
+
+class TrickleHandler(BaseHTTPRequestHandler):
+    # каждый фрагмент приходит раньше таймаута чтения, весь ответ - за 0.5 с
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = b' ' * 10 + b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        for byte in range(len(body)):
+            self.wfile.write(body[byte:byte + 1])
+            self.wfile.flush()
+            time.sleep(0.05)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def trickle_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TrickleHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_sync_numeric_timeout_is_total_time(trickle_url):
+    with requests.Session() as session:
+        started = time.monotonic()
+        with pytest.raises(RequestTimeoutError):
+            make_request(session, Methods.status, {}, {}, timeout=0.2, base_url=trickle_url)
+        assert time.monotonic() - started < 0.4
+
+        # пара (connect, read) ограничивает только каждое чтение
+        assert make_request(session, Methods.status, {}, {}, timeout=(1, 0.2), base_url=trickle_url) == {}
+
+
+def test_sync_client_retries_with_same_rq_uid(simulator_thread):
+    simulator = simulator_thread.simulator
+    client = SberQR(*CREDENTIALS, base_url=simulator_thread.base_url, retry=RETRY, timeout=5)
+    try:
+        simulator.fail_next(Methods.creation, 503)
+        response = client.creation('Оплата заказа', 100, 'number-1', POSITION)
+        simulator.fail_next(Methods.revocation, 503)
+        with pytest.raises(SberQrAPIError):
+            client.revoke(response['orderId'])
+    finally:
+        client.close()
+
+    assert simulator.requests[Methods.creation] == 2 and len(simulator.orders) == 1
+    assert simulator.requests[Methods.revocation] == 1
@@ -0,0 +1,105 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from SberQR import SberQR
+from SberQR.api import Methods
+from SberQR.models import Position
+from SberQR.retry import NO_RETRY
+from SberQR.status_cache import StatusCache
+
+from .helpers import CREDENTIALS, async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+
+
+async def create(client, number: str = 'number-1'):
+    return (await client.creation('Оплата заказа', 100, number, POSITION))['orderId']
+
+
+@async_test
+async def test_concurrent_status_calls_share_one_request():
+    cache = StatusCache()
+    async with simulated({'method_latency': {Methods.status: 0.05}}, status_cache=cache) as (simulator, client):
+        order_id = await create(client)
+        responses = await asyncio.gather(*(client.status(order_id, 'number-1') for _ in range(10)))
+        # без ttl ответ не переиспользуется после завершения запроса
+        await client.status(order_id, 'number-1')
+
+        assert all(response is responses[0] for response in responses)
+        assert simulator.requests[Methods.status] == 2
+        assert (cache.misses, cache.coalesced, cache.hits) == (2, 9, 0)
+
+
+@async_test
+async def test_responses_are_cached_for_ttl_by_state():
+    cache = StatusCache(ttl=0.1, terminal_ttl=10)
+    async with simulated(status_cache=cache) as (simulator, client):
+        order_id = await create(client)
+        assert (await client.status(order_id, 'number-1'))['orderState'] == 'CREATED'
+        await client.status(order_id, 'number-1')
+        assert simulator.requests[Methods.status] == 1
+
+        simulator.pay(order_id)
+        await asyncio.sleep(0.1)
+        assert (await client.status(order_id, 'number-1'))['orderState'] == 'PAID'
+        await asyncio.sleep(0.1)
+        await client.status(order_id, 'number-1')
+        assert simulator.requests[Methods.status] == 2
+        assert cache.hit_rate == 0.5
+
+        # ответ об ошибке не кэшируется
+        assert 'orderState' not in await client.status('unknown', 'number-x')
+        await client.status('unknown', 'number-x')
+        assert simulator.requests[Methods.status] == 4
+
+
+@async_test
+async def test_revoke_invalidates_cached_status():
+    async with simulated(status_cache=StatusCache(ttl=10)) as (simulator, client):
+        order_id = await create(client)
+        assert (await client.status(order_id, 'number-1'))['orderState'] == 'CREATED'
+        await client.revoke(order_id, 'number-1')
+
+        assert (await client.status(order_id, 'number-1'))['orderState'] == 'REVOKED'
+
+
+@async_test
+async def test_status_in_flight_during_revoke_is_not_cached():
+    cache = StatusCache(ttl=10, terminal_ttl=10)
+    async with simulated(status_cache=cache) as (simulator, client):
+        order_id = await create(client)
+        request_status = client._status
+
+        async def delayed_status(*args):
+            # банк ответил до revoke, ответ доходит до клиента после него
+            response = await request_status(*args)
+            await asyncio.sleep(0.1)
+            return response
+
+        client._status = delayed_status
+        stale = asyncio.ensure_future(client.status(order_id, 'number-1'))
+        await asyncio.sleep(0.05)
+        await client.revoke(order_id, 'number-1')
+        # вызов после revoke не присоединяется к запросу, начатому до него
+        fresh = await client.status(order_id, 'number-1')
+
+        assert (await stale)['orderState'] == 'CREATED'
+        assert fresh['orderState'] == 'REVOKED'
+        assert (await client.status(order_id, 'number-1'))['orderState'] == 'REVOKED'
+        assert simulator.requests[Methods.status] == 2
+
+
+def test_sync_threads_share_one_request(simulator_thread):
+    cache = StatusCache()
+    simulator_thread.simulator.method_latency[Methods.status] = 0.1
+    client = SberQR(*CREDENTIALS, base_url=simulator_thread.base_url, retry=NO_RETRY, status_cache=cache)
+    try:
+        order_id = client.creation('Оплата заказа', 100, 'number-1', POSITION)['orderId']
+        with ThreadPoolExecutor(8) as executor:
+            responses = list(executor.map(lambda _: client.status(order_id, 'number-1'), range(8)))
+    finally:
+        client.close()
+
+    assert all(response['orderState'] == 'CREATED' for response in responses)
+    assert simulator_thread.simulator.requests[Methods.status] < 8
+    assert cache.misses + cache.coalesced == 8
@@ -0,0 +1,60 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from SberQR import SberQR
+from SberQR.api import Methods
+from SberQR.exceptions import SberQrAPIError
+from SberQR.models import Position
+from SberQR.retry import NO_RETRY
+
+from .helpers import CREDENTIALS
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+
+
+def test_client_is_shared_by_worker_threads(simulator_thread, sync_client):
+    # у каждого потока свой заказ: одновременные запросы статуса одного заказа объединяются
+    orders = [(sync_client.creation('Оплата заказа', 100, f'number-{i}', POSITION)['orderId'], f'number-{i}')
+              for i in range(8)]
+
+    def worker(order):
+        session = sync_client.get_session()
+        states = {sync_client.status(*order)['orderState'] for _ in range(10)}
+        return session, states
+
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(worker, orders))
+
+    assert len({id(session) for session, _ in results}) == 1
+    assert all(states == {'CREATED'} for _, states in results)
+    simulator = simulator_thread.simulator
+    assert simulator.requests[Methods.status] == 80
+    assert simulator.requests[Methods.oauth] == 2
+    # соединения возвращаются в пул и используются повторно
+    assert len(simulator.peers) <= 8
+
+
+def test_connections_are_closed_without_keep_alive(simulator_thread):
+    client = SberQR(*CREDENTIALS, base_url=simulator_thread.base_url, retry=NO_RETRY, keep_alive=False)
+    try:
+        for i in range(3):
+            client.creation('Оплата заказа', 100, f'number-{i}', POSITION)
+    finally:
+        client.close()
+
+    # oauth и три creation, каждый запрос в новом соединении
+    assert len(simulator_thread.simulator.peers) == 4
+
+
+def test_bulk_calls_return_every_result(simulator_thread, sync_client):
+    orders = [('Оплата заказа', 100, f'number-{i}', POSITION) for i in range(20)]
+    created = sorted(sync_client.create_many(orders, max_workers=4))
+    assert [result.index for result in created] == list(range(20))
+    assert all(result.ok for result in created)
+
+    simulator_thread.call(simulator_thread.simulator.fail_next, Methods.status, 400, 2)
+    statuses = list(sync_client.status_many([(result.result['orderId'], result.spec[2]) for result in created],
+                                            max_workers=4))
+    failed = [result for result in statuses if not result.ok]
+    assert len(statuses) == 20 and len(failed) == 2
+    assert all(isinstance(result.error, SberQrAPIError) and result.error.status_code == 400 for result in failed)
+    assert simulator_thread.simulator.requests[Methods.oauth] == 2
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from SberQR.api import Methods
+from SberQR.exceptions import SberQrAPIError
+from SberQR.scope import Scope
+from SberQR.tokens import TokenCache
+
+from .helpers import async_test, simulated
+
+
+@async_test
+async def test_concurrent_token_calls_share_one_oauth_request():
+    async with simulated() as (simulator, client):
+        tokens = await asyncio.gather(*(client.token(Scope.create) for _ in range(50)))
+        assert len(set(tokens)) == 1
+        assert simulator.requests[Methods.oauth] == 1
+
+
+@async_test
+async def test_cached_token_is_reused_until_refresh():
+    async with simulated() as (simulator, client):
+        first = await client.token(Scope.status)
+        assert await client.token(Scope.status) == first
+        assert simulator.requests[Methods.oauth] == 1
+
+        client._tokens.invalidate(Scope.status)
+        assert await client.token(Scope.status) != first
+        assert simulator.requests[Methods.oauth] == 2
+
+
+@async_test
+async def test_scopes_are_cached_separately():
+    async with simulated() as (simulator, client):
+        await asyncio.gather(client.token(Scope.create), client.token(Scope.status), client.token(Scope.create))
+        assert simulator.requests[Methods.oauth] == 2
+
+
+@async_test
+async def test_failed_fetch_is_not_cached():
+    async with simulated() as (simulator, client):
+        simulator.fail_next(Methods.oauth, 500)
+        results = await asyncio.gather(*(client.token(Scope.create) for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(result, SberQrAPIError) for result in results)
+        assert simulator.requests[Methods.oauth] == 1
+
+        assert await client.token(Scope.create)
+        assert simulator.requests[Methods.oauth] == 2
+
+
+@async_test
+async def test_cancelled_waiter_does_not_cancel_shared_fetch():
+    cache = TokenCache()
+    started = asyncio.Event()
+
+    async def factory():
+        started.set()
+        await asyncio.sleep(0.05)
+        return 'token', 1800
+
+    waiter = asyncio.ensure_future(cache.fetch(Scope.create, factory))
+    await started.wait()
+    other = asyncio.ensure_future(cache.fetch(Scope.create, factory))
+    waiter.cancel()
+    assert await other == 'token'
+    assert cache.get(Scope.create) == 'token'
+
+
+def test_short_lived_token_is_refreshed_at_half_lifetime():
+    cache = TokenCache(refresh_margin=60)
+    cache.set(Scope.create, 'token', 40)
+    assert cache.get(Scope.create) == 'token'
+    assert cache.refresh_in(Scope.create) == pytest.approx(20, abs=1)
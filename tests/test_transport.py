@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from SberQR import SberQR
+from SberQR.api import DEFAULT_CONNECT_TIMEOUT, DEFAULT_TOTAL_TIMEOUT, Methods, PreparedRequest
+from SberQR.exceptions import RequestTimeoutError
+from SberQR.models import Position
+from SberQR.retry import NO_RETRY
+from SberQR.transport import HTTPXSyncTransport, HTTPXTransport, TimeoutBounds, timeout_bounds
+
+from .helpers import CREDENTIALS, async_test, simulated
+
+POSITION = Position('Товар', 1, 100, 'Описание')
+
+httpx = pytest.importorskip('httpx')
+
+
+def test_timeout_bounds():
+    assert timeout_bounds(None) == TimeoutBounds(DEFAULT_CONNECT_TIMEOUT, DEFAULT_TOTAL_TIMEOUT,
+                                                 DEFAULT_TOTAL_TIMEOUT)
+    assert timeout_bounds(5) == TimeoutBounds(5, 5, 5)
+    # пара (connect, read), как в requests: общее время не ограничено
+    assert timeout_bounds((3, 20)) == TimeoutBounds(3, 20, None)
+    assert timeout_bounds(aiohttp.ClientTimeout(total=15, connect=2, sock_read=4)) == TimeoutBounds(2, 4, 15)
+    assert timeout_bounds(aiohttp.ClientTimeout(total=15)) == TimeoutBounds(DEFAULT_CONNECT_TIMEOUT, 15, 15)
+
+    connect, read, total = timeout_bounds((3, 20), deadline=time.monotonic() + 1)
+    assert connect <= 1 and read <= 1 and 0 < total <= 1
+    with pytest.raises(RequestTimeoutError):
+        timeout_bounds(5, deadline=time.monotonic() - 1)
+
+
+@async_test
+async def test_method_timeout_applies_to_httpx_transport():
+    async with simulated({'method_latency': {Methods.creation: 1}}, transport='httpx',
+                         method_timeouts={Methods.creation: 0.2}) as (simulator, client):
+        await client.status('unknown', 'number-x')
+        started = time.monotonic()
+        with pytest.raises(RequestTimeoutError):
+            await client.creation('Оплата заказа', 100, 'number-1', POSITION)
+        assert time.monotonic() - started < 0.5
+
+
+@async_test
+async def test_httpx_transport_enforces_total_timeout_of_slow_body():
+    async def trickle(request):
+        # каждый фрагмент приходит раньше таймаута чтения, весь ответ - позже total
+        response = web.StreamResponse(headers={'Content-Type': 'application/json'})
+        await response.prepare(request)
+        for _ in range(20):
+            await response.write(b' ')
+            await asyncio.sleep(0.05)
+        await response.write(b'{}')
+        return response
+
+    app = web.Application()
+    app.router.add_post('/', trickle)
+    async with TestServer(app) as server:
+        transport = HTTPXTransport(http2=False)
+        try:
+            request = PreparedRequest(str(server.make_url('/')), {}, b'{}')
+            started = time.monotonic()
+            with pytest.raises(RequestTimeoutError):
+                await transport.send(request, TimeoutBounds(1, 0.3, 0.3))
+            assert time.monotonic() - started < 0.6
+            # без total ответ дочитывается
+            assert (await transport.send(request, TimeoutBounds(1, 0.3, None))).body.strip() == b'{}'
+        finally:
+            await transport.close()
+
+
+@async_test
+async def test_httpx_transport_multiplexes_http2_requests():
+    transport = HTTPXTransport(prior_knowledge=True)
+    try:
+        async with simulated({'http2': True, 'method_latency': {Methods.status: 0.05}},
+                             transport=transport) as (simulator, client):
+            order_id = (await client.creation('Оплата заказа', 100, 'number-1', POSITION))['orderId']
+            # разные partner_order_number, чтобы status_cache не объединял запросы
+            responses = await asyncio.gather(*(client.status(order_id, f'number-{i}') for i in range(20)))
+            assert all('orderId' in response for response in responses)
+            assert simulator.requests[Methods.status] == 20
+            assert len(simulator.peers) == 1
+    finally:
+        await transport.close()
+
+
+def test_httpx_sync_transport(simulator_thread):
+    transport = HTTPXSyncTransport(http2=False)
+    client = SberQR(*CREDENTIALS, base_url=simulator_thread.base_url, retry=NO_RETRY, transport=transport)
+    try:
+        order_id = client.creation('Оплата заказа', 100, 'number-1', POSITION)['orderId']
+        assert client.status(order_id, 'number-1')['orderState'] == 'CREATED'
+    finally:
+        client.close()
+        transport.close()
+    assert len(simulator_thread.simulator.peers) == 1
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import pytest
+
+from SberQR.api import Methods
+from SberQR.scope import Scope
+
+from .helpers import async_test, simulated
+
+SCOPES = (Scope.create, Scope.status, Scope.revoke)
+
+
+@async_test
+async def test_warmup_fetches_all_scopes_once():
+    async with simulated() as (simulator, client):
+        await client.warmup(SCOPES, connections=2, refresh=False)
+        assert simulator.requests[Methods.oauth] == len(SCOPES)
+        assert client._token_refresher is None
+
+        await asyncio.gather(*(client.token(scope) for scope in SCOPES))
+        assert simulator.requests[Methods.oauth] == len(SCOPES)
+
+
+@async_test
+async def test_refresher_renews_tokens_before_expiry():
+    async with simulated({'token_ttl': 1}) as (simulator, client):
+        await client.warmup(SCOPES)
+        first = await client.token(Scope.create)
+        # токен на 1 с обновляется через половину срока
+        await asyncio.sleep(0.8)
+        assert simulator.requests[Methods.oauth] >= 2 * len(SCOPES)
+        assert client._tokens.get(Scope.create) not in (None, first)
+
+        await client.close()
+        assert client._token_refresher is None
+
+
+@async_test
+async def test_async_refresher_rejects_empty_scopes():
+    async with simulated() as (_, client):
+        with pytest.raises(ValueError):
+            client.start_token_refresher(())
+        await client.warmup((), refresh=True)
+        assert client._token_refresher is None
+
+
+def test_sync_refresher_renews_tokens(simulator_thread, sync_client):
+    simulator_thread.simulator.token_ttl = 1
+    sync_client.warmup(SCOPES)
+    try:
+        first = sync_client.token(Scope.create)
+        time.sleep(0.8)
+        assert sync_client._tokens.get(Scope.create) not in (None, first)
+    finally:
+        sync_client.stop_token_refresher()
+
+    with pytest.raises(ValueError):
+        sync_client.start_token_refresher([])